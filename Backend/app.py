@@ -1,9 +1,51 @@
 # app.py
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, g
 from bot_functions import *
+from request_memo import request_memo
+import csv
+import hashlib
+import json
+import io
+import math
+import time
+from datetime import datetime
 
 app = Flask(__name__, template_folder='../Frontend', static_folder='../Frontend/static')
 
+# A partir de este número de filas la conversión por lotes se devuelve en streaming
+BATCH_STREAM_THRESHOLD = 1000
+BATCH_STREAM_CHUNK = 500
+BATCH_RESULT_FIELDS = ['amount', 'from_currency', 'to_currency', 'converted_amount', 'exchange_rate', 'bid_price', 'ask_price', 'timestamp']
+
+# Límite de puntos para el modo de gráfico JSON/SVG
+MAX_CHART_POINTS = 5000
+
+# Cotizaciones en vivo: pares por conexión y segundos entre mensajes de keep-alive
+STREAM_MAX_PAIRS = 20
+STREAM_HEARTBEAT = 15
+
+# Posiciones máximas por cartera en /portfolio/value
+PORTFOLIO_MAX_POSITIONS = 1000
+
+# Consultas máximas por lote en /get_forex_data/batch
+QUERY_BATCH_MAX_INPUTS = 200
+
+# Horizonte máximo (días) de /predict/batch
+PREDICTION_MAX_DAYS = 365
+
+# Latencia de cada solicitud por endpoint e intención
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None and request.endpoint != 'metrics':
+        METRICS.observe('request_seconds', time.perf_counter() - started,
+                        endpoint=request.endpoint or 'unknown', intent=g.get('intent', ''), status=response.status_code)
+    return response
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -21,9 +63,18 @@ def get_forex_data():
         return jsonify({"error": "Falta el campo 'user_input' en la solicitud."}), 400
 
     logger.info(f"user_input recibido: {user_input}")
+    return answer_forex_query(user_input, data, if_none_match=request.if_none_match)
 
-    # Detectar la intención del usuario
-    intent = detect_intent(user_input)
+def answer_forex_query(user_input, data, if_none_match=None):
+    """
+    Responde una consulta en lenguaje natural; data aporta las opciones de la solicitud
+    (chart_format, max_points, model, include_news). Con if_none_match (ETags del cliente)
+    un gráfico que no ha cambiado se responde con 304.
+    """
+    # Detectar intención, monedas y período en una sola pasada
+    query = analyze_query(user_input)
+    intent = query['intent']
+    g.intent = intent
 
     if intent == "conversion":
         # Procesar la solicitud de conversión
@@ -44,7 +95,9 @@ def get_forex_data():
                 "exchange_rate": quote['mid_price'],
                 "bid_price": quote['bid_price'],
                 "ask_price": quote['ask_price'],
-                "timestamp": quote['timestamp']
+                "timestamp": quote['timestamp'],
+                # 'live', o 'stored'/'cross' si la llamada en vivo falló y se usó una cotización local
+                "source": quote.get('source', 'live')
             }
             return jsonify(response)
         else:
@@ -52,39 +105,49 @@ def get_forex_data():
 
     elif intent == "graph":
         # Lógica para gráfico
-        currencies = detect_currencies(user_input)
-        if len(currencies) >= 2:
-            base_currency, target_currency = currencies[0], currencies[1]
-        elif len(currencies) == 1:
-            base_currency, target_currency = currencies[0], "USD"
-        else:
-            base_currency, target_currency = "USD", "EUR"
+        base_currency, target_currency = resolve_pair(query['currencies'])
 
         # Detectar el período de tiempo
-        period = detect_time_period(user_input)
+        period = query['period']
         
-        # Generar el gráfico
-        graph_buffer = generate_rate_graph(base_currency, target_currency, period)
-        if graph_buffer:
-            return graph_buffer.getvalue(), 200, {'Content-Type': 'image/png'}
+        # Modo ligero: serie reducida (JSON o SVG) para que el cliente dibuje el gráfico
+        chart_format = data.get('chart_format', 'png')
+        if chart_format in ('json', 'svg'):
+            try:
+                max_points = min(max(int(data.get('max_points', 200)), 2), MAX_CHART_POINTS)
+            except (TypeError, ValueError):
+                return jsonify({"error": "El campo 'max_points' debe ser un número entero."}), 400
+            chart = get_rate_chart_data(base_currency, target_currency, period, max_points, chart_format)
+            if not chart:
+                return jsonify({"error": "Could not generate graph. Please try again later."}), 500
+            # ETag del contenido: el cliente reutiliza su copia si la serie no ha cambiado
+            body = chart.encode() if chart_format == 'svg' else json.dumps(chart, sort_keys=True).encode()
+            etag = hashlib.sha1(body).hexdigest()
+            headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+            if if_none_match is not None and etag in if_none_match:
+                return '', 304, headers
+            content_type = 'image/svg+xml' if chart_format == 'svg' else 'application/json'
+            return body, 200, {**headers, 'Content-Type': content_type}
+
+        # Generar el gráfico (304 si el cliente ya tiene esta versión)
+        graph = get_rate_graph(base_currency, target_currency, period, if_none_match=if_none_match)
+        if graph:
+            headers = {'ETag': f'"{graph["etag"]}"', 'Cache-Control': 'no-cache'}
+            if graph['png'] is None:
+                return '', 304, headers
+            return graph['png'], 200, {**headers, 'Content-Type': 'image/png'}
         else:
             return jsonify({"error": "Could not generate graph. Please try again later."}), 500
         
     elif intent == "prediction":
         # Procesar la solicitud de predicción
-        currencies = detect_currencies(user_input)
-        if len(currencies) >= 2:
-            base_currency, target_currency = currencies[0], currencies[1]
-        elif len(currencies) == 1:
-            base_currency, target_currency = currencies[0], "USD"
-        else:
-            base_currency, target_currency = "USD", "EUR"
+        base_currency, target_currency = resolve_pair(query['currencies'])
 
         # Detectar el período de tiempo
-        period = detect_time_period(user_input)
+        period = query['period']
         
-        # Obtener la predicción
-        prediction = predict_rates(base_currency, target_currency, period)
+        # Obtener la predicción (modelo opcional: linear, ewma, holt_winters)
+        prediction = predict_rates(base_currency, target_currency, period, data.get('model', 'linear'))
         if prediction:
             response = {
                 "intent": "prediction",
@@ -94,7 +157,8 @@ def get_forex_data():
                 "predicted_rates": prediction['predicted_rates'],
                 "trend_percentage": prediction['trend_percentage'],
                 "trend_direction": prediction['trend_direction'],
-                "time_description": prediction['time_description']
+                "time_description": prediction['time_description'],
+                "model": prediction['model']
             }
             return jsonify(response)
         else:
@@ -102,19 +166,14 @@ def get_forex_data():
 
     elif intent == "history":
         # Procesar la solicitud de histórico
-        currencies = detect_currencies(user_input)
-        if len(currencies) >= 2:
-            base_currency, target_currency = currencies[0], currencies[1]
-        elif len(currencies) == 1:
-            base_currency, target_currency = currencies[0], "USD"
-        else:
-            base_currency, target_currency = "USD", "EUR"
+        base_currency, target_currency = resolve_pair(query['currencies'])
 
         # Detectar el período de tiempo
-        period = detect_time_period(user_input)
+        period = query['period']
         
         # Obtener datos históricos
-        historical_data = get_historical_price(base_currency, target_currency, period)
+        include_news = bool(data.get('include_news'))
+        historical_data = get_historical_price(base_currency, target_currency, period, include_news)
         if historical_data:
             response = {
                 "intent": "history",
@@ -127,26 +186,22 @@ def get_forex_data():
                 "change_percentage": historical_data['change_percentage'],
                 "time_description": historical_data['time_description']
             }
+            if include_news:
+                response["news"] = historical_data['news']
             return jsonify(response)
         else:
             return jsonify({"error": "Could not fetch historical data. Please try again later."}), 500
 
     elif intent == "compare":
         # Procesar la solicitud de comparación
-        currencies = detect_currencies(user_input)
-        if len(currencies) >= 2:
-            base_currency, target_currency = currencies[0], currencies[1]
-        elif len(currencies) == 1:
-            base_currency, target_currency = currencies[0], "USD"
-        else:
-            base_currency, target_currency = "USD", "EUR"
+        base_currency, target_currency = resolve_pair(query['currencies'])
 
         # Detectar los períodos de tiempo
-        period1 = detect_time_period(user_input)
-        period2 = detect_time_period(user_input.split("y")[1]) if "y" in user_input else None
+        period1 = query['period']
+        period2 = detect_second_period(user_input)
         
         # Obtener la comparación
-        comparison = compare_currency_periods(base_currency, target_currency, period1, period2)
+        comparison = compare_currency_periods(base_currency, target_currency, period1, period2, bool(data.get('include_news')))
         if comparison:
             return jsonify(comparison)
         else:
@@ -171,6 +226,48 @@ def get_forex_data():
             "message": "Lo siento, no puedo procesar esa solicitud. Soy un asistente especializado en divisas. Puedes preguntarme sobre conversiones, gráficos, predicciones, datos históricos o comparaciones de monedas."
         })
 
+# Lote de consultas en lenguaje natural: cada cotización, ventana de histórico y fecha se obtiene una vez
+@app.route('/get_forex_data/batch', methods=['POST'])
+def get_forex_data_batch():
+    data = request.get_json(silent=True)
+    user_inputs = data.get('user_inputs') if isinstance(data, dict) else data
+    if not isinstance(user_inputs, list) or not user_inputs or not all(isinstance(text, str) and text.strip() for text in user_inputs):
+        return jsonify({"error": "Falta el campo 'user_inputs' (lista de consultas, ej: [\"EUR/USD hace 2 semanas\"])."}), 400
+    if len(user_inputs) > QUERY_BATCH_MAX_INPUTS:
+        return jsonify({"error": f"El lote admite como máximo {QUERY_BATCH_MAX_INPUTS} consultas."}), 400
+
+    # Opciones comunes a todas las consultas; los gráficos se devuelven como serie (json) o SVG
+    options = dict(data) if isinstance(data, dict) else {}
+    options.pop('user_inputs', None)
+    options['chart_format'] = options.get('chart_format', 'json')
+    if options['chart_format'] not in ('json', 'svg'):
+        return jsonify({"error": "En un lote 'chart_format' debe ser 'json' o 'svg'."}), 400
+
+    with request_memo() as memo:
+        plan = plan_query_batch(user_inputs)
+        results = [batch_query_result(text, answer_forex_query(text, options)) for text in user_inputs]
+
+    g.intent = 'batch'
+    logger.info(f"Lote de {len(user_inputs)} consultas: {plan}")
+    return jsonify({
+        "intent": "batch",
+        "count": len(results),
+        "resources": plan,
+        "memo": memo.stats(),
+        "results": results
+    })
+
+def batch_query_result(user_input, result):
+    """
+    Convierte la respuesta de answer_forex_query en un elemento del lote con su código de estado.
+    """
+    response = app.make_response(result)
+    if response.mimetype == 'image/svg+xml':
+        body = {"intent": "graph", "svg": response.get_data(as_text=True)}
+    else:
+        body = response.get_json(silent=True) or {"error": "Respuesta no disponible en un lote."}
+    return {"user_input": user_input, "status": response.status_code, **body}
+
 # Agregar una nueva ruta para obtener noticias de divisas
 @app.route('/get_forex_news', methods=['GET'])
 def get_news():
@@ -180,5 +277,238 @@ def get_news():
     else:
         return jsonify({"error": "No se pudieron obtener noticias de divisas."}), 500
 
+# Predicción de muchos pares en una sola llamada vectorizada
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch_route():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('pairs'), list) or not data['pairs']:
+        return jsonify({"error": "Falta el campo 'pairs' (ej: [\"EUR/USD\", \"GBP/JPY\"])."}), 400
+
+    pairs = [parse_pair(pair) for pair in data['pairs']]
+    invalid = [pair for pair, parsed in zip(data['pairs'], pairs) if parsed is None]
+    if invalid:
+        return jsonify({"error": f"Par inválido: {invalid[0]}"}), 400
+
+    try:
+        days = int(data.get('days', 7))
+    except (TypeError, ValueError):
+        return jsonify({"error": "El campo 'days' debe ser un número entero."}), 400
+    if not 1 <= days <= PREDICTION_MAX_DAYS:
+        return jsonify({"error": f"El campo 'days' debe estar entre 1 y {PREDICTION_MAX_DAYS}."}), 400
+
+    period = {'type': 'days', 'value': days}
+    model = data.get('model', 'linear')
+    predictions = predict_rates_batch(pairs, period, model)
+    return jsonify({
+        "intent": "prediction_batch",
+        "model": model,
+        "predictions": [
+            {"base_currency": base, "target_currency": target, **prediction} if prediction
+            else {"base_currency": base, "target_currency": target, "error": "Sin histórico local reciente para este par."}
+            for (base, target), prediction in zip(pairs, predictions)
+        ]
+    })
+
+# Valoración de carteras multidivisa en una moneda de reporte, hoy y en fechas pasadas
+@app.route('/portfolio/value', methods=['POST'])
+def portfolio_value_route():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('positions'), list) or not data['positions'] or not data.get('reporting_currency'):
+        return jsonify({"error": "Faltan los campos 'reporting_currency' y 'positions' (ej: [{\"currency\": \"USD\", \"amount\": 1000}])."}), 400
+    if len(data['positions']) > PORTFOLIO_MAX_POSITIONS:
+        return jsonify({"error": f"La cartera admite como máximo {PORTFOLIO_MAX_POSITIONS} posiciones."}), 400
+
+    try:
+        positions = [parse_position(position) for position in data['positions']]
+        as_of_dates = [datetime.strptime(date, '%Y-%m-%d') for date in data.get('as_of') or []]
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"error": f"Cartera inválida: {e}"}), 400
+
+    valuation = value_portfolio(positions, str(data['reporting_currency']), as_of_dates)
+    return jsonify({"intent": "portfolio", **valuation})
+
+def parse_position(position):
+    """
+    Normaliza una posición: moneda en mayúsculas, cantidad numérica y, opcionalmente,
+    coste ('cost') o fecha de compra ('acquired', '%Y-%m-%d').
+    """
+    if not isinstance(position, dict):
+        raise ValueError("cada posición debe ser un objeto")
+    parsed = {'currency': str(position['currency']).strip().upper(), 'amount': float(position['amount'])}
+    if position.get('cost') is not None:
+        parsed['cost'] = float(position['cost'])
+    elif position.get('acquired'):
+        parsed['acquired'] = datetime.strptime(position['acquired'], '%Y-%m-%d')
+    if not all(math.isfinite(parsed[field]) for field in ('amount', 'cost') if field in parsed):
+        raise ValueError("la cantidad y el coste deben ser números finitos")
+    return parsed
+
+def parse_pair(text):
+    """
+    Convierte 'EUR/USD' o 'eur_usd' en ('EUR', 'USD'); None si no es un par.
+    """
+    parts = str(text).strip().upper().replace('_', '/').split('/')
+    if len(parts) != 2 or not all(parts):
+        return None
+    return parts[0], parts[1]
+
+# Cotizaciones en vivo por Server-Sent Events: /stream/quotes?pairs=EUR/USD,GBP/JPY
+@app.route('/stream/quotes', methods=['GET'])
+def stream_quotes():
+    requested = [item for item in request.args.get('pairs', '').split(',') if item.strip()]
+    pairs = [parse_pair(item) for item in requested]
+    if not pairs or None in pairs or len(pairs) > STREAM_MAX_PAIRS:
+        return jsonify({"error": f"Indica entre 1 y {STREAM_MAX_PAIRS} pares válidos en 'pairs' (ej: EUR/USD,GBP/JPY)."}), 400
+
+    def generate():
+        # La suscripción se crea al empezar a enviar: si la respuesta nunca se recorre
+        # (el cliente se desconecta antes o es una petición HEAD) no queda ninguna cola abierta
+        subscription = QUOTE_STREAM.subscribe(dict.fromkeys(pairs))
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                event = subscription.get(timeout=STREAM_HEARTBEAT)
+                if event is None:
+                    # Comentario SSE para mantener viva la conexión a través de proxies
+                    yield ": keep-alive\n\n"
+                    continue
+                (base_currency, target_currency), quote = event
+                payload = {"base_currency": base_currency, "target_currency": target_currency, **quote}
+                yield f"event: quote\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            QUOTE_STREAM.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Conversión por lotes (JSON o CSV) para procesos masivos como facturación
+@app.route('/convert/batch', methods=['POST'])
+def convert_batch_route():
+    is_csv = request.mimetype == 'text/csv'
+    try:
+        amounts, sources, targets = parse_conversion_rows(is_csv)
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error(f"Solicitud de conversión por lotes inválida: {e}")
+        return jsonify({"error": f"Formato de lote inválido: {e}"}), 400
+
+    if not amounts:
+        return jsonify({"error": "El lote no contiene conversiones."}), 400
+
+    results = convert_batch(amounts, sources, targets)
+    logger.info(f"Conversión por lotes: {len(amounts)} filas, {results['unique_pairs']} pares distintos")
+
+    wants_csv = is_csv or request.accept_mimetypes.best == 'text/csv'
+    stream = len(amounts) > BATCH_STREAM_THRESHOLD or request.args.get('stream') == '1'
+
+    if not stream:
+        rows = list(iter_batch_results(results, 0, len(amounts)))
+        if wants_csv:
+            return Response(format_batch_csv(rows, header=True), mimetype='text/csv')
+        return jsonify({
+            "intent": "batch_conversion",
+            "count": len(rows),
+            "unique_pairs": results['unique_pairs'],
+            "results": rows
+        })
+
+    def generate():
+        for start in range(0, len(amounts), BATCH_STREAM_CHUNK):
+            rows = iter_batch_results(results, start, min(start + BATCH_STREAM_CHUNK, len(amounts)))
+            if wants_csv:
+                yield format_batch_csv(rows, header=(start == 0))
+            else:
+                yield ''.join(json.dumps(row) + '\n' for row in rows)
+
+    mimetype = 'text/csv' if wants_csv else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+def parse_conversion_rows(is_csv):
+    """
+    Lee las filas del lote desde CSV (amount,from_currency,to_currency) o JSON
+    (lista de objetos o {"conversions": [...]}). También acepta las claves 'from' y 'to'.
+    """
+    if is_csv:
+        rows = csv.DictReader(io.StringIO(request.get_data(as_text=True)))
+    else:
+        data = request.get_json(silent=True)
+        if data is None:
+            raise ValueError("se esperaba un cuerpo JSON o CSV")
+        rows = data if isinstance(data, list) else data.get('conversions', []) if isinstance(data, dict) else None
+        if not isinstance(rows, list):
+            raise ValueError("se esperaba una lista de conversiones")
+
+    amounts, sources, targets = [], [], []
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            raise ValueError(f"la fila {number} no es un objeto")
+        amount = float(row['amount'])
+        if not math.isfinite(amount):
+            raise ValueError(f"la cantidad de la fila {number} no es un número finito")
+        amounts.append(amount)
+        sources.append(row.get('from_currency') or row['from'])
+        targets.append(row.get('to_currency') or row['to'])
+    return amounts, sources, targets
+
+def iter_batch_results(results, start, end):
+    """
+    Genera los diccionarios de resultado de las filas [start, end); NaN se convierte en error.
+    """
+    columns = {field: (results[field][start:end].tolist() if hasattr(results[field], 'tolist') else results[field][start:end])
+               for field in BATCH_RESULT_FIELDS}
+    for i in range(end - start):
+        row = {field: columns[field][i] for field in BATCH_RESULT_FIELDS}
+        if math.isnan(row['exchange_rate']):
+            for field in ('converted_amount', 'exchange_rate', 'bid_price', 'ask_price'):
+                row[field] = None
+            row['error'] = "No se pudo obtener la cotización para este par."
+        yield row
+
+def format_batch_csv(rows, header=False):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=BATCH_RESULT_FIELDS + ['error'], extrasaction='ignore')
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+# Estadísticas de la caché de cotizaciones para ajustar el TTL
+@app.route('/quote_cache/stats', methods=['GET'])
+def quote_cache_stats():
+    return jsonify(get_quote_cache_stats())
+
+# Uso de la vía rápida, OpenAI y reglas al analizar conversiones
+@app.route('/conversion_parser/stats', methods=['GET'])
+def conversion_parser_stats():
+    return jsonify(get_conversion_parser_stats())
+
+# Métricas en formato de texto de Prometheus
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+# Actividad del pool de consultas concurrentes
+@app.route('/io_pipeline/stats', methods=['GET'])
+def io_pipeline_stats():
+    return jsonify(IO_PIPELINE.stats())
+
+# Sondeos activos y clientes conectados a /stream/quotes
+@app.route('/stream/stats', methods=['GET'])
+def stream_stats():
+    return jsonify(QUOTE_STREAM.stats())
+
+# Presupuesto de Alpha Vantage por clave y por prioridad
+@app.route('/quota/stats', methods=['GET'])
+def quota_stats():
+    return jsonify(ALPHA_VANTAGE_QUOTA.stats())
+
+# Estado de la precarga en segundo plano y del presupuesto de Alpha Vantage
+@app.route('/prefetch/stats', methods=['GET'])
+def prefetch_stats():
+    return jsonify(get_prefetch_stats())
+
+# Precarga de los pares más consultados (PREFETCH_ENABLED=0 para desactivarla)
+if os.getenv("PREFETCH_ENABLED", "1") == "1":
+    start_prefetch_scheduler()
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,23 @@
+#Carga masiva y sincronización de las series diarias FX_DAILY
+import sys
+import logging
+
+from bot_functions import TICK_STORE, DAILY_SUFFIX, backfill_daily_series
+
+def stored_pairs():
+    """
+    Pares con cotizaciones o serie diaria en el almacén local.
+    """
+    pairs = []
+    for name in TICK_STORE.pairs():
+        parts = name.replace(DAILY_SUFFIX, '').split('_')
+        if len(parts) == 2 and tuple(parts) not in pairs:
+            pairs.append(tuple(parts))
+    return pairs
+
+if __name__ == '__main__':
+    # Uso: python backfill.py [EUR/USD GBP/JPY ...]  (sin argumentos: todos los pares guardados)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    pairs = [tuple(arg.upper().replace('_', '/').split('/')) for arg in sys.argv[1:]] or stored_pairs()
+    for pair, saved in backfill_daily_series(pairs).items():
+        print(f"{pair}: {'error' if saved is None else f'{saved} días nuevos'}")
@@ -0,0 +1,198 @@
+#Backtesting walk-forward de los modelos de predicción, sin conexión
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from forecasting import MODEL_TYPES, SECONDS_PER_DAY, build_state
+from tick_store import TickStore, read_csv
+from historical_matrix import HistoricalMatrix
+from time_index import NEAREST, locate
+
+logger = logging.getLogger(__name__)
+
+# Horizontes por defecto: los que produce detect_time_period (1 día, 1 semana, 2 semanas, 1 mes)
+DEFAULT_HORIZONS = (1, 7, 14, 30)
+PERIOD_DAYS = {'d': 1, 'w': 7, 'm': 30}  # misma equivalencia que predict_rates
+POLYFIT_MODEL = 'polyfit'                 # recta de np.polyfit sobre 30 días (predict_rates original)
+POLYFIT_TRAINING_DAYS = 30
+
+def parse_horizons(text):
+    """
+    Convierte '1d,2w,1m' (o números de días) en una tupla de días.
+    """
+    horizons = []
+    for item in text.split(','):
+        item = item.strip().lower()
+        if not item:
+            continue
+        unit = item[-1] if item[-1] in PERIOD_DAYS else 'd'
+        value = item[:-1] if item[-1] in PERIOD_DAYS else item
+        horizons.append(int(value) * PERIOD_DAYS[unit])
+    return tuple(sorted(set(horizons)))
+
+def load_series(data_folder='data', historical_folder='historical_data'):
+    """
+    Reúne las series locales como {nombre: (timestamps, tasas)}:
+    el almacén de cotizaciones, los CSV aún no importados y las tasas de USD_historical.json.
+    No consulta la red; solo escribe la matriz compilada de USD_historical.json si cambió.
+    """
+    series = {}
+    ticks_folder = os.path.join(data_folder, 'ticks')
+    store = TickStore(ticks_folder) if os.path.isdir(ticks_folder) else None
+    for pair in (store.pairs() if store else []):
+        ticks = store.read_all(pair)
+        if len(ticks):
+            series[pair] = (np.array(ticks['timestamp']), np.array(ticks['mid_price']))
+
+    for file_path in sorted(glob.glob(os.path.join(data_folder, '*_history.csv'))):
+        pair = os.path.basename(file_path).replace('_history.csv', '')
+        if pair not in series:
+            records = read_csv(file_path)
+            if len(records):
+                series[pair] = (records['timestamp'], records['mid_price'])
+
+    json_path = os.path.join(historical_folder, 'USD_historical.json')
+    if os.path.exists(json_path):
+        matrix = HistoricalMatrix(json_path).load()
+        for code in matrix.currencies:
+            pair = f"USD_{code}"
+            if code != 'USD' and pair not in series:
+                timestamps, rates = matrix.cross_series('USD', code)
+                if len(rates):
+                    series[pair] = (timestamps, rates)
+
+    return series
+
+def polyfit_forecast(timestamps, values, origin, horizon):
+    """
+    Reproduce el predict_rates original: recta sobre los índices de los últimos 30 días.
+    """
+    start = int(np.searchsorted(timestamps, timestamps[origin] - POLYFIT_TRAINING_DAYS * SECONDS_PER_DAY, side='left'))
+    window = values[start:origin + 1]
+    if len(window) < 2:
+        return float(window[-1])
+    slope, intercept = np.polyfit(np.arange(len(window)), window, 1)
+    return float(intercept + slope * (len(window) - 1 + horizon))
+
+def walk_forward(timestamps, values, horizons=DEFAULT_HORIZONS, models=None, min_train=5, tolerance_days=0.5):
+    """
+    Recorre la serie en orden: en cada origen pronostica cada horizonte solo con los datos
+    anteriores, compara con la observación más cercana a la fecha objetivo (si dista menos de
+    tolerance_days) y después actualiza los modelos con el siguiente dato, como en producción.
+    Retorna {modelo: {horizonte: métricas}}.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+    models = list(models or list(MODEL_TYPES) + [POLYFIT_MODEL])
+    horizons = list(horizons)
+    n = len(values)
+    samples = {model: {h: ([], [], []) for h in horizons} for model in models}  # (error, acierto de dirección, tiempo CPU)
+    if n <= min_train:
+        return summarize(samples)
+
+    # Fechas objetivo de todos los orígenes y horizontes, resueltas de una vez
+    origins = np.arange(min_train - 1, n - 1)
+    offsets = (np.array(horizons) * SECONDS_PER_DAY).astype(np.int64)
+    targets = timestamps[origins][:, np.newaxis] + offsets[np.newaxis, :]
+    matched = locate(timestamps, targets.ravel(), NEAREST).reshape(targets.shape)
+    valid = (matched > origins[:, np.newaxis]) & (np.abs(timestamps[matched] - targets) <= tolerance_days * SECONDS_PER_DAY)
+
+    state = build_state(timestamps[:min_train], values[:min_train])
+    for row, origin in enumerate(origins):
+        for col, horizon in enumerate(horizons):
+            if not valid[row, col]:
+                continue
+            actual = values[matched[row, col]]
+            for model in models:
+                started = time.process_time_ns()
+                if model == POLYFIT_MODEL:
+                    predicted = polyfit_forecast(timestamps, values, origin, horizon)
+                else:
+                    predicted = state.forecast(model, horizon)[-1]
+                elapsed = time.process_time_ns() - started
+                errors, directions, cpu = samples[model][horizon]
+                errors.append((predicted - actual, actual))
+                directions.append(np.sign(predicted - values[origin]) == np.sign(actual - values[origin]))
+                cpu.append(elapsed)
+        state.update(timestamps[origin + 1], values[origin + 1])
+
+    return summarize(samples)
+
+def summarize(samples):
+    """
+    Calcula MAE, RMSE, MAPE, acierto de dirección y tiempo de CPU por pronóstico.
+    """
+    report = {}
+    for model, by_horizon in samples.items():
+        report[model] = {}
+        for horizon, (errors, directions, cpu) in by_horizon.items():
+            if not errors:
+                report[model][horizon] = {'forecasts': 0}
+                continue
+            diff = np.array([e[0] for e in errors])
+            actual = np.array([e[1] for e in errors])
+            cpu = np.array(cpu) / 1000.0
+            report[model][horizon] = {
+                'forecasts': len(errors),
+                'mae': float(np.mean(np.abs(diff))),
+                'rmse': float(np.sqrt(np.mean(diff ** 2))),
+                'mape': float(np.mean(np.abs(diff / actual)) * 100),
+                'direction_accuracy': float(np.mean(directions)),
+                'cpu_us_mean': float(cpu.mean()),
+                'cpu_us_p95': float(np.percentile(cpu, 95))
+            }
+    return report
+
+def _backtest_pair(args):
+    pair, timestamps, values, horizons, min_train, tolerance_days = args
+    return pair, len(values), walk_forward(timestamps, values, horizons, min_train=min_train, tolerance_days=tolerance_days)
+
+def run_backtest(series, horizons=DEFAULT_HORIZONS, min_train=5, tolerance_days=0.5, workers=None):
+    """
+    Evalúa todos los pares en paralelo con un pool de procesos.
+    Retorna {par: {'observations', 'results'}}.
+    """
+    tasks = [(pair, ts, vals, horizons, min_train, tolerance_days) for pair, (ts, vals) in sorted(series.items())]
+    if not tasks:
+        return {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return {
+            pair: {'observations': count, 'results': results}
+            for pair, count, results in pool.map(_backtest_pair, tasks)
+        }
+
+if __name__ == '__main__':
+    # Uso: python backtest.py [--pairs EUR_USD,USD_MXN] [--horizons 1d,1w,2w,1m] [--output informe.json]
+    parser = argparse.ArgumentParser(description="Backtesting walk-forward de los modelos de predicción")
+    parser.add_argument('--data', default='data')
+    parser.add_argument('--historical', default='historical_data')
+    parser.add_argument('--pairs', default='', help="Pares separados por comas (por defecto, todos)")
+    parser.add_argument('--horizons', default=','.join(str(h) for h in DEFAULT_HORIZONS))
+    parser.add_argument('--min-train', type=int, default=5)
+    parser.add_argument('--tolerance-days', type=float, default=0.5)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    series = load_series(args.data, args.historical)
+    if args.pairs:
+        wanted = {pair.strip().upper().replace('/', '_') for pair in args.pairs.split(',')}
+        series = {pair: data for pair, data in series.items() if pair in wanted}
+
+    report = run_backtest(series, parse_horizons(args.horizons), args.min_train, args.tolerance_days, args.workers)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        logger.info(f"Informe de {len(report)} pares guardado en {args.output}")
+    else:
+        print(output)
+    sys.exit(0 if report else 1)
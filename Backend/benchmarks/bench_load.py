@@ -0,0 +1,201 @@
+#Prueba de carga de app.py contra el servidor local de Alpha Vantage/OpenAI
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from stub_upstream import start_stub_server
+
+def unique_word(n):
+    """
+    Palabra sin dígitos distinta para cada n (0 -> 'a', 26 -> 'ba'), para variar el texto de una consulta.
+    """
+    letters = ''
+    while True:
+        n, remainder = divmod(n, 26)
+        letters = chr(ord('a') + remainder) + letters
+        if not n:
+            return letters
+
+# Un escenario por intención, más las noticias. El cuerpo puede ser una función del número de
+# solicitud: 'conversion_llm' cambia el texto en cada una para que las cachés de análisis no la
+# respondan y cada solicitud pase por el análisis con OpenAI
+SCENARIOS = [
+    ('conversion', 'POST', '/get_forex_data', {'user_input': '100 euros a dolares'}),
+    ('conversion_llm', 'POST', '/get_forex_data', lambda i: {'user_input': f'cambia unos euros por dolares ref {unique_word(i)}'}),
+    ('graph', 'POST', '/get_forex_data', {'user_input': 'grafico eur/usd 1 mes', 'chart_format': 'json'}),
+    ('graph_png', 'POST', '/get_forex_data', {'user_input': 'grafico gbp/usd 2 semanas'}),
+    ('prediction', 'POST', '/get_forex_data', {'user_input': 'prediccion eur/usd 2 semanas'}),
+    ('history', 'POST', '/get_forex_data', {'user_input': 'precio del euro en dolares hace 10 dias'}),
+    ('compare', 'POST', '/get_forex_data', {'user_input': 'compara libras con dolares'}),
+    ('currencies', 'POST', '/get_forex_data', {'user_input': 'que monedas estan disponibles'}),
+    ('news', 'GET', '/get_forex_news', None),
+]
+
+def prepare_workdir():
+    """
+    Copia los datos del repositorio a un directorio temporal para no tocar el almacén real.
+    """
+    workdir = tempfile.mkdtemp(prefix='forexai-bench-')
+    shutil.copytree(os.path.join(REPO_DIR, 'historical_data'), os.path.join(workdir, 'historical_data'))
+    os.makedirs(os.path.join(workdir, 'data'))
+    for file_path in glob.glob(os.path.join(REPO_DIR, 'data', '*_history.csv')):
+        shutil.copy(file_path, os.path.join(workdir, 'data'))
+    return workdir
+
+def start_app(stub_url):
+    """
+    Configura el backend contra el servidor local y lo sirve en un hilo. Retorna (servidor, url).
+    """
+    os.environ.update({
+        'ALPHA_VANTAGE_BASE_URL': stub_url,
+        'OPENAI_BASE_URL': f"{stub_url}/v1",
+        'ALPHA_API_KEY': 'stub',
+        'OPENAI_API_KEY': 'stub',
+        'PREFETCH_ENABLED': '0',
+        'ALPHA_VANTAGE_CALLS_PER_MINUTE': '1000000',
+        'ALPHA_VANTAGE_CALLS_PER_DAY': '1000000'
+    })
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-app', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def run_scenario(base_url, method, path, payload, total, concurrency):
+    """
+    Lanza total solicitudes con concurrency clientes. Retorna las métricas del escenario.
+    """
+    local = threading.local()
+
+    def one_request(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            body = payload(i) if callable(payload) else payload
+            response = session.request(method, base_url + path, json=body, timeout=60)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    # Calentamiento: la primera solicitud llena las cachés del escenario
+    one_request(total)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one_request, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = np.array([latency for latency, _ in results]) * 1000
+    return {
+        'requests': total,
+        'errors': sum(1 for _, ok in results if not ok),
+        'req_per_s': total / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99))
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def latest_result():
+    files = sorted(glob.glob(os.path.join(RESULTS_DIR, 'load-*.json')))
+    if not files:
+        return None
+    with open(files[-1]) as f:
+        return json.load(f)
+
+def print_report(report, previous):
+    print(f"{'escenario':<16}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errores':>9}{'Δ req/s':>10}{'Δ p99':>9}")
+    for name, result in report['scenarios'].items():
+        line = (f"{name:<16}{result['req_per_s']:>10.1f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                f"{result['p99_ms']:>10.2f}{result['errors']:>9}")
+        before = previous['scenarios'].get(name) if previous else None
+        if before:
+            line += (f"{(result['req_per_s'] / before['req_per_s'] - 1) * 100:>+9.1f}%"
+                     f"{(result['p99_ms'] / before['p99_ms'] - 1) * 100:>+8.1f}%")
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga sin conexión de la API de ForexAI")
+    parser.add_argument('--requests', type=int, default=200, help="Solicitudes por escenario")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=50.0, help="Latencia simulada de los servicios externos")
+    parser.add_argument('--jitter-ms', type=float, default=20.0)
+    parser.add_argument('--scenarios', default='', help="Escenarios separados por comas (por defecto, todos)")
+    parser.add_argument('--no-save', action='store_true', help="No guardar el resultado en benchmarks/results")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    selected = {name.strip() for name in args.scenarios.split(',') if name.strip()}
+    scenarios = [scenario for scenario in SCENARIOS if not selected or scenario[0] in selected]
+
+    workdir = prepare_workdir()
+    os.chdir(workdir)
+    stub, stub_url = start_stub_server(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000)
+    server, base_url = start_app(stub_url)
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'upstream_latency_ms': args.latency_ms,
+            'upstream_jitter_ms': args.jitter_ms
+        },
+        'scenarios': {}
+    }
+    try:
+        for name, method, path, payload in scenarios:
+            report['scenarios'][name] = run_scenario(base_url, method, path, payload, args.requests, args.concurrency)
+    finally:
+        server.shutdown()
+        stub.shutdown()
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    previous = latest_result()
+    print_report(report, previous)
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"load-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['meta']['commit'] or 'local'}.json")
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Resultado guardado en {output}")
+
+if __name__ == '__main__':
+    main()
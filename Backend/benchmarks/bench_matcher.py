@@ -0,0 +1,56 @@
+#Microbenchmark: detector compilado frente a detect_intent/detect_currencies/detect_time_period
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PREFETCH_ENABLED", "0")
+
+from bot_functions import QUERY_MATCHER, detect_intent, detect_currencies, detect_time_period
+
+QUERIES = [
+    "100 euros a dolares",
+    "¿Cuánto son 250 libras en yenes?",
+    "Muéstrame el gráfico del EUR/USD de los últimos 3 meses",
+    "predicción del dolar canadiense para 2 semanas",
+    "¿Cuál era el precio del euro hace 10 días?",
+    "compara el peso mexicano hace 1 mes y hace 2 semanas",
+    "¿Qué monedas están disponibles?",
+    "tendencia gbp/jpy 45 dias",
+    "hola, ¿cómo estás?",
+    "convertir 1000 real brasileño a franco suizo",
+    "estimación del yuan frente al dólar australiano para el próximo mes",
+    "versus chf cad",
+]
+
+def legacy(text):
+    return detect_intent(text), detect_currencies(text), detect_time_period(text)
+
+def compiled(text):
+    query = QUERY_MATCHER.match(text)
+    return query['intent'], query['currencies'], query['period']
+
+def check_equivalence():
+    """
+    La intención y el período deben coincidir; las monedas pueden diferir solo en el orden
+    (ahora en orden de aparición) o al preferir el nombre más largo ('dolar canadiense').
+    """
+    for text in QUERIES:
+        old, new = legacy(text), compiled(text)
+        assert old[0] == new[0], f"Intención distinta para {text!r}: {old[0]} != {new[0]}"
+        assert old[2] == new[2], f"Período distinto para {text!r}: {old[2]} != {new[2]}"
+        if old[1] != new[1]:
+            print(f"  monedas {text!r}: {old[1]} -> {new[1]}")
+
+def run(number=2000):
+    check_equivalence()
+    results = {}
+    for name, func in (('legacy', legacy), ('compiled', compiled)):
+        seconds = timeit.timeit(lambda: [func(text) for text in QUERIES], number=number)
+        results[name] = seconds / (number * len(QUERIES)) * 1e6
+        print(f"{name:>8}: {results[name]:.2f} µs por consulta")
+    print(f" speedup: {results['legacy'] / results['compiled']:.2f}x")
+    return results
+
+if __name__ == '__main__':
+    run()
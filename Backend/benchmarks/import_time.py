@@ -0,0 +1,64 @@
+#Informe del tiempo de importación de app.py (arranque en frío de un worker)
+import os
+import re
+import json
+import sys
+import argparse
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+
+# Dependencias pesadas que solo deben cargarse cuando la intención que las usa se ejecuta
+LAZY_MODULES = ('matplotlib', 'openai', 'pandas')
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+def measure(module='app'):
+    """
+    Importa module en un proceso nuevo con -X importtime.
+    Retorna (microsegundos totales, [(cumulativo, propio, nombre)] de primer nivel, módulos cargados).
+    """
+    code = (
+        "import sys, json; "
+        f"sys.path.insert(0, {BACKEND_DIR!r}); "
+        f"import {module}; "
+        "print(json.dumps(sorted(sys.modules)))"
+    )
+    env = dict(os.environ, PREFETCH_ENABLED='0')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=REPO_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((int(cumulative_us), int(self_us), len(indent), name))
+
+    # El módulo importado es la última línea de nivel superior; sus hijos directos tienen la sangría siguiente
+    top_indent = min(entry[2] for entry in entries)
+    total = next(entry[0] for entry in reversed(entries) if entry[2] == top_indent and entry[3] == module)
+    children = [(c, s, name) for c, s, indent, name in entries if indent in (top_indent, top_indent + 2)]
+    loaded = set(json.loads(result.stdout.strip().splitlines()[-1]))
+    return total, children, loaded
+
+if __name__ == '__main__':
+    # Uso: python import_time.py [--budget-ms 500] [--top 15]
+    parser = argparse.ArgumentParser(description="Tiempo de importación de la aplicación")
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--budget-ms', type=float, default=500.0)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    total, children, loaded = measure(args.module)
+    print(f"{'ms acumulado':>13}{'ms propio':>11}  módulo")
+    for cumulative, own, name in sorted(children, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:>13.1f}{own / 1000:>11.1f}  {name}")
+    print(f"\nTotal importando {args.module}: {total / 1000:.1f} ms (límite {args.budget_ms:.0f} ms)")
+
+    eager = [name for name in LAZY_MODULES if name in loaded]
+    if eager:
+        print(f"Cargados al arrancar y deberían ser diferidos: {', '.join(eager)}")
+    sys.exit(1 if eager or total / 1000 > args.budget_ms else 0)
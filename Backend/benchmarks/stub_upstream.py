@@ -0,0 +1,141 @@
+#Servidor local que imita Alpha Vantage y OpenAI para medir sin claves ni red
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Tasas de referencia (1 USD = x) para construir respuestas coherentes entre pares
+USD_RATES = {
+    'USD': 1.0, 'EUR': 0.925, 'GBP': 0.775, 'JPY': 149.5, 'CAD': 1.36, 'AUD': 1.52, 'CHF': 0.88,
+    'CNY': 7.23, 'MXN': 17.1, 'BRL': 5.02, 'INR': 83.3
+}
+
+def stub_rate(base_currency, target_currency, day_offset=0):
+    """
+    Tasa sintética del par con una oscilación suave por día.
+    """
+    base = USD_RATES.get(base_currency, 1.0)
+    target = USD_RATES.get(target_currency, 1.0)
+    return target / base * (1 + 0.01 * math.sin(day_offset / 5.0))
+
+def exchange_rate_payload(params):
+    base_currency, target_currency = params.get('from_currency', 'USD'), params.get('to_currency', 'EUR')
+    rate = stub_rate(base_currency, target_currency) * (1 + random.uniform(-0.0005, 0.0005))
+    return {"Realtime Currency Exchange Rate": {
+        "1. From_Currency Code": base_currency,
+        "3. To_Currency Code": target_currency,
+        "5. Exchange Rate": f"{rate:.6f}",
+        "6. Last Refreshed": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    }}
+
+def fx_daily_payload(params):
+    base_currency, target_currency = params.get('from_symbol', 'USD'), params.get('to_symbol', 'EUR')
+    days = 100 if params.get('outputsize', 'compact') == 'compact' else 5000
+    today = datetime.utcnow().date()
+    series = {}
+    for offset in range(days):
+        rate = stub_rate(base_currency, target_currency, offset)
+        series[(today - timedelta(days=offset)).isoformat()] = {
+            "1. open": f"{rate:.5f}", "2. high": f"{rate * 1.002:.5f}",
+            "3. low": f"{rate * 0.998:.5f}", "4. close": f"{rate:.5f}"
+        }
+    return {"Meta Data": {"2. From Symbol": base_currency, "3. To Symbol": target_currency},
+            "Time Series FX (Daily)": series}
+
+def news_payload(params):
+    now = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    return {"feed": [
+        {"title": f"EUR y USD: noticia de prueba {i}", "summary": "El euro frente al dólar.", "url": f"http://localhost/news/{i}",
+         "time_published": now, "source": "stub", "topics": [{"topic": "forex"}]}
+        for i in range(8)
+    ]}
+
+ALPHA_VANTAGE_FUNCTIONS = {
+    'CURRENCY_EXCHANGE_RATE': exchange_rate_payload,
+    'FX_DAILY': fx_daily_payload,
+    'NEWS_SENTIMENT': news_payload
+}
+
+def chat_completion_payload(body):
+    """
+    Respuesta de chat.completions con el JSON que espera analyze_text_with_openai.
+    """
+    content = json.dumps({"amount": 100, "source_currency": "EUR", "target_currency": "USD"})
+    return {
+        "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+        "model": body.get("model", "gpt-3.5-turbo"),
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    }
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0   # segundos añadidos a cada respuesta
+    jitter = 0.0    # variación aleatoria máxima en segundos
+
+    def log_message(self, format, *args):
+        pass
+
+    def _delay(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        handler = ALPHA_VANTAGE_FUNCTIONS.get(params.get('function'))
+        if url.path.rstrip('/') != '/query' or handler is None:
+            self._send_json({"Error Message": "Invalid API call."}, 404)
+            return
+        self._delay()
+        self._send_json(handler(params))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if not urlparse(self.path).path.endswith('/chat/completions'):
+            self._send_json({"error": {"message": "Not found"}}, 404)
+            return
+        self._delay()
+        self._send_json(chat_completion_payload(body))
+
+def start_stub_server(host='127.0.0.1', port=0, latency=0.0, jitter=0.0):
+    """
+    Arranca el servidor en un hilo. Retorna (servidor, url_base).
+    """
+    handler = type('ConfiguredStubHandler', (StubHandler,), {'latency': latency, 'jitter': jitter})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='stub-upstream', daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+if __name__ == '__main__':
+    # Uso: python stub_upstream.py --port 8765 --latency-ms 150
+    parser = argparse.ArgumentParser(description="Imitación local de Alpha Vantage y OpenAI")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.host, args.port, args.latency_ms / 1000, args.jitter_ms / 1000)
+    print(f"ALPHA_VANTAGE_BASE_URL={url}")
+    print(f"OPENAI_BASE_URL={url}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
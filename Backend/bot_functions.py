@@ -1,18 +1,35 @@
 #Funciones del bot
-import requests
 import logging
 import os
+import time
+import threading
 from dotenv import load_dotenv
 import json
 from datetime import datetime, timedelta
 import numpy as np
-import matplotlib.pyplot as plt
 from io import BytesIO
-import openai
-import pandas as pd
-import csv
 import re
+import hashlib
 from pathlib import Path
+from tick_store import TickStore, TICK_DTYPE, to_epoch, from_epoch, epoch_to_date_strings, epoch_to_hour_strings
+from rollups import HOURLY, DAILY
+from time_index import TimeIndex, NEAREST
+from quote_cache import QuoteCache, parse_ttl_overrides
+from http_client import UpstreamClient
+from rate_matrix import RateMatrix
+from historical_matrix import HistoricalMatrix
+from quota import AdmissionController, QuotaExceeded, upstream_priority, current_priority, mask_key, INTERACTIVE, NEWS, BACKGROUND
+from prefetch import PrefetchScheduler
+from intent_matcher import QueryMatcher
+from lru_cache import LRUCache
+from chart_renderer import render_rate_chart, render_rate_svg
+from downsample import lttb
+from forecasting import ForecastRegistry, MODEL_TYPES, build_state
+from io_pipeline import IOPipeline
+from quote_stream import QuoteStream
+from metrics import MetricsRegistry, SIZE_BUCKETS
+from shared_cache import SharedCache
+from request_memo import memoize_in_request, current_memo
 
 # Configuración de logging
 logging.basicConfig(
@@ -25,10 +42,68 @@ logger = logging.getLogger(__name__)
 load_dotenv("keys.env")
 
 ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_API_KEY")
+# Varias claves separadas por comas reparten la cuota (ALPHA_API_KEYS="clave1,clave2")
+ALPHA_VANTAGE_API_KEYS = [key.strip() for key in os.getenv("ALPHA_API_KEYS", "").split(',') if key.strip()] or [ALPHA_VANTAGE_API_KEY]
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Configurar la API de OpenAI
-openai.api_key = OPENAI_API_KEY
+# El cliente de OpenAI se importa la primera vez que hace falta (solo conversiones ambiguas)
+_openai = None
+
+def get_openai():
+    """
+    Importa y configura openai bajo demanda; su importación cuesta más que todo el arranque.
+    """
+    global _openai
+    if _openai is None:
+        import openai
+        openai.api_key = OPENAI_API_KEY
+        _openai = openai
+    return _openai
+
+# Cliente compartido para Alpha Vantage (ALPHA_VANTAGE_BASE_URL permite usar un servidor local)
+ALPHA_VANTAGE_CLIENT = UpstreamClient(
+    os.getenv("ALPHA_VANTAGE_BASE_URL", "https://www.alphavantage.co"),
+    connect_timeout=float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3.05")),
+    read_timeout=float(os.getenv("UPSTREAM_READ_TIMEOUT", "10")),
+    max_retries=int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+)
+
+# Métricas de latencia por intención y etapa, llamadas externas y cachés (expuestas en /metrics)
+METRICS = MetricsRegistry()
+METRICS.describe('request_seconds', 'Latencia de las solicitudes HTTP por endpoint e intención')
+METRICS.describe('stage_seconds', 'Latencia de cada etapa interna del procesamiento')
+METRICS.describe('upstream_seconds', 'Latencia de las llamadas a servicios externos')
+METRICS.describe('upstream_requests', 'Llamadas a servicios externos por resultado')
+METRICS.describe('history_read_records', 'Registros leídos del almacén local por consulta')
+
+def alpha_vantage_query(**params):
+    """
+    Llama al endpoint /query de Alpha Vantage con una clave con presupuesto y devuelve el JSON.
+    Lanza QuotaExceeded si el control de admisión rechaza la llamada o si el proveedor
+    responde con el aviso de límite; quien llama debe responder con datos locales.
+    """
+    endpoint = params.get('function')
+    priority = current_priority()
+    try:
+        key = ALPHA_VANTAGE_QUOTA.acquire(priority)
+    except QuotaExceeded:
+        METRICS.inc('upstream_requests', service='alpha_vantage', endpoint=endpoint, priority=priority, outcome='quota_denied')
+        raise
+    params['apikey'] = key
+    outcome = 'error'
+    try:
+        with METRICS.timer('upstream_seconds', service='alpha_vantage', endpoint=endpoint):
+            data = ALPHA_VANTAGE_CLIENT.get_json('query', params=params)
+        # Alpha Vantage responde 200 con 'Note'/'Information' cuando se supera el límite
+        message = ALPHA_VANTAGE_QUOTA.report(key, data)
+        if message:
+            outcome = 'rate_limited'
+            logger.warning(f"Límite de Alpha Vantage alcanzado con la clave {mask_key(key)}: {message}")
+            raise QuotaExceeded(f"Alpha Vantage rechazó la llamada a {endpoint} por límite de uso")
+        outcome = 'ok'
+        return data
+    finally:
+        METRICS.inc('upstream_requests', service='alpha_vantage', endpoint=endpoint, priority=priority, outcome=outcome)
 
 # Diccionario de códigos de moneda
 CURRENCY_CODES = {
@@ -46,9 +121,151 @@ CURRENCY_CODES = {
 
 # Carpeta para almacenar los datos históricos
 DATA_FOLDER = 'data'
+HISTORICAL_FOLDER = 'historical_data'
+
+# Caché compartida por todos los workers del equipo (SQLite en modo WAL); SHARED_CACHE_ENABLED=0 la desactiva
+SHARED_CACHE = SharedCache(
+    os.getenv("SHARED_CACHE_PATH", os.path.join(DATA_FOLDER, 'shared_cache.sqlite'))
+) if os.getenv("SHARED_CACHE_ENABLED", "1") == "1" else None
+if SHARED_CACHE:
+    SHARED_CACHE.purge_expired()
+
+# Límites de Alpha Vantage por clave (plan gratuito por defecto). Las consultas interactivas
+# esperan hasta ALPHA_VANTAGE_MAX_WAIT segundos por una ficha; noticias y precarga no esperan.
+# El saldo se guarda en la caché compartida: todos los workers y la carga masiva gastan el mismo.
+ALPHA_VANTAGE_QUOTA = AdmissionController(
+    ALPHA_VANTAGE_API_KEYS,
+    per_minute=int(os.getenv("ALPHA_VANTAGE_CALLS_PER_MINUTE", "5")),
+    per_day=int(os.getenv("ALPHA_VANTAGE_CALLS_PER_DAY", "25")),
+    max_wait={INTERACTIVE: float(os.getenv("ALPHA_VANTAGE_MAX_WAIT", "5"))},
+    shared=SHARED_CACHE
+)
+
+# Caché de cotizaciones: TTL por defecto y por par (QUOTE_CACHE_TTLS="EUR_USD=30,USD_JPY=10")
+QUOTE_CACHE = QuoteCache(
+    default_ttl=float(os.getenv("QUOTE_CACHE_TTL", "60")),
+    ttls=parse_ttl_overrides(os.getenv("QUOTE_CACHE_TTLS")),
+    shared=SHARED_CACHE
+)
+
+# Spread ficticio aplicado a cada lado del precio medio (0.5% total)
+SPREAD_RATIO = 0.0025
+
+# Variación mínima del precio medio para guardar una cotización o enviarla a los clientes en vivo
+PRICE_CHANGE_THRESHOLD = 0.0001
+
+# Matriz de tasas con base USD para derivar pares cruzados sin llamar a la API.
+# Con CROSS_RATE_MAX_AGE (segundos) se responde desde la matriz si ambos tramos son más recientes.
+RATE_MATRIX = RateMatrix('USD')
+CROSS_RATE_MAX_AGE = float(os.getenv("CROSS_RATE_MAX_AGE")) if os.getenv("CROSS_RATE_MAX_AGE") else None
+
+# Antigüedad máxima (segundos) de una cotización local usada cuando falla la llamada en vivo;
+# por defecto 3 días, para cubrir un fin de semana sin cotizaciones
+QUOTE_FALLBACK_MAX_AGE = float(os.getenv("QUOTE_FALLBACK_MAX_AGE", str(3 * 86400)))
+_rate_matrix_loaded = False
+
+# USD_historical.json compilado a una matriz fechas × monedas (.npy con mmap + índice lateral)
+HISTORICAL_MATRIX = HistoricalMatrix(os.path.join(HISTORICAL_FOLDER, 'USD_historical.json'))
 if not os.path.exists(DATA_FOLDER):
     os.makedirs(DATA_FOLDER)
 
+# Almacén binario de cotizaciones (reemplaza a los archivos {PAR}_history.csv)
+TICK_STORE = TickStore(os.path.join(DATA_FOLDER, 'ticks'))
+TIME_INDEX = TimeIndex(TICK_STORE)
+
+# Sufijo de las series diarias (FX_DAILY) dentro del almacén
+DAILY_SUFFIX = '_daily'
+_imported_pairs = set()
+
+def get_pair_store(base_currency, target_currency):
+    """
+    Devuelve el nombre del par en el almacén, importando una sola vez el CSV heredado si existe.
+    """
+    pair = f"{base_currency}_{target_currency}"
+    if pair not in _imported_pairs:
+        _imported_pairs.add(pair)
+        csv_path = os.path.join(DATA_FOLDER, f"{pair}_history.csv")
+        if os.path.isfile(csv_path) and not TICK_STORE.has_pair(pair):
+            try:
+                TICK_STORE.import_csv(csv_path, pair)
+            except Exception as e:
+                logger.error(f"Error al importar el CSV histórico de {pair}: {e}")
+    return pair
+
+# Precarga en segundo plano: refresca cotización y serie diaria de los pares más consultados
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", "60"))
+PREFETCHER = PrefetchScheduler(
+    refresh_quote=lambda base, target: prefetch_quote(base, target),
+    refresh_daily=lambda base, target: prefetch_daily_series(base, target),
+    quota=ALPHA_VANTAGE_QUOTA,
+    interval=PREFETCH_INTERVAL,
+    top_n=int(os.getenv("PREFETCH_TOP_PAIRS", "5")),
+    quote_due=lambda base, target: QUOTE_CACHE.expires_in(f"{base}_{target}") < PREFETCH_INTERVAL
+)
+
+# Palabras clave para cada intención, en orden de prioridad
+INTENT_KEYWORDS = {
+    'currencies': ['monedas disponibles', 'divisas disponibles', 'qué monedas', 'que monedas', 'cuáles monedas', 'cuales monedas', 'qué divisas', 'que divisas'],
+    'history': ['hace', 'anterior', 'pasado', 'antes', 'historia', 'histórico', 'historico', 'atrás', 'atras'],
+    'compare': ['compara', 'comparar', 'comparación', 'comparacion', 'diferencia', 'versus', 'vs', 'cambio entre'],
+    'prediction': ['predicción', 'prediccion', 'predecir', 'futuro', 'prever', 'pronóstico', 'pronostico', 'estimación', 'estimacion'],
+    'graph': ['gráfico', 'grafico', 'gráfica', 'grafica', 'chart', 'tendencia', 'histórico', 'historico'],
+    'conversion': ['convertir', 'cambiar', 'conversion', 'conversión', 'equivale', 'valor', 'cuánto', 'cuanto', 'a dólares', 'a euros']
+}
+
+# Unidades de tiempo reconocidas tras un número y palabras para el período por defecto
+PERIOD_UNITS = {
+    'days': ['día', 'dia', 'días', 'dias', 'day', 'days'],
+    'weeks': ['semana', 'semanas', 'week', 'weeks'],
+    'months': ['mes', 'meses', 'month', 'months']
+}
+PERIOD_WORDS = {
+    'weeks': ['semana', 'week'],
+    'months': ['mes', 'month']
+}
+
+# Detector compilado una sola vez: intención, monedas y período en una pasada
+QUERY_MATCHER = QueryMatcher(INTENT_KEYWORDS, CURRENCY_CODES, PERIOD_UNITS, PERIOD_WORDS)
+_CURRENCY_CODE_SET = set(CURRENCY_CODES.values())
+
+@memoize_in_request('query')
+@METRICS.timed('stage_seconds', stage='intent_detection')
+def analyze_query(text, record_demand=True):
+    """
+    Analiza el texto en una sola pasada.
+    Retorna {'intent', 'currencies' (en orden de aparición), 'period'}.
+    """
+    query = QUERY_MATCHER.match(text)
+    
+    # Registrar la demanda del par resultante para la precarga en segundo plano
+    currencies = query['currencies']
+    if record_demand and currencies:
+        PREFETCHER.record(currencies[0], currencies[1] if len(currencies) >= 2 else "USD")
+    
+    return query
+
+def resolve_pair(currencies):
+    """
+    Par de una consulta a partir de las monedas detectadas (USD como destino por defecto).
+    """
+    if len(currencies) >= 2:
+        return currencies[0], currencies[1]
+    if len(currencies) == 1:
+        return currencies[0], "USD"
+    return "USD", "EUR"
+
+def period_to_days(period):
+    """
+    Días equivalentes de un período {'type', 'value'} (un mes cuenta como 30 días).
+    """
+    return period['value'] * {'days': 1, 'weeks': 7, 'months': 30}.get(period['type'], 0)
+
+def detect_second_period(text):
+    """
+    Segundo período de una comparación ('... hace 2 semanas y hace 1 mes') o None.
+    """
+    return analyze_query(text.split("y")[1], record_demand=False)['period'] if "y" in text else None
+
 # Modificar la función detect_intent para agregar la detección de consultas sobre monedas disponibles
 def detect_intent(text):
     """
@@ -57,38 +274,11 @@ def detect_intent(text):
     """
     text = text.lower()
     
-    # Palabras clave para cada intención
-    conversion_keywords = ['convertir', 'cambiar', 'conversion', 'conversión', 'equivale', 'valor', 'cuánto', 'cuanto', 'a dólares', 'a euros']
-    graph_keywords = ['gráfico', 'grafico', 'gráfica', 'grafica', 'chart', 'tendencia', 'histórico', 'historico']
-    prediction_keywords = ['predicción', 'prediccion', 'predecir', 'futuro', 'prever', 'pronóstico', 'pronostico', 'estimación', 'estimacion']
-    history_keywords = ['hace', 'anterior', 'pasado', 'antes', 'historia', 'histórico', 'historico', 'atrás', 'atras']
-    compare_keywords = ['compara', 'comparar', 'comparación', 'comparacion', 'diferencia', 'versus', 'vs', 'cambio entre']
-    currencies_keywords = ['monedas disponibles', 'divisas disponibles', 'qué monedas', 'que monedas', 'cuáles monedas', 'cuales monedas', 'qué divisas', 'que divisas']
-    
-    # Buscar palabras clave en el texto
-    for keyword in currencies_keywords:
-        if keyword in text:
-            return "currencies"
-            
-    for keyword in history_keywords:
-        if keyword in text:
-            return "history"
-    
-    for keyword in compare_keywords:
-        if keyword in text:
-            return "compare"
-    
-    for keyword in prediction_keywords:
-        if keyword in text:
-            return "prediction"
-        
-    for keyword in graph_keywords:
-        if keyword in text:
-            return "graph"
-    
-    for keyword in conversion_keywords:
-        if keyword in text:
-            return "conversion"
+    # Buscar palabras clave en el texto, por orden de prioridad
+    for intent, keywords in INTENT_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in text:
+                return intent
     
     # Verificar si hay números y monedas (probable conversión)
     if any(c.isdigit() for c in text) and any(currency in text for currency in CURRENCY_CODES.keys()):
@@ -115,9 +305,9 @@ def detect_currencies(text):
         parts = pair.split('/')
         if len(parts) == 2:
             base, quote = parts
-            if base.upper() in [code.upper() for code in CURRENCY_CODES.values()]:
+            if base.upper() in _CURRENCY_CODE_SET:
                 detected_currencies.append(base.upper())
-            if quote.upper() in [code.upper() for code in CURRENCY_CODES.values()]:
+            if quote.upper() in _CURRENCY_CODE_SET:
                 detected_currencies.append(quote.upper())
     
     # Buscar nombres de monedas en el texto
@@ -125,6 +315,7 @@ def detect_currencies(text):
         if name in text and code not in detected_currencies:
             detected_currencies.append(code)
     
+    # La demanda del par se registra una sola vez por consulta, en analyze_query
     return detected_currencies
 
 def detect_time_period(text):
@@ -163,22 +354,109 @@ def detect_time_period(text):
     else:
         return {'type': 'days', 'value': 7}  # Por defecto, una semana
 
+# Caché de solicitudes de conversión ya analizadas (clave: texto normalizado)
+CONVERSION_PARSE_CACHE = LRUCache(maxsize=int(os.getenv("CONVERSION_PARSE_CACHE_SIZE", "2048")))
+CONVERSION_PARSE_SHARED_TTL = 7 * 86400
+_conversion_parse_counts = {'fast_path': 0, 'llm': 0, 'rules': 0}
+_conversion_parser_backend = None
+_AMOUNT_PATTERN = re.compile(r'\d+(?:[.,]\d+)?')
+
+def set_conversion_parser_backend(backend):
+    """
+    Reemplaza el analizador externo (por defecto analyze_text_with_openai), p. ej. por un stub local.
+    backend(text) debe devolver {'amount', 'source_currency', 'target_currency'} o None.
+    """
+    global _conversion_parser_backend
+    _conversion_parser_backend = backend
+    CONVERSION_PARSE_CACHE.clear()
+
+def normalize_query_text(text):
+    """
+    Normaliza el texto para usarlo como clave de caché: minúsculas, sin signos de puntuación
+    de apertura/cierre y con los espacios colapsados.
+    """
+    text = re.sub(r'[¿?¡!]', ' ', text.lower())
+    return ' '.join(text.split())
+
+def parse_conversion_locally(text):
+    """
+    Resuelve sin OpenAI las solicitudes inequívocas: una sola cantidad seguida directamente
+    de su moneda de origen y exactamente otra moneda como destino ('100 euros a dolares').
+    Retorna (amount, source_currency, target_currency) o None si la solicitud es ambigua.
+    """
+    numbers = list(_AMOUNT_PATTERN.finditer(text))
+    if len(numbers) != 1:
+        return None
+    number = numbers[0]
+    
+    # '1.000' o '1,000' pueden ser separadores de miles: se deja a OpenAI
+    if re.fullmatch(r'\d+[.,]\d{3}', number.group(0)):
+        return None
+    
+    spans = QUERY_MATCHER.currency_spans(text)
+    codes = list(dict.fromkeys(code for _, _, code in spans))
+    if len(codes) != 2:
+        return None
+    
+    # La moneda de origen debe ir justo después de la cantidad
+    following = [span for span in spans if span[0] >= number.end()]
+    if not following or text[number.end():following[0][0]].strip():
+        return None
+    source_currency = following[0][2]
+    target_currency = codes[1] if codes[0] == source_currency else codes[0]
+    
+    return float(number.group(0).replace(',', '.')), source_currency, target_currency
+
+def get_conversion_parser_stats():
+    """
+    Uso de cada vía de análisis (local, OpenAI, reglas) y estado de la caché.
+    """
+    return {**_conversion_parse_counts, 'cache': CONVERSION_PARSE_CACHE.stats()}
+
+@memoize_in_request('conversion_parse')
+@METRICS.timed('stage_seconds', stage='conversion_parse')
 def check_conversion_request(text):
     """
     Analiza el texto para identificar una solicitud de conversión.
     Retorna amount, source_currency, target_currency
     """
     text = text.lower()
+    cache_key = normalize_query_text(text)
+    
+    cached = CONVERSION_PARSE_CACHE.get(cache_key)
+    if cached:
+        return cached
+    
+    # Análisis ya hecho por otro worker (evita repetir la llamada a OpenAI)
+    cached = SHARED_CACHE.get(f"parse:{cache_key}") if SHARED_CACHE else None
+    if cached:
+        CONVERSION_PARSE_CACHE.put(cache_key, cached)
+        return cached
+    
+    # Vía rápida: solicitudes inequívocas sin llamar a OpenAI
+    local_result = parse_conversion_locally(cache_key)
+    if local_result:
+        _conversion_parse_counts['fast_path'] += 1
+        CONVERSION_PARSE_CACHE.put(cache_key, local_result)
+        return local_result
     
     try:
-        # Primero intentamos con NLP
-        nlp_result = analyze_text_with_openai(text)
-        if nlp_result and all(key in nlp_result for key in ['amount', 'source_currency', 'target_currency']):
-            return nlp_result['amount'], nlp_result['source_currency'], nlp_result['target_currency']
+        # Solicitud ambigua: intentamos con NLP
+        backend = _conversion_parser_backend or analyze_text_with_openai
+        nlp_result = backend(text)
+        if nlp_result and all(nlp_result.get(key) for key in ['amount', 'source_currency', 'target_currency']):
+            result = (float(nlp_result['amount']), nlp_result['source_currency'], nlp_result['target_currency'])
+            _conversion_parse_counts['llm'] += 1
+            CONVERSION_PARSE_CACHE.put(cache_key, result)
+            if SHARED_CACHE:
+                SHARED_CACHE.put(f"parse:{cache_key}", result, CONVERSION_PARSE_SHARED_TTL)
+            return result
     except Exception as e:
         logger.error(f"Error al usar OpenAI para analizar el texto: {e}")
         # Continuamos con el método basado en reglas
     
+    _conversion_parse_counts['rules'] += 1
+    
     # Método alternativo basado en reglas si NLP falla
     # Buscar números en el texto
     amount = None
@@ -223,14 +501,20 @@ def analyze_text_with_openai(text):
     Utiliza la API de OpenAI para analizar el texto y extraer información relevante.
     """
     try:
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "Eres un asistente que analiza solicitudes de conversión de divisas. Extrae la cantidad, la moneda de origen y la moneda de destino del texto del usuario."},
-                {"role": "user", "content": text}
-            ],
-            response_format={"type": "json_object"}
-        )
+        outcome = 'error'
+        try:
+            with METRICS.timer('upstream_seconds', service='openai', endpoint='chat.completions'):
+                response = get_openai().chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=[
+                        {"role": "system", "content": "Eres un asistente que analiza solicitudes de conversión de divisas. Extrae la cantidad, la moneda de origen y la moneda de destino del texto del usuario."},
+                        {"role": "user", "content": text}
+                    ],
+                    response_format={"type": "json_object"}
+                )
+            outcome = 'ok'
+        finally:
+            METRICS.inc('upstream_requests', service='openai', endpoint='chat.completions', outcome=outcome)
         
         result = json.loads(response.choices[0].message.content)
         
@@ -248,146 +532,512 @@ def analyze_text_with_openai(text):
         logger.error(f"Error al analizar el texto con OpenAI: {e}")
         return None
 
+@memoize_in_request('quote')
+@METRICS.timed('stage_seconds', stage='quote')
 def get_forex_quote(base_currency, target_currency):
+    """
+    Obtiene la cotización actual de un par de divisas.
+    Usa la caché de cotizaciones y agrupa las solicitudes simultáneas del mismo par.
+    """
+    # Si la tasa cruzada es suficientemente reciente no hace falta llamar a la API
+    if CROSS_RATE_MAX_AGE is not None:
+        cross_quote = get_cross_quote(base_currency, target_currency, CROSS_RATE_MAX_AGE)
+        if cross_quote:
+            return cross_quote
+    
+    quote = QUOTE_CACHE.get_or_fetch(base_currency, target_currency, fetch_forex_quote)
+    if quote:
+        return quote
+    
+    # Cotización directa no disponible (sin cuota o error): usar la más reciente entre
+    # la última guardada del par y la derivada de la matriz de tasas, si no supera QUOTE_FALLBACK_MAX_AGE
+    fallbacks = [q for q in (get_stored_quote(base_currency, target_currency), get_cross_quote(base_currency, target_currency))
+                 if q and time.time() - to_epoch(q['timestamp']) <= QUOTE_FALLBACK_MAX_AGE]
+    if not fallbacks:
+        logger.warning(f"Sin cotización reciente para {base_currency}/{target_currency}")
+        return None
+    quote = max(fallbacks, key=lambda q: to_epoch(q['timestamp']))
+    logger.info(f"Usando cotización local ({quote['source']}) para {base_currency}/{target_currency} del {quote['timestamp']}")
+    return quote
+
+def get_stored_quote(base_currency, target_currency):
+    """
+    Última cotización guardada del par en el almacén local, o None si no hay.
+    """
+    try:
+        last = TICK_STORE.last(get_pair_store(base_currency, target_currency))
+    except Exception as e:
+        logger.error(f"Error al leer la última cotización guardada: {e}")
+        return None
+    if last is None:
+        return None
+    return {
+        'mid_price': float(last['mid_price']),
+        'bid_price': float(last['bid_price']),
+        'ask_price': float(last['ask_price']),
+        'timestamp': from_epoch(last['timestamp']).strftime('%Y-%m-%d %H:%M:%S'),
+        'source': 'stored'
+    }
+
+def quote_from_mid(mid_price, timestamp):
+    """
+    Construye una cotización con bid/ask a partir del precio medio y el spread ficticio.
+    """
+    spread = mid_price * SPREAD_RATIO
+    return {
+        'mid_price': mid_price,
+        'bid_price': mid_price - spread,
+        'ask_price': mid_price + spread,
+        'timestamp': timestamp
+    }
+
+def get_historical_matrix():
+    """
+    Devuelve la matriz fecha × moneda de USD_historical.json (recompilada si el JSON cambió)
+    o None si el archivo no existe o no se pudo cargar.
+    """
+    if not os.path.isfile(HISTORICAL_MATRIX.json_path):
+        return None
+    try:
+        return HISTORICAL_MATRIX.load()
+    except Exception as e:
+        logger.error(f"Error al cargar la matriz histórica: {e}")
+        return None
+
+def get_rate_matrix():
+    """
+    Devuelve la matriz de tasas, cargando la primera vez las últimas tasas de USD_historical.json.
+    """
+    global _rate_matrix_loaded
+    if not _rate_matrix_loaded:
+        _rate_matrix_loaded = True
+        matrix = get_historical_matrix()
+        if matrix:
+            RATE_MATRIX.load_historical_matrix(matrix)
+    return RATE_MATRIX
+
+def get_cross_quote(base_currency, target_currency, max_age=None):
+    """
+    Deriva la cotización de un par desde la matriz de tasas.
+    Retorna None si falta algún tramo o si el más antiguo supera max_age segundos.
+    """
+    matrix = get_rate_matrix()
+    cross = matrix.cross(base_currency, target_currency)
+    if not cross:
+        return None
+    if max_age is not None and matrix.age(base_currency, target_currency) > max_age:
+        return None
+    quote = quote_from_mid(cross['mid_price'], from_epoch(cross['as_of']).strftime('%Y-%m-%d %H:%M:%S'))
+    quote['source'] = 'cross'
+    return quote
+
+def get_quote_cache_stats():
+    """
+    Devuelve los aciertos y fallos de la caché de cotizaciones.
+    """
+    return QUOTE_CACHE.stats()
+
+def prefetch_quote(base_currency, target_currency):
+    """
+    Refresca la cotización de un par desde la precarga y la deja en la caché.
+    """
+    quote = fetch_forex_quote(base_currency, target_currency)
+    if quote:
+        QUOTE_CACHE.put(base_currency, target_currency, quote)
+    return quote is not None
+
+def prefetch_daily_series(base_currency, target_currency):
+    """
+    Sincroniza la serie diaria FX_DAILY de un par en el almacén local.
+    """
+    try:
+        return sync_daily_series(base_currency, target_currency, force=True) is not None
+    except QuotaExceeded as e:
+        logger.info(f"Precarga de la serie diaria de {base_currency}/{target_currency} omitida: {e}")
+        return False
+
+def stream_quote(base_currency, target_currency):
+    """
+    Cotización para el sondeo en vivo: pasa por la caché y gasta cuota como BACKGROUND,
+    de modo que los clientes conectados no consumen la reserva de las consultas interactivas.
+    """
+    with upstream_priority(BACKGROUND):
+        return get_forex_quote(base_currency, target_currency)
+
+# Difusión en vivo: un sondeo por par compartido por todos los clientes de /stream/quotes
+QUOTE_STREAM = QuoteStream(
+    stream_quote,
+    interval=float(os.getenv("STREAM_POLL_INTERVAL", "30")),
+    threshold=PRICE_CHANGE_THRESHOLD
+)
+
+def start_prefetch_scheduler():
+    """
+    Inicia el hilo de precarga de los pares más consultados.
+    """
+    PREFETCHER.start()
+
+def get_prefetch_stats():
+    return PREFETCHER.stats()
+
+def convert_batch(amounts, source_currencies, target_currencies):
+    """
+    Convierte muchas filas (cantidad, origen, destino) a la vez.
+    Cada par distinto se cotiza una sola vez con get_forex_quote y el cálculo se hace con NumPy.
+    Retorna un diccionario de arrays alineados con la entrada; las filas sin cotización quedan en NaN.
+    """
+    amounts = np.asarray(amounts, dtype=float)
+    sources = np.char.upper(np.asarray(source_currencies, dtype=str))
+    targets = np.char.upper(np.asarray(target_currencies, dtype=str))
+    
+    # Deduplicar los pares: cada fila apunta a su par único mediante 'inverse'
+    pair_keys = np.char.add(np.char.add(sources, '_'), targets)
+    unique_pairs, inverse = np.unique(pair_keys, return_inverse=True)
+    
+    unique_mids = np.full(len(unique_pairs), np.nan)
+    unique_timestamps = [None] * len(unique_pairs)
+    for i, pair in enumerate(unique_pairs):
+        base_currency, target_currency = pair.split('_', 1)
+        if base_currency == target_currency:
+            unique_mids[i] = 1.0
+            continue
+        quote = get_forex_quote(base_currency, target_currency)
+        if quote:
+            unique_mids[i] = quote['mid_price']
+            unique_timestamps[i] = quote['timestamp']
+    
+    mids = unique_mids[inverse]
+    return {
+        'amount': amounts,
+        'from_currency': sources,
+        'to_currency': targets,
+        'exchange_rate': mids,
+        'converted_amount': amounts * mids,
+        'bid_price': mids * (1 - SPREAD_RATIO),
+        'ask_price': mids * (1 + SPREAD_RATIO),
+        'timestamp': [unique_timestamps[i] for i in inverse],
+        'unique_pairs': len(unique_pairs)
+    }
+
+# Distancia máxima entre la fecha pedida y la tasa usada para valorar una cartera en el pasado
+# (cubre fines de semana y festivos sin cotización)
+PORTFOLIO_MAX_DATE_GAP = 4 * 86400
+CURRENT_VALUATION = 'current'
+
+def get_portfolio_rate_grid(currencies, reporting_currency, targets):
+    """
+    Tasas moneda/reporting_currency en cada fecha (segundos epoch) en una sola pasada:
+    primero el histórico local del par (una búsqueda por par para todas las fechas) y,
+    donde falte, la matriz de USD_historical.json para todas las monedas a la vez.
+    Retorna una matriz len(currencies) × len(targets) con NaN donde no hay tasa.
+    """
+    grid = np.full((len(currencies), len(targets)), np.nan)
+    if not len(targets):
+        return grid
+    targets = np.asarray(targets, dtype=np.int64)
+    for i, currency in enumerate(currencies):
+        pair = get_pair_store(currency, reporting_currency)
+        index = TIME_INDEX.get(pair)
+        if len(index) == 0:
+            continue
+        positions, rows = index.lookup(targets, NEAREST)
+        close_enough = (positions >= 0) & (np.abs(rows['timestamp'] - targets) <= PORTFOLIO_MAX_DATE_GAP)
+        grid[i] = np.where(close_enough, rows['mid_price'], np.nan)
+    
+    missing = np.isnan(grid).any(axis=1)
+    matrix = get_historical_matrix() if missing.any() else None
+    if matrix:
+        codes = [currency for currency, flag in zip(currencies, missing) if flag]
+        fallback = matrix.cross_grid(codes, reporting_currency, targets, PORTFOLIO_MAX_DATE_GAP)
+        rows = np.flatnonzero(missing)
+        grid[rows] = np.where(np.isnan(grid[rows]), fallback, grid[rows])
+    return grid
+
+def value_portfolio(positions, reporting_currency, as_of_dates=None):
+    """
+    Valora una cartera de posiciones en reporting_currency en las fechas as_of_dates y ahora.
+    positions: lista de {'currency', 'amount'} con, opcionalmente, 'cost' (coste total en
+    reporting_currency) o 'acquired' (fecha de compra, para valorar el coste con la tasa de ese día).
+    Cada tasa se resuelve una vez por moneda: las actuales con get_forex_quote en paralelo
+    (caché de cotizaciones) y las pasadas con get_portfolio_rate_grid. Valores, totales y P&L
+    se calculan con NumPy; el P&L compara el valor actual con el coste, la fecha de compra
+    o, si no hay ninguno, la primera fecha pedida con tasa disponible.
+    """
+    reporting_currency = reporting_currency.upper()
+    currencies = sorted({position['currency'] for position in positions} - {reporting_currency})
+    column_of = {currency: i for i, currency in enumerate(currencies)}
+    
+    # Fechas pasadas únicas: las de valoración y las de compra
+    valuation_days = sorted({date.date() for date in (as_of_dates or [])})
+    acquired_days = {position['acquired'].date() for position in positions if position.get('acquired')}
+    past_days = sorted(set(valuation_days) | acquired_days)
+    day_column = {day: j for j, day in enumerate(past_days)}
+    
+    results = IO_PIPELINE.gather(**{f"quote_{currency}": (get_forex_quote, currency, reporting_currency) for currency in currencies})
+    current = np.array([results[f"quote_{currency}"]['mid_price'] if results[f"quote_{currency}"] else np.nan
+                        for currency in currencies])
+    past = get_portfolio_rate_grid(currencies, reporting_currency, [to_epoch(day) for day in past_days])
+    
+    # Fila extra con tasa 1 para las posiciones ya expresadas en la moneda de reporte
+    rates = np.vstack([np.column_stack([past, current]), np.ones((1, len(past_days) + 1))])
+    rows = np.array([column_of.get(position['currency'], len(currencies)) for position in positions], dtype=np.int64)
+    amounts = np.array([position['amount'] for position in positions], dtype=float)
+    
+    valuation_columns = [day_column[day] for day in valuation_days] + [len(past_days)]
+    position_rates = rates[rows][:, valuation_columns]
+    values = amounts[:, np.newaxis] * position_rates
+    
+    # Coste: explícito, valorado en la fecha de compra o en la primera fecha pedida con tasa
+    first_known = np.argmax(~np.isnan(values), axis=1)
+    baseline = np.full(len(positions), np.nan)
+    for i, position in enumerate(positions):
+        if position.get('cost') is not None:
+            baseline[i] = position['cost']
+        elif position.get('acquired'):
+            baseline[i] = amounts[i] * rates[rows[i], day_column[position['acquired'].date()]]
+        elif valuation_days and first_known[i] < len(valuation_days):
+            baseline[i] = values[i, first_known[i]]
+    pnl = values[:, -1] - baseline
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pnl_percentage = pnl / np.abs(baseline) * 100
+    
+    labels = [day.strftime('%Y-%m-%d') for day in valuation_days] + [CURRENT_VALUATION]
+    missing = np.isnan(values)
+    
+    def number(value):
+        return None if np.isnan(value) else float(value)
+    
+    return {
+        'reporting_currency': reporting_currency,
+        'valuations': [{
+            'date': label,
+            'total': float(np.nansum(values[:, j])),
+            'complete': not missing[:, j].any(),
+            'missing_currencies': sorted({positions[i]['currency'] for i in np.flatnonzero(missing[:, j])})
+        } for j, label in enumerate(labels)],
+        'total_pnl': number(np.nansum(pnl)) if not np.isnan(pnl).all() else None,
+        'positions': [{
+            'currency': position['currency'],
+            'amount': float(amounts[i]),
+            'rates': {label: number(position_rates[i, j]) for j, label in enumerate(labels)},
+            'values': {label: number(values[i, j]) for j, label in enumerate(labels)},
+            'cost_basis': number(baseline[i]),
+            'pnl': number(pnl[i]),
+            'pnl_percentage': number(pnl_percentage[i])
+        } for i, position in enumerate(positions)],
+        'unique_currencies': len(currencies)
+    }
+
+def fetch_forex_quote(base_currency, target_currency):
     """
     Obtiene la cotización actual de un par de divisas utilizando Alpha Vantage.
-    Guarda el resultado en un archivo CSV si ha cambiado.
+    Guarda el resultado en el histórico local si ha cambiado.
     """
     try:
-        url = f"https://www.alphavantage.co/query?function=CURRENCY_EXCHANGE_RATE&from_currency={base_currency}&to_currency={target_currency}&apikey={ALPHA_VANTAGE_API_KEY}"
-        response = requests.get(url)
-        data = response.json()
+        data = alpha_vantage_query(function="CURRENCY_EXCHANGE_RATE", from_currency=base_currency, to_currency=target_currency)
         
         if "Realtime Currency Exchange Rate" in data:
             exchange_rate = data["Realtime Currency Exchange Rate"]
             mid_price = float(exchange_rate['5. Exchange Rate'])
-            # Calcular bid/ask con un spread ficticio del 0.5%
-            spread = mid_price * 0.0025
-            bid_price = mid_price - spread
-            ask_price = mid_price + spread
             timestamp = exchange_rate['6. Last Refreshed']
+            # Calcular bid/ask con un spread ficticio del 0.5%
+            quote = quote_from_mid(mid_price, timestamp)
+            quote['source'] = 'live'
             
-            # Guardar en CSV si el precio ha cambiado
-            save_rate_to_csv(base_currency, target_currency, mid_price, bid_price, ask_price, timestamp)
+            # Guardar en el histórico si el precio ha cambiado
+            save_rate_to_csv(base_currency, target_currency, mid_price, quote['bid_price'], quote['ask_price'], timestamp)
             
-            return {
-                'mid_price': mid_price,
-                'bid_price': bid_price,
-                'ask_price': ask_price,
-                'timestamp': timestamp
-            }
+            # Actualizar el tramo correspondiente de la matriz de tasas cruzadas
+            get_rate_matrix().update_pair(base_currency, target_currency, mid_price, timestamp)
+            
+            # Cualquier consulta (interactiva o de precarga) alimenta también a los clientes en vivo
+            QUOTE_STREAM.publish((base_currency, target_currency), quote)
+            
+            return quote
         else:
             logger.error(f"Error al obtener datos de Alpha Vantage: {data}")
             return None
+    except QuotaExceeded as e:
+        logger.warning(f"Cotización de {base_currency}/{target_currency} no solicitada: {e}")
+        return None
     except Exception as e:
         logger.error(f"Error al obtener la cotización: {e}")
         return None
 
 def save_rate_to_csv(base_currency, target_currency, mid_price, bid_price, ask_price, timestamp):
     """
-    Guarda la tasa de cambio en un archivo CSV.
+    Guarda la tasa de cambio en el almacén binario del par.
     Solo guarda si el precio es diferente al último guardado.
     """
     try:
-        pair = f"{base_currency}_{target_currency}"
-        file_path = os.path.join(DATA_FOLDER, f"{pair}_history.csv")
-        
-        # Comprobar si ya existe el archivo
-        file_exists = os.path.isfile(file_path)
-        
-        # Si existe, verificar si el último precio es diferente
-        if file_exists:
-            try:
-                df = pd.read_csv(file_path)
-                if not df.empty and abs(df.iloc[-1]['mid_price'] - mid_price) < 0.0001:
-                    # El precio no ha cambiado significativamente, no guardamos
-                    return
-            except Exception as e:
-                logger.error(f"Error al leer el archivo CSV: {e}")
-        
-        # Crear dataframe con los nuevos datos
-        new_data = pd.DataFrame({
-            'timestamp': [timestamp],
-            'mid_price': [mid_price],
-            'bid_price': [bid_price],
-            'ask_price': [ask_price]
-        })
-        
-        # Guardar en CSV (append si ya existe)
-        if file_exists:
-            new_data.to_csv(file_path, mode='a', header=False, index=False)
-        else:
-            new_data.to_csv(file_path, index=False)
+        pair = get_pair_store(base_currency, target_currency)
         
-        logger.info(f"Guardada nueva cotización para {pair}: {mid_price}")
+        # La comparación con el último registro y la escritura se hacen bajo el bloqueo del par,
+        # así dos workers no pueden guardar la misma cotización (si no cambió, no se guarda)
+        if TICK_STORE.append(pair, timestamp, mid_price, bid_price, ask_price, min_change=PRICE_CHANGE_THRESHOLD):
+            logger.info(f"Guardada nueva cotización para {pair}: {mid_price}")
+            # Actualizar de forma incremental los modelos de predicción del par
+            FORECASTS.on_append(pair, to_epoch(timestamp), mid_price)
     
     except Exception as e:
-        logger.error(f"Error al guardar la tasa en CSV: {e}")
+        logger.error(f"Error al guardar la tasa en el almacén: {e}")
+
+def fetch_daily_series(base_currency, target_currency, outputsize="compact"):
+    """
+    Descarga la serie FX_DAILY del par ('compact': últimos 100 días, 'full': historia completa).
+    Retorna {'dates', 'rates'} en orden cronológico o None.
+    """
+    data = alpha_vantage_query(function="FX_DAILY", from_symbol=base_currency, to_symbol=target_currency, outputsize=outputsize)
+    
+    if "Time Series FX (Daily)" not in data:
+        logger.error(f"Error al obtener datos históricos de Alpha Vantage: {data}")
+        return None
+    
+    time_series = data["Time Series FX (Daily)"]
+    dates = sorted(time_series.keys())
+    return {
+        'dates': dates,
+        'rates': [float(time_series[date]['4. close']) for date in dates]
+    }
 
 def get_historical_rates_from_api(base_currency, target_currency, days=30):
     """
     Obtiene datos históricos de tipo de cambio utilizando Alpha Vantage.
     """
     try:
-        url = f"https://www.alphavantage.co/query?function=FX_DAILY&from_symbol={base_currency}&to_symbol={target_currency}&outputsize=compact&apikey={ALPHA_VANTAGE_API_KEY}"
-        response = requests.get(url)
-        data = response.json()
-        
-        if "Time Series FX (Daily)" in data:
-            time_series = data["Time Series FX (Daily)"]
-            dates = []
-            rates = []
-            
-            # Ordenar por fecha y tomar los últimos 'days' días
-            sorted_dates = sorted(time_series.keys(), reverse=True)[:days]
-            
-            for date in sorted_dates:
-                dates.append(date)
-                rates.append(float(time_series[date]['4. close']))
-            
-            # Invertir listas para que estén en orden cronológico
-            dates.reverse()
-            rates.reverse()
-            
-            return {
-                'dates': dates,
-                'rates': rates
-            }
-        else:
-            logger.error(f"Error al obtener datos históricos de Alpha Vantage: {data}")
+        historical_data = fetch_daily_series(base_currency, target_currency)
+        if not historical_data:
             return None
+        
+        # Tomar los últimos 'days' días
+        return {
+            'dates': historical_data['dates'][-days:],
+            'rates': historical_data['rates'][-days:]
+        }
+    except QuotaExceeded as e:
+        logger.warning(f"Tasas históricas de {base_currency}/{target_currency} no solicitadas: {e}")
+        return None
     except Exception as e:
         logger.error(f"Error al obtener tasas históricas: {e}")
         return None
 
-def get_historical_rates_from_csv(base_currency, target_currency, days=30):
+# Serie diaria local: margen para considerarla al día y tiempo mínimo entre comprobaciones
+# (FX_DAILY no publica fines de semana, así que un hueco de 1-3 días puede ser normal)
+DAILY_SYNC_INTERVAL = float(os.getenv("DAILY_SYNC_INTERVAL", str(6 * 3600)))
+COMPACT_OUTPUT_DAYS = 100
+_daily_sync_checked = {}
+_daily_sync_lock = threading.Lock()
+
+def sync_daily_series(base_currency, target_currency, force=False):
+    """
+    Mantiene la serie diaria local del par: la primera vez descarga la historia completa
+    (outputsize=full) y después solo pide la cola que falta (compact si cabe en 100 días).
+    No llama a la API si la serie ya está al día o se comprobó hace menos de DAILY_SYNC_INTERVAL.
+    Retorna el número de días nuevos guardados o None si la descarga falló.
+    Lanza QuotaExceeded si el control de admisión no permite la llamada.
+    """
+    pair = f"{base_currency}_{target_currency}{DAILY_SUFFIX}"
+    now = time.time()
+    with _daily_sync_lock:
+        checked = _daily_sync_checked.get(pair)
+        if not force and checked is not None and now - checked < DAILY_SYNC_INTERVAL:
+            return 0
+        _daily_sync_checked[pair] = now
+    
+    last_day = TICK_STORE.last(pair)
+    if last_day is None:
+        outputsize = "full"
+    else:
+        missing_days = (now - int(last_day['timestamp'])) / 86400
+        if missing_days < 1:
+            return 0
+        outputsize = "compact" if missing_days < COMPACT_OUTPUT_DAYS else "full"
+    
+    try:
+        historical_data = fetch_daily_series(base_currency, target_currency, outputsize)
+    except QuotaExceeded:
+        # Sin cuota: se reintentará en la siguiente consulta; quien llama decide si usa datos locales
+        with _daily_sync_lock:
+            _daily_sync_checked.pop(pair, None)
+        raise
+    except Exception as e:
+        logger.error(f"Error al sincronizar la serie diaria de {base_currency}/{target_currency}: {e}")
+        historical_data = None
+    
+    if not historical_data:
+        # Permitir reintentar en la siguiente consulta
+        with _daily_sync_lock:
+            _daily_sync_checked.pop(pair, None)
+        return None
+    
+    saved = save_daily_rates(base_currency, target_currency, historical_data)
+    logger.info(f"Serie diaria de {base_currency}/{target_currency} ({outputsize}): {saved} días nuevos")
+    return saved
+
+# La carga masiva espera por presupuesto hasta estos segundos (la ventana por minuto); una espera
+# mayor significa que se agotó el presupuesto diario y la carga se detiene
+BACKFILL_MAX_PAUSE = float(os.getenv("BACKFILL_MAX_PAUSE", "120"))
+# Rechazos seguidos del proveedor con el mismo par antes de detener la carga
+BACKFILL_MAX_RETRIES = 3
+
+def backfill_daily_series(pairs, sleep=time.sleep):
     """
-    Obtiene datos históricos de tipo de cambio desde el archivo CSV local.
+    Trabajo de carga masiva: sincroniza la serie diaria de cada par (base, target) con prioridad
+    BACKGROUND. Sin presupuesto espera a la siguiente ficha y continúa con el mismo par; solo se
+    detiene si la espera supera BACKFILL_MAX_PAUSE (presupuesto diario agotado).
+    Retorna {par: días nuevos o None}.
+    """
+    results = {}
+    with upstream_priority(BACKGROUND):
+        for base_currency, target_currency in pairs:
+            retries = 0
+            while True:
+                try:
+                    results[f"{base_currency}/{target_currency}"] = sync_daily_series(base_currency, target_currency, force=True)
+                    break
+                except QuotaExceeded as e:
+                    pause = ALPHA_VANTAGE_QUOTA.seconds_until(BACKGROUND)
+                    retries += 1
+                    if pause > BACKFILL_MAX_PAUSE or retries > BACKFILL_MAX_RETRIES:
+                        logger.info(f"Carga masiva detenida en {base_currency}/{target_currency}: {e}")
+                        return results
+                    logger.info(f"Carga masiva en pausa {pause:.0f} s por el límite de Alpha Vantage")
+                    sleep(max(pause, 1.0))
+    return results
+
+# Ventanas de hasta estos días se leen de los agregados por hora; las más largas, de los diarios
+HOURLY_WINDOW_MAX_DAYS = 7
+
+def get_historical_rates_from_csv(base_currency, target_currency, days=30, require_coverage=False):
+    """
+    Obtiene datos históricos de tipo de cambio desde el almacén local: el cierre de cada hora
+    ('%Y-%m-%d %H:00') para ventanas cortas o de cada día ('%Y-%m-%d') para las demás.
+    Con require_coverage solo se devuelven si las cotizaciones llegan hasta el inicio de la ventana.
     """
     try:
-        pair = f"{base_currency}_{target_currency}"
-        file_path = os.path.join(DATA_FOLDER, f"{pair}_history.csv")
+        pair = get_pair_store(base_currency, target_currency)
         
-        if not os.path.isfile(file_path):
-            logger.info(f"No se encontró archivo histórico para {pair}. Intentando con API.")
+        if not TICK_STORE.has_pair(pair):
+            logger.info(f"No se encontró histórico local para {pair}. Intentando con API.")
             return None
         
-        df = pd.read_csv(file_path)
-        
-        # Convertir timestamp a datetime y ordenar
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp')
-        
-        # Filtrar por los últimos 'days' días
+        # Filtrar por los últimos 'days' días con la resolución más gruesa que sirve a la ventana
         cutoff_date = datetime.now() - timedelta(days=days)
-        df_filtered = df[df['timestamp'] >= cutoff_date]
+        resolution = HOURLY if days <= HOURLY_WINDOW_MAX_DAYS else DAILY
+        with METRICS.timer('stage_seconds', stage='history_read'):
+            bars = TICK_STORE.read_bars(pair, resolution, start=cutoff_date)
+        METRICS.observe('history_read_records', len(bars), buckets=SIZE_BUCKETS, source=resolution)
+        
+        if len(bars) == 0:
+            logger.info(f"No hay datos suficientes en el histórico local para {pair}. Intentando con API.")
+            return None
         
-        if df_filtered.empty:
-            logger.info(f"No hay datos suficientes en CSV para {pair}. Intentando con API.")
+        if require_coverage and bars['timestamp'][0] > to_epoch(cutoff_date) + 86400:
+            logger.info(f"El histórico local de {pair} no cubre los últimos {days} días.")
             return None
         
-        dates = df_filtered['timestamp'].dt.strftime('%Y-%m-%d').tolist()
-        rates = df_filtered['mid_price'].tolist()
+        dates = epoch_to_hour_strings(bars['timestamp']) if resolution == HOURLY else epoch_to_date_strings(bars['timestamp'])
+        rates = bars['close'].tolist()
         
         return {
             'dates': dates,
@@ -395,17 +1045,68 @@ def get_historical_rates_from_csv(base_currency, target_currency, days=30):
         }
     
     except Exception as e:
-        logger.error(f"Error al obtener tasas históricas desde CSV: {e}")
+        logger.error(f"Error al obtener tasas históricas desde el histórico local: {e}")
         return None
 
+def save_daily_rates(base_currency, target_currency, historical_data):
+    """
+    Guarda una serie diaria {'dates', 'rates'} en el almacén del par (solo los días nuevos).
+    Retorna el número de días guardados.
+    """
+    pair = f"{base_currency}_{target_currency}{DAILY_SUFFIX}"
+    timestamps = np.array([to_epoch(date) for date in historical_data['dates']], dtype=np.int64)
+    rates = np.asarray(historical_data['rates'], dtype=float)
+    
+    records = np.zeros(len(timestamps), dtype=TICK_DTYPE)
+    records['timestamp'] = timestamps
+    records['mid_price'] = rates
+    records['bid_price'] = rates * (1 - SPREAD_RATIO)
+    records['ask_price'] = rates * (1 + SPREAD_RATIO)
+    records = records[np.argsort(records['timestamp'], kind='stable')]
+    
+    # extend descarta, bajo el bloqueo del par, los días que ya estaban guardados
+    return TICK_STORE.extend(pair, records)
+
+def get_historical_rates_from_daily(base_currency, target_currency, days=30):
+    """
+    Obtiene la serie diaria guardada localmente (precargada desde FX_DAILY).
+    """
+    cutoff_date = datetime.now() - timedelta(days=days)
+    with METRICS.timer('stage_seconds', stage='history_read_daily'):
+        days_data = TICK_STORE.read_range(f"{base_currency}_{target_currency}{DAILY_SUFFIX}", start=cutoff_date)
+    METRICS.observe('history_read_records', len(days_data), buckets=SIZE_BUCKETS, source='daily')
+    if len(days_data) == 0:
+        return None
+    return {
+        'dates': epoch_to_date_strings(days_data['timestamp']),
+        'rates': days_data['mid_price'].tolist()
+    }
+
+@memoize_in_request('history_window')
 def get_historical_rates(base_currency, target_currency, days=30):
     """
-    Obtiene datos históricos, primero intenta desde el CSV local y luego desde la API.
+    Obtiene datos históricos: del histórico local si cubre toda la ventana, si no de la serie
+    diaria guardada (sincronizada con FX_DAILY solo en la cola que falta) y por último de la API.
     """
-    # Primero intentamos obtener desde CSV
-    historical_data = get_historical_rates_from_csv(base_currency, target_currency, days)
+    # Primero intentamos obtener desde el histórico local
+    historical_data = get_historical_rates_from_csv(base_currency, target_currency, days, require_coverage=True)
+    
+    if not historical_data:
+        try:
+            sync_daily_series(base_currency, target_currency)
+        except QuotaExceeded as e:
+            logger.warning(f"Serie diaria de {base_currency}/{target_currency} sin sincronizar: {e}")
+        historical_data = get_historical_rates_from_daily(base_currency, target_currency, days)
     
-    # Si no hay datos en CSV o son insuficientes, usamos la API
+    # Ventanas no cubiertas por la serie diaria: usar lo que haya en el histórico local
+    if not historical_data:
+        historical_data = get_historical_rates_from_csv(base_currency, target_currency, days)
+    
+    # Tasas cruzadas de USD_historical.json antes de gastar cuota de la API
+    if not historical_data:
+        historical_data = get_historical_rates_from_matrix(base_currency, target_currency, days)
+    
+    # Si no hay datos locales, usamos la API
     if not historical_data:
         historical_data = get_historical_rates_from_api(base_currency, target_currency, days)
         if not historical_data:
@@ -414,111 +1115,290 @@ def get_historical_rates(base_currency, target_currency, days=30):
     
     return historical_data
 
+def get_historical_rates_from_matrix(base_currency, target_currency, days=30):
+    """
+    Obtiene la serie del par derivada de USD_historical.json (una columna por moneda).
+    """
+    matrix = get_historical_matrix()
+    if not matrix:
+        return None
+    timestamps, rates = matrix.cross_series(base_currency, target_currency, start=(datetime.now() - timedelta(days=days)).date())
+    if len(rates) == 0:
+        return None
+    return {
+        'dates': epoch_to_date_strings(timestamps),
+        'rates': rates.tolist()
+    }
+
 def get_rate_at_date(base_currency, target_currency, target_date):
     """
     Obtiene la tasa de cambio en una fecha específica.
     target_date debe ser un objeto datetime.
     """
+    return get_rates_at_dates(base_currency, target_currency, [target_date])[0]
+
+def day_epoch(target_date):
+    """
+    Inicio del día (segundos epoch) de una fecha o datetime.
+    """
+    return to_epoch(target_date.date() if isinstance(target_date, datetime) else target_date)
+
+def get_rates_at_dates(base_currency, target_currency, target_dates, mode=NEAREST):
+    """
+    Obtiene la tasa de cambio en varias fechas en una sola pasada sobre el índice temporal.
+    mode: 'nearest' (más cercana), 'previous' (anterior o igual) o 'next' (posterior o igual).
+    Retorna una lista alineada con target_dates; None donde no hay datos.
+    Dentro de un lote (request_memo) cada fecha del par se resuelve una sola vez.
+    """
+    memo = current_memo()
+    if memo is None:
+        return lookup_rates_at_dates(base_currency, target_currency, target_dates, mode)
+    
+    keys = [('rate_at', base_currency, target_currency, day_epoch(target_date), mode) for target_date in target_dates]
+    missing = object()
+    cached = [memo.get(key, missing) for key in keys]
+    if all(value is not missing for value in cached):
+        return cached
+    results = lookup_rates_at_dates(base_currency, target_currency, target_dates, mode)
+    for key, result in zip(keys, results):
+        memo.put(key, result)
+    return results
+
+def lookup_rates_at_dates(base_currency, target_currency, target_dates, mode=NEAREST):
+    """
+    Búsqueda de get_rates_at_dates sobre el índice temporal del par (o USD_historical.json).
+    """
     try:
-        pair = f"{base_currency}_{target_currency}"
-        file_path = os.path.join(DATA_FOLDER, f"{pair}_history.csv")
-        
-        if not os.path.isfile(file_path):
-            logger.info(f"No se encontró archivo histórico para {pair}.")
-            return None
+        pair = get_pair_store(base_currency, target_currency)
+        index = TIME_INDEX.get(pair)
         
-        df = pd.read_csv(file_path)
+        # Se compara contra el inicio del día de cada fecha objetivo
+        targets = [day_epoch(target_date) for target_date in target_dates]
         
-        # Convertir timestamp a datetime
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        if len(index) == 0:
+            logger.info(f"No se encontró histórico local para {pair}. Usando USD_historical.json.")
+            return get_rates_at_dates_from_matrix(base_currency, target_currency, targets, mode)
         
-        # Encontrar la entrada más cercana a la fecha objetivo
-        target_date_str = target_date.strftime('%Y-%m-%d')
-        df['date_diff'] = abs(df['timestamp'] - pd.to_datetime(target_date_str))
-        closest_idx = df['date_diff'].idxmin()
+        positions, rows = index.lookup(targets, mode)
+        dates = epoch_to_date_strings(rows['timestamp'])
         
-        rate_data = df.loc[closest_idx]
-        
-        return {
-            'date': rate_data['timestamp'].strftime('%Y-%m-%d'),
-            'mid_price': rate_data['mid_price'],
-            'bid_price': rate_data['bid_price'],
-            'ask_price': rate_data['ask_price']
-        }
+        results = []
+        for i, position in enumerate(positions):
+            if position < 0:
+                results.append(None)
+                continue
+            results.append({
+                'date': dates[i],
+                'mid_price': float(rows['mid_price'][i]),
+                'bid_price': float(rows['bid_price'][i]),
+                'ask_price': float(rows['ask_price'][i])
+            })
+        return results
     
     except Exception as e:
-        logger.error(f"Error al obtener tasa para fecha específica: {e}")
-        return None
+        logger.error(f"Error al obtener tasas para fechas específicas: {e}")
+        return [None] * len(target_dates)
 
-def generate_rate_graph(base_currency, target_currency, period=None):
+def get_rates_at_dates_from_matrix(base_currency, target_currency, targets, mode=NEAREST):
     """
-    Genera un gráfico de tipo de cambio histórico.
-    Si se proporciona period, se utiliza para determinar el rango de tiempo.
+    Tasas del par en varias fechas (segundos epoch) desde USD_historical.json, con el mismo
+    formato que get_rates_at_dates; None donde no hay datos.
+    """
+    matrix = get_historical_matrix()
+    if not matrix:
+        return [None] * len(targets)
+    results = []
+    for found in matrix.lookup(base_currency, target_currency, targets, mode):
+        if found is None:
+            results.append(None)
+            continue
+        timestamp, mid_price = found
+        results.append({
+            'date': from_epoch(timestamp).strftime('%Y-%m-%d'),
+            'mid_price': mid_price,
+            'bid_price': mid_price * (1 - SPREAD_RATIO),
+            'ask_price': mid_price * (1 + SPREAD_RATIO)
+        })
+    return results
+
+# Caché de gráficos renderizados, acotada por tamaño total (bytes de PNG)
+CHART_CACHE = LRUCache(maxsize=256, max_bytes=int(os.getenv("CHART_CACHE_BYTES", str(32 * 1024 * 1024))))
+CHART_SHARED_TTL = 3600
+
+def get_graph_window(base_currency, target_currency, period=None):
+    """
+    Obtiene la ventana de datos de un gráfico: (historical_data, time_description) o (None, None).
+    """
+    # Determinar el número de días
+    days = 30  # Valor por defecto
+    if period:
+        if period['type'] == 'days':
+            days = period['value']
+        elif period['type'] == 'weeks':
+            days = period['value'] * 7
+        elif period['type'] == 'months':
+            days = period['value'] * 30
+    
+    historical_data = get_historical_rates(base_currency, target_currency, days)
+    
+    if not historical_data:
+        logger.error("No se pudieron obtener datos históricos para generar el gráfico.")
+        return None, None
+    
+    time_description = f"{days} días"
+    if period and period['type'] == 'weeks':
+        time_description = f"{period['value']} semana(s)"
+    elif period and period['type'] == 'months':
+        time_description = f"{period['value']} mes(es)"
+    
+    return historical_data, time_description
+
+def get_rate_graph(base_currency, target_currency, period=None, if_none_match=None):
+    """
+    Obtiene el gráfico de tipo de cambio histórico como {'png', 'etag'}.
+    El ETag depende del par, el período y la versión de los datos; si aparece en if_none_match
+    se devuelve 'png': None sin renderizar nada. Los PNG renderizados se guardan en CHART_CACHE.
     """
     try:
-        # Determinar el número de días
-        days = 30  # Valor por defecto
-        if period:
-            if period['type'] == 'days':
-                days = period['value']
-            elif period['type'] == 'weeks':
-                days = period['value'] * 7
-            elif period['type'] == 'months':
-                days = period['value'] * 30
-        
-        historical_data = get_historical_rates(base_currency, target_currency, days)
-        
+        historical_data, time_description = get_graph_window(base_currency, target_currency, period)
         if not historical_data:
-            logger.error("No se pudieron obtener datos históricos para generar el gráfico.")
             return None
         
-        plt.figure(figsize=(10, 6))
-        plt.plot(range(len(historical_data['dates'])), historical_data['rates'], marker='o')
+        # Versión de los datos: cambia con cualquier fecha o tasa de la ventana
+        data_version = hashlib.sha1(
+            np.asarray(historical_data['rates'], dtype=float).tobytes() + '|'.join(historical_data['dates']).encode()
+        ).hexdigest()
+        etag = hashlib.sha1(f"{base_currency}/{target_currency}|{time_description}|{data_version}".encode()).hexdigest()
         
-        # Agregar etiquetas de fechas legibles
-        if len(historical_data['dates']) > 10:
-            # Si hay muchas fechas, mostrar solo algunas
-            step = len(historical_data['dates']) // 5
-            tick_positions = range(0, len(historical_data['dates']), step)
-            tick_labels = [historical_data['dates'][i] for i in tick_positions]
-        else:
-            tick_positions = range(len(historical_data['dates']))
-            tick_labels = historical_data['dates']
+        if if_none_match is not None and etag in if_none_match:
+            return {'png': None, 'etag': etag}
         
-        plt.xticks(tick_positions, tick_labels, rotation=45)
+        png = CHART_CACHE.get(etag)
+        if png is None and SHARED_CACHE:
+            # Gráfico ya renderizado por otro worker
+            png = SHARED_CACHE.get(f"chart:{etag}")
+            if png is not None:
+                CHART_CACHE.put(etag, png)
+        if png is None:
+            with METRICS.timer('stage_seconds', stage='chart_render'):
+                png = render_rate_chart(
+                    historical_data['dates'],
+                    historical_data['rates'],
+                    f'Tipo de Cambio {base_currency}/{target_currency} - Últimos {time_description}',
+                    f'Tasa de Cambio ({target_currency})'
+                )
+            CHART_CACHE.put(etag, png)
+            if SHARED_CACHE:
+                SHARED_CACHE.put(f"chart:{etag}", png, CHART_SHARED_TTL)
         
-        time_description = f"{days} días"
-        if period and period['type'] == 'weeks':
-            time_description = f"{period['value']} semana(s)"
-        elif period and period['type'] == 'months':
-            time_description = f"{period['value']} mes(es)"
+        return {'png': png, 'etag': etag}
+    except Exception as e:
+        logger.error(f"Error al generar el gráfico: {e}")
+        return None
+
+def get_rate_chart_data(base_currency, target_currency, period=None, max_points=200, chart_format='json'):
+    """
+    Obtiene la serie del gráfico reducida en el servidor con LTTB a max_points puntos,
+    para que el cliente la dibuje. chart_format: 'json' (diccionario) o 'svg' (cadena SVG).
+    """
+    try:
+        historical_data, time_description = get_graph_window(base_currency, target_currency, period)
+        if not historical_data:
+            return None
         
-        plt.title(f'Tipo de Cambio {base_currency}/{target_currency} - Últimos {time_description}')
-        plt.ylabel(f'Tasa de Cambio ({target_currency})')
-        plt.xlabel('Fecha')
-        plt.grid(True)
-        plt.tight_layout()
+        rates = np.asarray(historical_data['rates'], dtype=float)
+        selected = lttb(np.arange(len(rates)), rates, max(2, max_points))
+        dates = [historical_data['dates'][i] for i in selected]
+        rates = rates[selected].tolist()
+        title = f'Tipo de Cambio {base_currency}/{target_currency} - Últimos {time_description}'
         
-        # Guardar el gráfico en un buffer de bytes
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        plt.close()
+        if chart_format == 'svg':
+            with METRICS.timer('stage_seconds', stage='chart_render_svg'):
+                return render_rate_svg(dates, rates, title)
         
-        return buffer
+        return {
+            'intent': 'graph',
+            'base_currency': base_currency,
+            'target_currency': target_currency,
+            'time_description': time_description,
+            'title': title,
+            'dates': dates,
+            'rates': rates,
+            'total_points': len(historical_data['rates'])
+        }
     except Exception as e:
-        logger.error(f"Error al generar el gráfico: {e}")
+        logger.error(f"Error al generar los datos del gráfico: {e}")
+        return None
+
+def generate_rate_graph(base_currency, target_currency, period=None):
+    """
+    Genera un gráfico de tipo de cambio histórico.
+    Si se proporciona period, se utiliza para determinar el rango de tiempo.
+    """
+    graph = get_rate_graph(base_currency, target_currency, period)
+    return BytesIO(graph['png']) if graph else None
+
+def load_model_history(pair):
+    """
+    Histórico con el que se inicializan los modelos de un par: el cierre de cada hora con
+    cotizaciones guardadas o, si no hay, la serie diaria. Retorna (timestamps, tasas) o None.
+    Las cotizaciones posteriores a la última hora se aplican después una a una.
+    """
+    if TICK_STORE.has_pair(pair):
+        bars = TICK_STORE.read_bars(pair, HOURLY)
+        return bars['last_timestamp'], bars['close']
+    ticks = TICK_STORE.read_all(f"{pair}{DAILY_SUFFIX}")
+    if len(ticks) == 0:
         return None
+    return ticks['timestamp'], ticks['mid_price']
+
+# Pool compartido para lanzar a la vez las consultas independientes de cada intención
+IO_PIPELINE = IOPipeline(
+    max_workers=int(os.getenv("IO_PIPELINE_WORKERS", "16")),
+    timeout=float(os.getenv("IO_PIPELINE_TIMEOUT", "30"))
+)
+
+# Estados de modelo por par y pronósticos ya calculados (clave: par, modelo, días, último dato)
+FORECASTS = ForecastRegistry(load_model_history, LRUCache(maxsize=1024))
+
+# Días de entrenamiento cuando no hay histórico local reciente
+FORECAST_TRAINING_DAYS = 30
+
+def is_forecast_state_fresh(state, prediction_days):
+    """
+    El estado local solo sirve si su último dato cae dentro de la ventana de entrenamiento
+    (o del horizonte de predicción, si es mayor); si no, se pronosticaría desde una fecha pasada.
+    """
+    max_age = max(FORECAST_TRAINING_DAYS, prediction_days) * 86400
+    return state is not None and state.last_timestamp >= time.time() - max_age
 
-def predict_rates(base_currency, target_currency, period=None):
+def sync_forecast_state(pair):
+    """
+    Aplica al estado de los modelos del par los datos guardados después de su último dato (por
+    otros procesos o por la sincronización de la serie diaria). Se sigue la misma serie con la
+    que load_model_history construye el estado: las cotizaciones o, si no hay, la serie diaria.
+    """
+    state = FORECASTS.get(pair)
+    source = pair if TICK_STORE.has_pair(pair) else f"{pair}{DAILY_SUFFIX}"
+    last_tick = TICK_STORE.last(source)
+    if state is None or last_tick is None or last_tick['timestamp'] <= state.last_timestamp:
+        return
+    for tick in TICK_STORE.read_range(source, start=int(state.last_timestamp) + 1):
+        FORECASTS.on_append(pair, int(tick['timestamp']), float(tick['mid_price']))
+
+def predict_rates(base_currency, target_currency, period=None, model='linear'):
     """
     Realiza una predicción de tasas de cambio para un período futuro.
     Si se proporciona period, se utiliza para determinar el rango de tiempo.
+    model: 'linear' (regresión lineal incremental), 'ewma' o 'holt_winters'.
     """
     try:
+        if model not in MODEL_TYPES:
+            logger.error(f"Modelo de predicción desconocido: {model}")
+            return None
+        
         # Determinar el número de días para la predicción
         prediction_days = 7  # Valor por defecto (una semana)
-        training_days = 30   # Días para el entrenamiento
         
         if period:
             if period['type'] == 'days':
@@ -528,61 +1408,90 @@ def predict_rates(base_currency, target_currency, period=None):
             elif period['type'] == 'months':
                 prediction_days = period['value'] * 30
         
-        # Obtener datos históricos para el entrenamiento
-        historical_data = get_historical_rates(base_currency, target_currency, training_days)
-        
-        if not historical_data:
-            logger.error("No se pudieron obtener datos históricos para la predicción.")
-            return None
-        
-        rates = historical_data['rates']
-        
-        # Método simple: tendencia lineal
-        x = np.array(range(len(rates)))
-        y = np.array(rates)
-        
-        # Calcula la tendencia lineal
-        z = np.polyfit(x, y, 1)
-        p = np.poly1d(z)
-        
-        # Extrapola para los próximos días
-        future_days = np.array(range(len(rates), len(rates) + prediction_days))
-        predicted_values = p(future_days)
+        # Pronóstico desde el estado incremental del par (se actualiza con cada cotización guardada)
+        pair = get_pair_store(base_currency, target_currency)
+        sync_forecast_state(pair)
+        state, predicted_values = FORECASTS.forecast(pair, model, prediction_days)
         
-        # Calcular la tendencia porcentual
-        current_rate = rates[-1]
-        future_rate = predicted_values[-1]
-        trend_percentage = ((future_rate - current_rate) / current_rate) * 100
-        trend_direction = "al alza" if trend_percentage > 0 else "a la baja"
-        
-        # Formatear fechas para el resultado
-        last_date = datetime.strptime(historical_data['dates'][-1], "%Y-%m-%d")
-        future_dates = [(last_date + timedelta(days=i+1)).strftime("%Y-%m-%d") for i in range(prediction_days)]
-        
-        # Descripción del período
-        time_description = f"{prediction_days} días"
-        if period and period['type'] == 'weeks':
-            time_description = f"{period['value']} semana(s)"
-        elif period and period['type'] == 'months':
-            time_description = f"{period['value']} mes(es)"
-        
-        # Crear respuesta
-        result = {
-            'current_rate': float(current_rate),
-            'predicted_rates': [{'date': date, 'rate': float(rate)} for date, rate in zip(future_dates, predicted_values)],
-            'trend_percentage': float(f"{trend_percentage:.2f}"),
-            'trend_direction': trend_direction,
-            'time_description': time_description
-        }
+        if not is_forecast_state_fresh(state, prediction_days):
+            # Sin histórico local reciente: entrenar con los datos históricos disponibles
+            historical_data = get_historical_rates(base_currency, target_currency, FORECAST_TRAINING_DAYS)
+            
+            if not historical_data:
+                logger.error("No se pudieron obtener datos históricos para la predicción.")
+                return None
+            
+            # El estado reentrenado reemplaza al desactualizado: las siguientes consultas siguen
+            # por la vía incremental en lugar de volver a entrenar
+            state = build_state([to_epoch(date) for date in historical_data['dates']], historical_data['rates'])
+            FORECASTS.replace(pair, state)
+            state, predicted_values = FORECASTS.forecast(pair, model, prediction_days, state=state)
         
-        return result
+        return format_prediction(state.last_value, state.last_timestamp, predicted_values, prediction_days, period, model)
     except Exception as e:
         logger.error(f"Error al predecir tasas de cambio: {e}")
         return None
 
-def get_historical_price(base_currency, target_currency, period):
+def format_prediction(current_rate, last_timestamp, predicted_values, prediction_days, period, model):
+    """
+    Construye la respuesta de predicción a partir de los valores pronosticados.
+    """
+    # Calcular la tendencia porcentual
+    future_rate = predicted_values[-1]
+    trend_percentage = ((future_rate - current_rate) / current_rate) * 100
+    trend_direction = "al alza" if trend_percentage > 0 else "a la baja"
+    
+    # Formatear fechas para el resultado
+    last_date = from_epoch(last_timestamp)
+    future_dates = [(last_date + timedelta(days=i+1)).strftime("%Y-%m-%d") for i in range(prediction_days)]
+    
+    # Descripción del período
+    time_description = f"{prediction_days} días"
+    if period and period['type'] == 'weeks':
+        time_description = f"{period['value']} semana(s)"
+    elif period and period['type'] == 'months':
+        time_description = f"{period['value']} mes(es)"
+    
+    return {
+        'current_rate': float(current_rate),
+        'predicted_rates': [{'date': date, 'rate': float(rate)} for date, rate in zip(future_dates, predicted_values)],
+        'trend_percentage': float(f"{trend_percentage:.2f}"),
+        'trend_direction': trend_direction,
+        'time_description': time_description,
+        'model': model
+    }
+
+def predict_rates_batch(pairs, period=None, model='linear'):
+    """
+    Pronostica muchos pares (lista de (base, target)) en una sola llamada vectorizada.
+    Retorna una lista alineada con pairs; None para los pares sin histórico local reciente.
+    """
+    if model not in MODEL_TYPES:
+        logger.error(f"Modelo de predicción desconocido: {model}")
+        return [None] * len(pairs)
+    
+    prediction_days = 7
+    if period:
+        prediction_days = period['value'] * {'days': 1, 'weeks': 7, 'months': 30}.get(period['type'], 1)
+    
+    names = [get_pair_store(base_currency, target_currency) for base_currency, target_currency in pairs]
+    for name in names:
+        sync_forecast_state(name)
+    forecasts = FORECASTS.forecast_many(names, model, prediction_days)
+    
+    results = []
+    for name in names:
+        state = FORECASTS.get(name)
+        if name not in forecasts or not is_forecast_state_fresh(state, prediction_days):
+            results.append(None)
+            continue
+        results.append(format_prediction(state.last_value, state.last_timestamp, forecasts[name], prediction_days, period, model))
+    return results
+
+def get_historical_price(base_currency, target_currency, period, include_news=False):
     """
     Obtiene el precio histórico de una moneda en un período específico en el pasado.
+    Con include_news se añaden las noticias recientes que mencionan el par.
     """
     try:
         # Calcular la fecha objetivo
@@ -596,16 +1505,19 @@ def get_historical_price(base_currency, target_currency, period):
         
         target_date = datetime.now() - timedelta(days=days_ago)
         
-        # Obtener la tasa en esa fecha
-        rate_data = get_rate_at_date(base_currency, target_currency, target_date)
+        # Tasa en esa fecha, cotización actual y (opcional) noticias, consultadas a la vez
+        results = IO_PIPELINE.gather(
+            rate=(get_rate_at_date, base_currency, target_currency, target_date),
+            quote=(get_forex_quote, base_currency, target_currency),
+            news=(get_pair_news, base_currency, target_currency) if include_news else None
+        )
+        rate_data = results['rate']
+        current_quote = results['quote']
         
         if not rate_data:
             logger.error(f"No se encontraron datos para {base_currency}/{target_currency} hace {days_ago} días.")
             return None
         
-        # Obtener la tasa actual para comparación
-        current_quote = get_forex_quote(base_currency, target_currency)
-        
         if not current_quote:
             logger.error(f"No se pudo obtener la cotización actual para {base_currency}/{target_currency}.")
             return None
@@ -620,7 +1532,7 @@ def get_historical_price(base_currency, target_currency, period):
         elif period['type'] == 'months':
             time_description = f"{period['value']} mes(es)"
         
-        return {
+        result = {
             'base_currency': base_currency,
             'target_currency': target_currency,
             'historical_date': rate_data['date'],
@@ -630,15 +1542,19 @@ def get_historical_price(base_currency, target_currency, period):
             'change_percentage': change_percentage,
             'time_description': time_description
         }
+        if include_news:
+            result['news'] = results['news'] or []
+        return result
     
     except Exception as e:
         logger.error(f"Error al obtener precio histórico: {e}")
         return None
 
-def compare_currency_periods(base_currency, target_currency, period1, period2=None):
+def compare_currency_periods(base_currency, target_currency, period1, period2=None, include_news=False):
     """
     Compara el valor de una moneda en dos períodos diferentes.
     Si period2 es None, se compara con el valor actual.
+    Con include_news se añaden las noticias recientes que mencionan el par.
     """
     try:
         # Calcular las fechas objetivo
@@ -651,11 +1567,7 @@ def compare_currency_periods(base_currency, target_currency, period1, period2=No
             days_ago1 = period1['value'] * 30
         
         target_date1 = datetime.now() - timedelta(days=days_ago1)
-        rate_data1 = get_rate_at_date(base_currency, target_currency, target_date1)
-        
-        if not rate_data1:
-            logger.error(f"No se encontraron datos para {base_currency}/{target_currency} hace {days_ago1} días.")
-            return None
+        target_dates = [target_date1]
         
         if period2:
             # Calcular la segunda fecha
@@ -667,8 +1579,24 @@ def compare_currency_periods(base_currency, target_currency, period1, period2=No
             elif period2['type'] == 'months':
                 days_ago2 = period2['value'] * 30
             
-            target_date2 = datetime.now() - timedelta(days=days_ago2)
-            rate_data2 = get_rate_at_date(base_currency, target_currency, target_date2)
+            target_dates.append(datetime.now() - timedelta(days=days_ago2))
+        
+        # Resolver ambas fechas en una sola consulta al índice, a la vez que la cotización
+        # actual (solo si se compara con el presente) y las noticias
+        results = IO_PIPELINE.gather(
+            rates=(get_rates_at_dates, base_currency, target_currency, target_dates),
+            quote=None if period2 else (get_forex_quote, base_currency, target_currency),
+            news=(get_pair_news, base_currency, target_currency) if include_news else None
+        )
+        rates_data = results['rates'] or [None] * len(target_dates)
+        rate_data1 = rates_data[0]
+        
+        if not rate_data1:
+            logger.error(f"No se encontraron datos para {base_currency}/{target_currency} hace {days_ago1} días.")
+            return None
+        
+        if period2:
+            rate_data2 = rates_data[1]
             
             if not rate_data2:
                 logger.error(f"No se encontraron datos para {base_currency}/{target_currency} hace {days_ago2} días.")
@@ -690,7 +1618,7 @@ def compare_currency_periods(base_currency, target_currency, period1, period2=No
             # Calcular el cambio porcentual
             change_percentage = ((rate_data2['mid_price'] - rate_data1['mid_price']) / rate_data1['mid_price']) * 100
             
-            return {
+            comparison = {
                 'base_currency': base_currency,
                 'target_currency': target_currency,
                 'period1': {
@@ -706,9 +1634,12 @@ def compare_currency_periods(base_currency, target_currency, period1, period2=No
                 'change_value': rate_data2['mid_price'] - rate_data1['mid_price'],
                 'change_percentage': change_percentage
             }
+            if include_news:
+                comparison['news'] = results['news'] or []
+            return comparison
         else:
             # Comparar con el valor actual
-            current_quote = get_forex_quote(base_currency, target_currency)
+            current_quote = results['quote']
             
             if not current_quote:
                 logger.error(f"No se pudo obtener la cotización actual para {base_currency}/{target_currency}.")
@@ -724,7 +1655,7 @@ def compare_currency_periods(base_currency, target_currency, period1, period2=No
             elif period1['type'] == 'months':
                 time_description1 = f"{period1['value']} mes(es)"
             
-            return {
+            comparison = {
                 'base_currency': base_currency,
                 'target_currency': target_currency,
                 'period1': {
@@ -740,22 +1671,127 @@ def compare_currency_periods(base_currency, target_currency, period1, period2=No
                 'change_value': current_quote['mid_price'] - rate_data1['mid_price'],
                 'change_percentage': change_percentage
             }
+            if include_news:
+                comparison['news'] = results['news'] or []
+            return comparison
     
     except Exception as e:
         logger.error(f"Error al comparar períodos: {e}")
         return None
 
-# Agregar al final del archivo la función para obtener noticias de divisas
+def plan_query_batch(texts):
+    """
+    Analiza un lote de consultas y obtiene una sola vez cada recurso que necesitan: cotizaciones,
+    ventanas de histórico y tasas por fecha (todas las fechas de un par en una búsqueda).
+    Debe llamarse dentro de un request_memo: las consultas del lote se responden después
+    desde el memo. Retorna el número de recursos únicos de cada tipo.
+    """
+    queries = [analyze_query(text) for text in texts]
+    
+    # Las conversiones que necesitan OpenAI se analizan en paralelo
+    conversions = IO_PIPELINE.gather(**{
+        f"parse_{i}": (check_conversion_request, text)
+        for i, (text, query) in enumerate(zip(texts, queries)) if query['intent'] == 'conversion'
+    })
+    
+    quotes = set()
+    windows = set()
+    dates = {}
+    now = datetime.now()
+    for i, (text, query) in enumerate(zip(texts, queries)):
+        intent = query['intent']
+        if intent == 'conversion':
+            parsed = conversions.get(f"parse_{i}")
+            if parsed and all(parsed):
+                quotes.add((parsed[1], parsed[2]))
+            continue
+        
+        pair = resolve_pair(query['currencies'])
+        if intent == 'graph':
+            windows.add((*pair, period_to_days(query['period'])))
+        elif intent == 'history':
+            quotes.add(pair)
+            dates.setdefault(pair, set()).add(day_epoch(now - timedelta(days=period_to_days(query['period']))))
+        elif intent == 'compare':
+            period2 = detect_second_period(text)
+            pair_dates = dates.setdefault(pair, set())
+            pair_dates.add(day_epoch(now - timedelta(days=period_to_days(query['period']))))
+            if period2:
+                pair_dates.add(day_epoch(now - timedelta(days=period_to_days(period2))))
+            else:
+                quotes.add(pair)
+    
+    calls = {}
+    for i, (base_currency, target_currency) in enumerate(sorted(quotes)):
+        calls[f"quote_{i}"] = (get_forex_quote, base_currency, target_currency)
+    for i, (base_currency, target_currency, days) in enumerate(sorted(windows)):
+        calls[f"window_{i}"] = (get_historical_rates, base_currency, target_currency, days)
+    for i, ((base_currency, target_currency), pair_dates) in enumerate(sorted(dates.items())):
+        calls[f"dates_{i}"] = (get_rates_at_dates, base_currency, target_currency, [from_epoch(day) for day in sorted(pair_dates)])
+    IO_PIPELINE.gather(**calls)
+    
+    return {
+        'queries': len(texts),
+        'quotes': len(quotes),
+        'history_windows': len(windows),
+        'dates': sum(len(pair_dates) for pair_dates in dates.values())
+    }
+
+# Noticias: segundos que se sirven sin volver a llamar a la API; pasado ese tiempo, si no hay
+# cuota o la llamada falla, se siguen sirviendo las últimas obtenidas
+NEWS_CACHE_TTL = float(os.getenv("NEWS_CACHE_TTL", "900"))
+_news_cache = {'items': None, 'fetched_at': 0.0}
+_news_lock = threading.Lock()
+
+def get_cached_news():
+    """
+    Retorna (noticias, segundos desde que se obtuvieron) o None si nunca se obtuvieron.
+    """
+    if SHARED_CACHE:
+        entry = SHARED_CACHE.get('news:forex')
+        if entry:
+            _news_cache.update(entry)
+    if _news_cache['items'] is None:
+        return None
+    return _news_cache['items'], time.time() - _news_cache['fetched_at']
+
 def get_forex_news():
     """
     Obtiene noticias actuales sobre el mercado de divisas.
+    Se sirven desde la caché durante NEWS_CACHE_TTL; al renovarlas, las llamadas gastan cuota
+    con prioridad NEWS y, si no se admiten, se responde con las noticias guardadas.
+    """
+    cached = get_cached_news()
+    if cached and cached[1] < NEWS_CACHE_TTL:
+        return cached[0]
+    
+    # Una sola renovación a la vez; mientras tanto los demás reciben las noticias guardadas
+    if not _news_lock.acquire(blocking=cached is None):
+        return cached[0]
+    try:
+        refreshed = get_cached_news()
+        if refreshed and refreshed[1] < NEWS_CACHE_TTL:
+            return refreshed[0]
+        with upstream_priority(NEWS):
+            news = fetch_forex_news()
+        if news is None:
+            return cached[0] if cached else None
+        entry = {'items': news, 'fetched_at': time.time()}
+        _news_cache.update(entry)
+        if SHARED_CACHE:
+            SHARED_CACHE.put('news:forex', entry)
+        return news
+    finally:
+        _news_lock.release()
+
+def fetch_forex_news():
+    """
+    Descarga las noticias actuales sobre el mercado de divisas.
     Utiliza una API de noticias financieras.
     """
     try:
         # Utilizamos Alpha Vantage News API para obtener noticias financieras
-        url = f"https://www.alphavantage.co/query?function=NEWS_SENTIMENT&topics=forex&apikey={ALPHA_VANTAGE_API_KEY}"
-        response = requests.get(url)
-        data = response.json()
+        data = alpha_vantage_query(function="NEWS_SENTIMENT", topics="forex")
         
         if "feed" in data:
             news_items = []
@@ -784,10 +1820,22 @@ def get_forex_news():
         else:
             logger.error(f"Error al obtener noticias de Alpha Vantage: {data}")
             return None
+    except QuotaExceeded as e:
+        logger.warning(f"Noticias no solicitadas: {e}")
+        return None
     except Exception as e:
         logger.error(f"Error al obtener noticias de divisas: {e}")
         return None
 
+def get_pair_news(base_currency, target_currency):
+    """
+    Noticias recientes que mencionan alguna de las dos monedas del par.
+    """
+    news = get_forex_news()
+    if not news:
+        return []
+    return [item for item in news if base_currency in item['currencies'] or target_currency in item['currencies']]
+
 def get_available_currencies():
     """
     Devuelve la lista de monedas disponibles en el sistema.
@@ -814,4 +1862,42 @@ def get_available_currencies():
             "aliases": [n for n in names if n != main_name]
         })
     
-    return currencies_info
\ No newline at end of file
+    return currencies_info
+
+def collect_cache_metrics():
+    """
+    Estado de las cachés para /metrics (se lee solo al generar la exposición).
+    """
+    caches = {
+        'quote': QUOTE_CACHE.stats(),
+        'conversion_parse': CONVERSION_PARSE_CACHE.stats(),
+        'chart': CHART_CACHE.stats(),
+        'forecast': FORECASTS.forecast_cache.stats()
+    }
+    samples = []
+    for field in ('hit_ratio', 'hits', 'misses', 'entries'):
+        samples.extend((f"cache_{field}", {'cache': name}, stats[field]) for name, stats in caches.items())
+    if SHARED_CACHE:
+        shared = SHARED_CACHE.stats()
+        samples.extend((f"shared_cache_{field}", {}, shared[field]) for field in ('hit_ratio', 'hits', 'misses', 'errors'))
+    return samples
+
+def collect_runtime_metrics():
+    """
+    Cuota de Alpha Vantage, vías de análisis de conversiones, pool de E/S y clientes en vivo.
+    """
+    quota = ALPHA_VANTAGE_QUOTA.stats()
+    pipeline = IO_PIPELINE.stats()
+    stream = QUOTE_STREAM.stats()
+    return [
+        ('quota_tokens', {'window': 'minute'}, quota['minute_tokens']),
+        ('quota_tokens', {'window': 'day'}, quota['day_tokens']),
+        ('quota_waiting', {}, quota['waiting']),
+        *(('conversion_parse_path', {'path': path}, count) for path, count in _conversion_parse_counts.items()),
+        ('io_pipeline_in_flight', {}, pipeline['in_flight']),
+        ('stream_subscribers', {}, stream['subscribers']),
+        ('stream_pairs', {}, len(stream['pairs']))
+    ]
+
+METRICS.register_collector(collect_cache_metrics)
+METRICS.register_collector(collect_runtime_metrics)
@@ -0,0 +1,86 @@
+#Renderizado de gráficos de tipo de cambio
+import os
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+# Backend sin interfaz gráfica, también para cualquier uso de pyplot en el proceso
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+def load_matplotlib():
+    """
+    Importa matplotlib la primera vez que se renderiza un PNG, no al arrancar el servidor.
+    Retorna (Figure, FigureCanvasAgg).
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    return Figure, FigureCanvasAgg
+
+def render_rate_chart(dates, rates, title, ylabel, figsize=(10, 6)):
+    """
+    Dibuja la serie de tasas y devuelve el PNG en bytes.
+    Usa la API orientada a objetos (Figure + lienzo Agg) en lugar del estado global de pyplot,
+    por lo que es seguro llamarla desde varios hilos a la vez.
+    """
+    Figure, FigureCanvasAgg = load_matplotlib()
+    figure = Figure(figsize=figsize)
+    canvas = FigureCanvasAgg(figure)
+    axes = figure.add_subplot(1, 1, 1)
+    axes.plot(range(len(dates)), rates, marker='o')
+
+    # Agregar etiquetas de fechas legibles
+    if len(dates) > 10:
+        # Si hay muchas fechas, mostrar solo algunas
+        step = len(dates) // 5
+        tick_positions = range(0, len(dates), step)
+        tick_labels = [dates[i] for i in tick_positions]
+    else:
+        tick_positions = range(len(dates))
+        tick_labels = dates
+
+    axes.set_xticks(list(tick_positions))
+    axes.set_xticklabels(tick_labels, rotation=45)
+    axes.set_title(title)
+    axes.set_ylabel(ylabel)
+    axes.set_xlabel('Fecha')
+    axes.grid(True)
+    figure.tight_layout()
+
+    buffer = BytesIO()
+    canvas.print_png(buffer)
+    return buffer.getvalue()
+
+def render_rate_svg(dates, rates, title, width=1000, height=600, padding=60):
+    """
+    Dibuja la serie como SVG ligero (una polilínea) para que el navegador lo muestre sin PNG.
+    """
+    count = len(rates)
+    low, high = min(rates), max(rates)
+    span = (high - low) or 1.0
+    plot_width = width - 2 * padding
+    plot_height = height - 2 * padding
+
+    def position(i, rate):
+        x = padding + (plot_width * i / (count - 1) if count > 1 else plot_width / 2)
+        y = padding + plot_height * (1 - (rate - low) / span)
+        return x, y
+
+    points = ' '.join(f"{x:.1f},{y:.1f}" for x, y in (position(i, rate) for i, rate in enumerate(rates)))
+
+    # Como en el PNG: como máximo unas seis etiquetas de fecha
+    step = max(1, count // 5)
+    labels = ''.join(
+        f'<text x="{position(i, low)[0]:.1f}" y="{height - padding / 2:.1f}" text-anchor="middle">{escape(dates[i])}</text>'
+        for i in range(0, count, step)
+    )
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" font-family="sans-serif" font-size="12">'
+        f'<text x="{width / 2}" y="{padding / 2}" text-anchor="middle" font-size="16">{escape(title)}</text>'
+        f'<rect x="{padding}" y="{padding}" width="{plot_width}" height="{plot_height}" fill="none" stroke="#ccc"/>'
+        f'<text x="{padding - 6}" y="{padding + 4}" text-anchor="end">{high:.4f}</text>'
+        f'<text x="{padding - 6}" y="{height - padding + 4}" text-anchor="end">{low:.4f}</text>'
+        f'<polyline points="{points}" fill="none" stroke="#1f77b4" stroke-width="2"/>'
+        f'{labels}</svg>'
+    )
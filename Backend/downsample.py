@@ -0,0 +1,41 @@
+#Reducción de series para gráficos
+import numpy as np
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: elige threshold puntos que conservan la forma de la serie.
+    Retorna los índices seleccionados (siempre incluye el primero y el último).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1])
+
+    # Cubetas intermedias (el primer y último punto se conservan siempre)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Punto medio de la cubeta siguiente (o el último punto en la última cubeta)
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        if next_end <= next_start:
+            next_end = next_start + 1
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Área del triángulo (punto anterior, candidato, promedio siguiente) para cada candidato
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        areas = np.abs((x[previous] - avg_x) * (bucket_y - y[previous])
+                       - (x[previous] - bucket_x) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+
+    return selected
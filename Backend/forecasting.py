@@ -0,0 +1,272 @@
+#Modelos de predicción incrementales por par
+import math
+import threading
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400.0
+
+class OnlineLinearRegression:
+    """
+    Regresión lineal ponderada con olvido exponencial (vida media en días): las sumas se
+    actualizan en O(1) por cotización y las observaciones antiguas pierden peso.
+    x se mide en días desde el origen del par.
+    """
+
+    name = 'linear'
+
+    def __init__(self, half_life_days=30.0):
+        self.decay_rate = math.log(2) / half_life_days
+        self.last_x = None
+        self.w = self.sx = self.sy = self.sxx = self.sxy = 0.0
+
+    def fit(self, x, y):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        weights = np.exp(-self.decay_rate * (x[-1] - x))
+        self.w = weights.sum()
+        self.sx = (weights * x).sum()
+        self.sy = (weights * y).sum()
+        self.sxx = (weights * x * x).sum()
+        self.sxy = (weights * x * y).sum()
+        self.last_x = float(x[-1])
+
+    def update(self, x, y):
+        if self.last_x is not None:
+            factor = math.exp(-self.decay_rate * max(0.0, x - self.last_x))
+            self.w *= factor
+            self.sx *= factor
+            self.sy *= factor
+            self.sxx *= factor
+            self.sxy *= factor
+        self.w += 1
+        self.sx += x
+        self.sy += y
+        self.sxx += x * x
+        self.sxy += x * y
+        self.last_x = x
+
+    def coefficients(self):
+        """
+        Retorna (intercepto, pendiente por día).
+        """
+        mean_x = self.sx / self.w
+        mean_y = self.sy / self.w
+        variance = self.sxx / self.w - mean_x * mean_x
+        if variance <= 1e-12:
+            return mean_y, 0.0
+        slope = (self.sxy / self.w - mean_x * mean_y) / variance
+        return mean_y - slope * mean_x, slope
+
+    def forecast(self, x):
+        intercept, slope = self.coefficients()
+        return intercept + slope * np.asarray(x, dtype=float)
+
+class EWMA:
+    """
+    Media móvil exponencial: el pronóstico es el último nivel suavizado.
+    """
+
+    name = 'ewma'
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.level = None
+        self.last_x = None
+
+    def fit(self, x, y):
+        for xi, yi in zip(np.asarray(x, dtype=float), np.asarray(y, dtype=float)):
+            self.update(xi, yi)
+
+    def update(self, x, y):
+        self.level = y if self.level is None else self.alpha * y + (1 - self.alpha) * self.level
+        self.last_x = x
+
+    def forecast(self, x):
+        return np.full(np.shape(x), self.level, dtype=float)
+
+class HoltWinters:
+    """
+    Holt-Winters aditivo para series irregulares: nivel, tendencia por día y, si
+    season_days > 0, un componente estacional por día del ciclo (7 = semanal).
+    """
+
+    name = 'holt_winters'
+
+    def __init__(self, alpha=0.3, beta=0.05, gamma=0.1, season_days=7):
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.season_days = season_days
+        self.seasonal = np.zeros(season_days) if season_days else None
+        self.level = None
+        self.trend = 0.0
+        self.last_x = None
+
+    def _season(self, x):
+        return self.seasonal[int(x) % self.season_days] if self.season_days else 0.0
+
+    def fit(self, x, y):
+        for xi, yi in zip(np.asarray(x, dtype=float), np.asarray(y, dtype=float)):
+            self.update(xi, yi)
+
+    def update(self, x, y):
+        if self.level is None:
+            self.level = y
+            self.last_x = x
+            return
+        dt = x - self.last_x
+        season = self._season(x)
+        predicted_level = self.level + self.trend * dt
+        level = self.alpha * (y - season) + (1 - self.alpha) * predicted_level
+        if dt > 0:
+            self.trend = self.beta * (level - self.level) / dt + (1 - self.beta) * self.trend
+        if self.season_days:
+            self.seasonal[int(x) % self.season_days] = self.gamma * (y - level) + (1 - self.gamma) * season
+        self.level = level
+        self.last_x = x
+
+    def forecast(self, x):
+        x = np.asarray(x, dtype=float)
+        values = self.level + self.trend * (x - self.last_x)
+        if self.season_days:
+            values = values + self.seasonal[x.astype(np.int64) % self.season_days]
+        return values
+
+MODEL_TYPES = {
+    OnlineLinearRegression.name: OnlineLinearRegression,
+    EWMA.name: EWMA,
+    HoltWinters.name: HoltWinters
+}
+
+class PairModels:
+    """
+    Estado de todos los modelos de un par, actualizado con cada nueva cotización.
+    """
+
+    def __init__(self, origin):
+        self.origin = origin
+        self.last_timestamp = None
+        self.last_value = None
+        self.models = {name: model_type() for name, model_type in MODEL_TYPES.items()}
+
+    def to_days(self, timestamps):
+        return (np.asarray(timestamps, dtype=float) - self.origin) / SECONDS_PER_DAY
+
+    def fit(self, timestamps, values):
+        x = self.to_days(timestamps)
+        for model in self.models.values():
+            model.fit(x, values)
+        self.last_timestamp = int(timestamps[-1])
+        self.last_value = float(values[-1])
+
+    def update(self, timestamp, value):
+        # Una cotización ya aplicada (misma marca de tiempo) puede llegar por on_append y por la
+        # sincronización con el almacén: se descarta para no contarla dos veces
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return
+        x = float(self.to_days(timestamp))
+        for model in self.models.values():
+            model.update(x, value)
+        self.last_timestamp = int(timestamp)
+        self.last_value = float(value)
+
+    def forecast(self, model, days_ahead):
+        """
+        Pronostica los días 1..days_ahead posteriores a la última cotización.
+        """
+        last_x = float(self.to_days(self.last_timestamp))
+        return self.models[model].forecast(last_x + np.arange(1, days_ahead + 1))
+
+class ForecastRegistry:
+    """
+    Caché de estados de modelo por par. El estado se construye una vez reproduciendo el
+    histórico (load_history(pair) -> (timestamps, valores)) y después se actualiza con on_append.
+    Los pronósticos se guardan por (par, modelo, días, última marca de tiempo).
+    """
+
+    def __init__(self, load_history, forecast_cache):
+        self.load_history = load_history
+        self.forecast_cache = forecast_cache
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def get(self, pair):
+        with self._lock:
+            state = self._states.get(pair)
+        if state is not None:
+            return state
+        history = self.load_history(pair)
+        if history is None or len(history[0]) == 0:
+            return None
+        state = build_state(*history)
+        with self._lock:
+            return self._states.setdefault(pair, state)
+
+    def replace(self, pair, state):
+        """
+        Sustituye el estado del par (p. ej. reentrenado porque el anterior estaba desactualizado).
+        """
+        with self._lock:
+            self._states[pair] = state
+
+    def on_append(self, pair, timestamp, value):
+        with self._lock:
+            state = self._states.get(pair)
+            if state is not None:
+                state.update(timestamp, value)
+
+    def forecast(self, pair, model, days_ahead, state=None):
+        """
+        Retorna (estado, valores pronosticados) o (None, None) si no hay datos del par.
+        """
+        state = state or self.get(pair)
+        if state is None:
+            return None, None
+        key = (pair, model, days_ahead, state.last_timestamp)
+        values = self.forecast_cache.get(key)
+        if values is None:
+            values = state.forecast(model, days_ahead)
+            self.forecast_cache.put(key, values)
+        return state, values
+
+    def forecast_many(self, pairs, model, days_ahead):
+        """
+        Pronostica varios pares en una sola operación vectorizada.
+        Retorna {par: valores} solo para los pares con datos.
+        """
+        states = {pair: self.get(pair) for pair in pairs}
+        states = {pair: state for pair, state in states.items() if state is not None}
+        if not states:
+            return {}
+        names = list(states)
+        steps = np.arange(1, days_ahead + 1, dtype=float)[np.newaxis, :]
+        models = [states[pair].models[model] for pair in names]
+
+        if model == OnlineLinearRegression.name:
+            coefficients = np.array([m.coefficients() for m in models])
+            last_x = np.array([m.last_x for m in models])[:, np.newaxis]
+            values = coefficients[:, :1] + coefficients[:, 1:] * (last_x + steps)
+        elif model == EWMA.name:
+            values = np.repeat(np.array([m.level for m in models])[:, np.newaxis], days_ahead, axis=1)
+        else:
+            level = np.array([m.level for m in models])[:, np.newaxis]
+            trend = np.array([m.trend for m in models])[:, np.newaxis]
+            values = level + trend * steps
+            if models[0].season_days:
+                last_x = np.array([m.last_x for m in models])[:, np.newaxis]
+                season_index = (last_x + steps).astype(np.int64) % models[0].season_days
+                seasonal = np.stack([m.seasonal for m in models])
+                values = values + np.take_along_axis(seasonal, season_index, axis=1)
+
+        return {pair: values[i] for i, pair in enumerate(names)}
+
+def build_state(timestamps, values):
+    """
+    Construye el estado de los modelos a partir de un histórico ordenado.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+    state = PairModels(origin=int(timestamps[0]))
+    state.fit(timestamps, values)
+    return state
@@ -0,0 +1,189 @@
+#Matriz fecha × moneda compilada desde USD_historical.json
+import os
+import json
+import logging
+import threading
+
+import numpy as np
+
+from tick_store import to_epoch
+from time_index import locate, NEAREST
+from file_lock import FileLock
+
+logger = logging.getLogger(__name__)
+
+MATRIX_SUFFIX = '.npy'
+INDEX_SUFFIX = '.index.json'
+
+class HistoricalMatrix:
+    """
+    Tasas de un archivo {fecha: {moneda: tasa}} como matriz densa fechas × monedas (NaN donde falta).
+    La matriz se guarda junto al JSON en formato .npy y se abre con mmap; un índice lateral
+    (.index.json) guarda las fechas, las monedas y el tamaño y la fecha de modificación del JSON,
+    de modo que solo se recompila cuando el JSON cambia.
+    """
+
+    def __init__(self, json_path, base='USD'):
+        self.json_path = json_path
+        self.base = base
+        stem = os.path.splitext(json_path)[0]
+        self.matrix_path = f"{stem}{MATRIX_SUFFIX}"
+        self.index_path = f"{stem}{INDEX_SUFFIX}"
+        self._lock = threading.Lock()
+        self._source = None
+        self.dates = []
+        self.currencies = []
+        self.date_index = {}
+        self.currency_index = {}
+        self.timestamps = np.empty(0, dtype='<i8')
+        self.matrix = np.empty((0, 0))
+
+    def _source_signature(self):
+        stat = os.stat(self.json_path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _read_index(self, signature):
+        """
+        Retorna el índice lateral si corresponde a la versión actual del JSON, o None.
+        """
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if index.get('source') != signature or not os.path.exists(self.matrix_path):
+            return None
+        return index
+
+    def _compile(self, signature):
+        with open(self.json_path) as f:
+            data = json.load(f)
+        dates = sorted(data)
+        # Se ignoran entradas no numéricas (p. ej. la clave 'date' de cada fecha)
+        currencies = sorted({code for rates in data.values() for code, rate in rates.items()
+                             if isinstance(rate, (int, float)) and not isinstance(rate, bool)})
+        columns = {code: i for i, code in enumerate(currencies)}
+
+        matrix = np.full((len(dates), len(currencies)), np.nan)
+        for row, date in enumerate(dates):
+            items = [(columns[code], float(rate)) for code, rate in data[date].items() if code in columns
+                     and isinstance(rate, (int, float)) and not isinstance(rate, bool)]
+            if items:
+                positions, values = zip(*items)
+                matrix[row, list(positions)] = values
+
+        # Primero la matriz y después el índice: un índice válido siempre apunta a su matriz
+        temporary = f"{self.matrix_path}.tmp"
+        with open(temporary, 'wb') as f:
+            np.save(f, matrix)
+        os.replace(temporary, self.matrix_path)
+        index = {'source': signature, 'base': self.base, 'dates': dates, 'currencies': currencies}
+        temporary = f"{self.index_path}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(index, f)
+        os.replace(temporary, self.index_path)
+        logger.info(f"Compilada la matriz {len(dates)}x{len(currencies)} de {self.json_path}")
+        return index
+
+    def load(self):
+        """
+        Abre la matriz compilada, recompilándola antes si el JSON cambió. Retorna self.
+        """
+        signature = self._source_signature()
+        with self._lock:
+            if self._source == signature:
+                return self
+            with FileLock(f"{self.matrix_path}.lock"):
+                index = self._read_index(signature) or self._compile(signature)
+                matrix = np.load(self.matrix_path, mmap_mode='r')
+            self.dates = index['dates']
+            self.currencies = index['currencies']
+            self.date_index = {date: i for i, date in enumerate(self.dates)}
+            self.currency_index = {code: i for i, code in enumerate(self.currencies)}
+            self.timestamps = np.array([to_epoch(date) for date in self.dates], dtype='<i8')
+            self.matrix = matrix
+            self._source = signature
+        return self
+
+    def _column(self, code):
+        position = self.currency_index.get(code)
+        if position is not None:
+            return self.matrix[:, position]
+        if code == self.base:
+            return np.ones(len(self.dates))
+        return None
+
+    def rate(self, date, code):
+        """
+        Unidades de code por 1 base en la fecha ('%Y-%m-%d'), o None si no hay dato.
+        """
+        row = self.date_index.get(date)
+        column = self.currency_index.get(code)
+        if row is None:
+            return None
+        if column is None:
+            return 1.0 if code == self.base else None
+        value = self.matrix[row, column]
+        return None if np.isnan(value) else float(value)
+
+    def _rows(self, start=None, end=None):
+        lo = 0 if start is None else int(np.searchsorted(self.timestamps, to_epoch(start), side='left'))
+        hi = len(self.timestamps) if end is None else int(np.searchsorted(self.timestamps, to_epoch(end), side='right'))
+        return lo, hi
+
+    def cross_series(self, base_currency, target_currency, start=None, end=None):
+        """
+        Tasa base/target en cada fecha entre start y end con ambos tramos disponibles.
+        Retorna (timestamps, tasas) como arrays.
+        """
+        base_column = self._column(base_currency)
+        target_column = self._column(target_currency)
+        if base_column is None or target_column is None:
+            return np.empty(0, dtype='<i8'), np.empty(0)
+        lo, hi = self._rows(start, end)
+        rates = np.asarray(target_column[lo:hi]) / np.asarray(base_column[lo:hi])
+        valid = ~np.isnan(rates)
+        return self.timestamps[lo:hi][valid], rates[valid]
+
+    def lookup(self, base_currency, target_currency, targets, mode=NEAREST):
+        """
+        Resuelve varias fechas (segundos epoch) sobre la serie base/target.
+        Retorna una lista alineada con targets de (timestamp, tasa) o None.
+        """
+        timestamps, rates = self.cross_series(base_currency, target_currency)
+        positions = locate(timestamps, targets, mode)
+        return [None if position < 0 else (int(timestamps[position]), float(rates[position])) for position in positions]
+
+    def cross_grid(self, codes, target_currency, targets, max_gap=None):
+        """
+        Tasas codes[i]/target_currency en la fecha más cercana a cada targets[j] (segundos epoch),
+        como matriz len(codes) × len(targets). NaN donde falta un tramo o la fecha más cercana
+        dista más de max_gap segundos.
+        """
+        grid = np.full((len(codes), len(targets)), np.nan)
+        target_column = self._column(target_currency)
+        if target_column is None or not len(self.dates):
+            return grid
+        targets = np.asarray(targets, dtype='<i8')
+        rows = locate(self.timestamps, targets, NEAREST)
+        usable = rows >= 0
+        if max_gap is not None:
+            usable &= np.abs(self.timestamps[np.maximum(rows, 0)] - targets) <= max_gap
+        rows = np.maximum(rows, 0)
+        target_values = np.asarray(target_column)[rows]
+        for i, code in enumerate(codes):
+            column = self._column(code)
+            if column is not None:
+                grid[i] = np.where(usable, target_values / np.asarray(column)[rows], np.nan)
+        return grid
+
+    def latest(self):
+        """
+        Última tasa conocida de cada moneda: lista de (moneda, tasa, fecha).
+        """
+        if not len(self.dates):
+            return []
+        valid = ~np.isnan(self.matrix)
+        last_rows = len(self.dates) - 1 - np.argmax(valid[::-1], axis=0)
+        return [(code, float(self.matrix[row, i]), self.dates[row])
+                for i, (code, row) in enumerate(zip(self.currencies, last_rows)) if valid[row, i]]
@@ -0,0 +1,74 @@
+#Cliente HTTP compartido para las APIs externas
+import time
+import random
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Códigos de estado que justifican un reintento
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class UpstreamError(Exception):
+    """
+    Error definitivo al llamar a una API externa (tras agotar los reintentos).
+    """
+
+class UpstreamClient:
+    """
+    Cliente HTTP con sesión y pool de conexiones reutilizables (keep-alive),
+    timeouts de conexión y lectura, y reintentos acotados con espera aleatoria (jitter).
+    base_url es configurable para poder usar un servidor local en lugar del proveedor real.
+    """
+
+    def __init__(self, base_url, connect_timeout=3.05, read_timeout=10, max_retries=2,
+                 backoff=0.5, max_backoff=4, pool_size=20, sleep=time.sleep):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.sleep = sleep
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _retry_delay(self, attempt):
+        # Full jitter: espera aleatoria entre 0 y el backoff exponencial
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def get_json(self, path='', params=None):
+        """
+        Realiza un GET y devuelve el cuerpo JSON.
+        Lanza UpstreamError si todos los intentos fallan.
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}" if path else self.base_url
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                if response.status_code in RETRY_STATUS_CODES:
+                    last_error = UpstreamError(f"HTTP {response.status_code} desde {url}")
+                elif response.status_code >= 400:
+                    # Errores 4xx: no tiene sentido reintentar (no se incluye la URL con la clave API)
+                    raise UpstreamError(f"HTTP {response.status_code} desde {url}")
+                else:
+                    return response.json()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+            except ValueError as e:
+                raise UpstreamError(f"Respuesta no JSON desde {url}: {e}") from e
+
+            if attempt < self.max_retries:
+                delay = self._retry_delay(attempt)
+                logger.info(f"Reintentando {url} en {delay:.2f}s (intento {attempt + 1}): {last_error}")
+                self.sleep(delay)
+
+        raise UpstreamError(f"Error al llamar a {url} tras {self.max_retries + 1} intentos: {last_error}")
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,138 @@
+#Detector compilado de intención, monedas y período
+import re
+
+def trie_pattern(words):
+    """
+    Construye una alternativa regex factorizada en forma de trie ('dolar(?:es)?|...').
+    Cada posición del texto se descarta con una sola comparación de carácter en lugar de
+    probar todas las palabras, y en cada posición se obtiene la coincidencia más larga.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        terminal = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char != '']
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if terminal:
+            return ('(?:' + body + ')?') if len(branches) == 1 else body + '?'
+        return body
+
+    return build(trie)
+
+class QueryMatcher:
+    """
+    Reconoce en una sola pasada la intención, las monedas (en orden de aparición) y el período.
+    Todas las palabras clave se compilan una vez en una expresión regular con lookahead, que se
+    evalúa en cada posición del texto para conservar la semántica de subcadena de detect_intent.
+    """
+
+    def __init__(self, intent_keywords, currency_codes, period_units, period_words):
+        """
+        intent_keywords: {intención: [palabras]} en orden de prioridad.
+        currency_codes: {nombre: código} como CURRENCY_CODES.
+        period_units: {'days'|'weeks'|'months': [unidades]} para los patrones '<número> <unidad>'.
+        period_words: {tipo: [palabras]} en orden de prioridad para el período por defecto.
+        """
+        self.intent_order = list(intent_keywords)
+        self.period_order = list(period_units)
+        self.period_word_order = list(period_words)
+
+        # Cada palabra clave se asocia a sus etiquetas: ('intent', x), ('currency', código) o ('period', tipo)
+        labels = {}
+        for intent, words in intent_keywords.items():
+            for word in words:
+                labels.setdefault(word, set()).add(('intent', intent))
+        for name, code in currency_codes.items():
+            labels.setdefault(name, set()).add(('currency', code))
+        for period_type, words in period_words.items():
+            for word in words:
+                labels.setdefault(word, set()).add(('period', period_type))
+
+        # La regex devuelve la palabra más larga en cada posición; las palabras que son prefijo
+        # de ella empiezan en la misma posición, así que sus etiquetas (salvo moneda) se heredan
+        self._labels = {}
+        for word, own in labels.items():
+            merged = set(own)
+            for other, other_labels in labels.items():
+                if other != word and word.startswith(other):
+                    merged.update(label for label in other_labels if label[0] != 'currency')
+                    if not any(label[0] == 'currency' for label in own):
+                        merged.update(label for label in other_labels if label[0] == 'currency')
+            # Etiquetas precalculadas: (intenciones, moneda o None, tipos de período)
+            self._labels[word] = (
+                frozenset(value for kind, value in merged if kind == 'intent'),
+                next((value for kind, value in merged if kind == 'currency'), None),
+                frozenset(value for kind, value in merged if kind == 'period')
+            )
+
+        keywords = trie_pattern(labels)
+        units = {unit: period_type for period_type, unit_list in period_units.items() for unit in unit_list}
+        unit_pattern = trie_pattern(units)
+        self._units = units
+        self._pattern = re.compile(rf'(?=({keywords})|(\d+)\s*({unit_pattern}))')
+
+    def match(self, text):
+        """
+        Retorna {'intent', 'currencies', 'period'} para el texto.
+        """
+        intents = set()
+        currencies = []
+        period_words = set()
+        period_values = {}
+        labels = self._labels
+
+        for keyword, number, unit in self._pattern.findall(text.lower()):
+            if keyword:
+                keyword_intents, currency, periods = labels[keyword]
+                if keyword_intents:
+                    intents |= keyword_intents
+                if currency and currency not in currencies:
+                    currencies.append(currency)
+                if periods:
+                    period_words |= periods
+            else:
+                period_type = self._units[unit]
+                if period_type not in period_values:
+                    period_values[period_type] = int(number)
+
+        return {
+            'intent': self._resolve_intent(intents, currencies),
+            'currencies': currencies,
+            'period': self._resolve_period(period_values, period_words)
+        }
+
+    def currency_spans(self, text):
+        """
+        Retorna [(inicio, fin, código)] de cada moneda mencionada, en orden de aparición.
+        """
+        spans = []
+        for m in self._pattern.finditer(text.lower()):
+            keyword = m.group(1)
+            if keyword and self._labels[keyword][1]:
+                spans.append((m.start(), m.start() + len(keyword), self._labels[keyword][1]))
+        return spans
+
+    def _resolve_intent(self, intents, currencies):
+        for intent in self.intent_order:
+            if intent in intents:
+                return intent
+        # Cualquier moneda conocida (con o sin cantidad) se interpreta como conversión
+        if currencies:
+            return "conversion"
+        return "unknown"
+
+    def _resolve_period(self, period_values, period_words):
+        for period_type in self.period_order:
+            if period_type in period_values:
+                return {'type': period_type, 'value': period_values[period_type]}
+        for period_type in self.period_word_order:
+            if period_type in period_words:
+                return {'type': period_type, 'value': 1}
+        return {'type': 'days', 'value': 7}  # Por defecto, una semana
@@ -0,0 +1,70 @@
+#Ejecución concurrente de las consultas de E/S de una intención
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+class IOPipeline:
+    """
+    Lanza a la vez las consultas independientes de una intención (histórico, cotización actual,
+    noticias) en un pool de hilos compartido y acotado, y espera a que terminen todas.
+    El tiempo de respuesta pasa a ser el de la consulta más lenta en lugar de la suma.
+    """
+
+    def __init__(self, max_workers=16, timeout=None):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='io-pipeline')
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+        self.failures = 0
+
+    def _run(self, name, func, args):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.calls += 1
+        try:
+            return func(*args)
+        except Exception as e:
+            logger.error(f"Error en la consulta concurrente '{name}': {e}")
+            with self._lock:
+                self.failures += 1
+            return None
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _submit(self, calls):
+        futures = {}
+        for name, call in calls.items():
+            if call is None:
+                continue
+            func, *args = call if isinstance(call, tuple) else (call,)
+            # Cada tarea corre con una copia del contexto de quien la lanza (p. ej. el memo de un lote)
+            futures[name] = self._executor.submit(contextvars.copy_context().run, self._run, name, func, args)
+        return futures
+
+    def gather(self, **calls):
+        """
+        Ejecuta calls ({nombre: función o (función, *args)}) en paralelo.
+        Retorna {nombre: resultado}; una consulta que falla, expira o es None da None.
+        """
+        futures = self._submit(calls)
+        wait(futures.values(), timeout=self.timeout)
+        return {
+            name: (futures[name].result() if name in futures and futures[name].done() else None)
+            for name in calls
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'calls': self.calls,
+                'failures': self.failures
+            }
@@ -0,0 +1,72 @@
+#Caché LRU acotada con estadísticas
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    """
+    Caché LRU segura entre hilos, acotada por número de entradas y opcionalmente por tamaño
+    total (sizeof(valor) en bytes). Lleva la cuenta de aciertos, fallos y expulsiones.
+    """
+
+    def __init__(self, maxsize=1024, max_bytes=None, sizeof=len):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._sizes = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Un valor mayor que toda la caché no se guarda
+            return
+        with self._lock:
+            if key in self._data:
+                self.total_bytes -= self._sizes.pop(key, 0)
+                del self._data[key]
+            self._data[key] = value
+            self._sizes[key] = size
+            self.total_bytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self.total_bytes > self.max_bytes):
+                old_key, _ = self._data.popitem(last=False)
+                self.total_bytes -= self._sizes.pop(old_key, 0)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
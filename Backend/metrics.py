@@ -0,0 +1,134 @@
+#Métricas de latencia y uso en formato de texto de Prometheus
+import time
+import bisect
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+# Límites de los histogramas de latencia (segundos) y de tamaño de lectura (registros)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+class Histogram:
+    """
+    Histograma acumulativo: una búsqueda binaria y tres sumas por observación.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """
+    Contadores e histogramas con etiquetas, más recolectores que leen estadísticas ya existentes
+    (cachés, cuota) solo al generar /metrics, sin coste en el camino de las solicitudes.
+    """
+
+    def __init__(self, prefix='forexai'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {}     # (nombre, etiquetas) -> valor
+        self._histograms = {}   # (nombre, etiquetas) -> Histogram
+        self._help = {}
+        self._collectors = []
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Mide la duración del bloque en segundos en el histograma name.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name, **labels):
+        """
+        Decorador equivalente a timer() para toda la función.
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def register_collector(self, collect):
+        """
+        collect() -> [(nombre, {etiquetas}, valor)] con métricas de tipo gauge.
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        """
+        Genera la exposición en formato de texto de Prometheus (versión 0.0.4).
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                ((key, list(h.counts), h.sum, h.count, h.buckets) for key, h in self._histograms.items()),
+                key=lambda item: item[0]
+            )
+
+        lines = []
+        typed = set()
+
+        def header(name, kind, suffix=''):
+            if name in typed:
+                return
+            typed.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {self.prefix}_{name}{suffix} {self._help[name]}")
+            lines.append(f"# TYPE {self.prefix}_{name}{suffix} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, 'counter', '_total')
+            lines.append(f"{self.prefix}_{name}_total{_format_labels(labels)} {value}")
+
+        for (name, labels), counts, total, count, buckets in histograms:
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.prefix}_{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.prefix}_{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.prefix}_{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.prefix}_{name}_count{_format_labels(labels)} {count}")
+
+        for collect in self._collectors:
+            for name, labels, value in collect():
+                header(name, 'gauge')
+                lines.append(f"{self.prefix}_{name}{_format_labels(tuple(sorted(labels.items())))} {value}")
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,111 @@
+#Precarga en segundo plano de los pares más consultados
+import time
+import logging
+import threading
+from collections import defaultdict
+
+from quota import upstream_priority, BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+class PrefetchScheduler:
+    """
+    Cuenta las consultas por par y, en un hilo en segundo plano, refresca la cotización y la
+    serie diaria de los pares más demandados antes de que un usuario las pida.
+    Solo gasta llamadas cuando el presupuesto de Alpha Vantage lo permite para prioridad BACKGROUND.
+    """
+
+    def __init__(self, refresh_quote, refresh_daily, quota, interval=60, top_n=5,
+                 decay=0.95, quote_due=None, daily_refresh_seconds=86400, clock=time.time):
+        self.refresh_quote = refresh_quote      # callable(base, target) -> bool
+        self.refresh_daily = refresh_daily      # callable(base, target) -> bool
+        self.quota = quota
+        self.interval = interval
+        self.top_n = top_n
+        self.decay = decay
+        self.quote_due = quote_due or (lambda base, target: True)
+        self.daily_refresh_seconds = daily_refresh_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._demand = defaultdict(float)
+        self._daily_refreshed = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.prefetched = 0
+        self.skipped = 0
+
+    def record(self, base_currency, target_currency):
+        """
+        Registra una consulta interactiva del par.
+        """
+        if not base_currency or not target_currency or base_currency == target_currency:
+            return
+        with self._lock:
+            self._demand[(base_currency, target_currency)] += 1
+
+    def hot_pairs(self, n=None):
+        with self._lock:
+            ranked = sorted(self._demand.items(), key=lambda item: item[1], reverse=True)
+        return [pair for pair, _ in ranked[:n or self.top_n]]
+
+    def run_once(self):
+        """
+        Un ciclo de precarga. Retorna el número de llamadas realizadas.
+        """
+        calls = 0
+        with upstream_priority(BACKGROUND):
+            for base_currency, target_currency in self.hot_pairs():
+                if self.quote_due(base_currency, target_currency):
+                    if not self.quota.can_spend(BACKGROUND):
+                        self.skipped += 1
+                        break
+                    if self.refresh_quote(base_currency, target_currency):
+                        calls += 1
+
+                pair = (base_currency, target_currency)
+                if self.clock() - self._daily_refreshed.get(pair, 0) >= self.daily_refresh_seconds:
+                    if not self.quota.can_spend(BACKGROUND):
+                        self.skipped += 1
+                        break
+                    if self.refresh_daily(base_currency, target_currency):
+                        self._daily_refreshed[pair] = self.clock()
+                        calls += 1
+
+        # Las consultas antiguas pierden peso para seguir la demanda reciente
+        with self._lock:
+            for pair in list(self._demand):
+                self._demand[pair] *= self.decay
+                if self._demand[pair] < 0.01:
+                    del self._demand[pair]
+
+        self.prefetched += calls
+        return calls
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                calls = self.run_once()
+                if calls:
+                    logger.info(f"Precarga: {calls} llamadas para los pares {self.hot_pairs()}")
+            except Exception as e:
+                logger.error(f"Error en la precarga de pares: {e}")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='prefetch-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def stats(self):
+        return {
+            'hot_pairs': [f"{base}/{target}" for base, target in self.hot_pairs()],
+            'prefetched': self.prefetched,
+            'skipped': self.skipped,
+            'quota': self.quota.stats()
+        }
@@ -0,0 +1,348 @@
+#Presupuesto de llamadas a Alpha Vantage
+import time
+import hashlib
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+
+from file_lock import FileLock
+
+# Clases de prioridad de las llamadas externas
+INTERACTIVE = 'interactive'
+NEWS = 'news'
+BACKGROUND = 'background'
+PRIORITIES = (INTERACTIVE, NEWS, BACKGROUND)
+
+# Segundos de pausa de una clave tras recibir el aviso de límite por minuto
+RATE_LIMIT_COOLDOWN = 60.0
+
+# Variable de contexto (no de hilo): IOPipeline copia el contexto a sus tareas y la prioridad las acompaña
+_priority = contextvars.ContextVar('upstream_priority', default=INTERACTIVE)
+
+@contextmanager
+def upstream_priority(priority):
+    """
+    Marca las llamadas externas hechas dentro del bloque con la prioridad indicada.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority():
+    return _priority.get()
+
+def rate_limit_message(data):
+    """
+    Alpha Vantage responde 200 con 'Note' o 'Information' al superar el límite.
+    Retorna el mensaje si la respuesta es un aviso de límite, o None.
+    """
+    if not isinstance(data, dict):
+        return None
+    message = data.get('Note') or data.get('Information')
+    if not message:
+        return None
+    text = message.lower()
+    if any(word in text for word in ('call frequency', 'rate limit', 'calls per', 'requests per')):
+        return message
+    return None
+
+def mask_key(key):
+    """
+    Últimos caracteres de la clave API, para estadísticas y registros.
+    """
+    return f"...{key[-4:]}" if key else 'sin clave'
+
+def key_id(key):
+    """
+    Identificador estable de la clave API para la caché compartida, sin guardar la clave.
+    """
+    return hashlib.sha256(key.encode()).hexdigest()[:16] if key else 'default'
+
+class QuotaExceeded(Exception):
+    """
+    No hay presupuesto de llamadas para la prioridad solicitada.
+    """
+
+class TokenBucket:
+    """
+    Cubeta de fichas: capacity fichas que se reponen de forma continua a refill_rate por segundo.
+    """
+
+    def __init__(self, capacity, refill_rate, clock=time.monotonic):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def available(self):
+        self._refill()
+        return self.tokens
+
+    def consume(self, n=1, reserve=0, force=False):
+        """
+        Consume n fichas si quedan al menos n + reserve. Con force se consumen igualmente
+        (el saldo puede quedar negativo hasta -capacity) para no bloquear las llamadas prioritarias.
+        """
+        self._refill()
+        if self.tokens - reserve >= n:
+            self.tokens -= n
+            return True
+        if force:
+            self.tokens = max(-self.capacity, self.tokens - n)
+            return True
+        return False
+
+    def seconds_until(self, n=1, reserve=0):
+        """
+        Segundos hasta que haya n fichas disponibles por encima de la reserva.
+        """
+        missing = n + reserve - self.available()
+        if missing <= 0:
+            return 0.0
+        return missing / self.refill_rate if self.refill_rate else float('inf')
+
+class AlphaVantageQuota:
+    """
+    Límites por minuto y por día de una clave de Alpha Vantage. Cada clase de prioridad
+    solo gasta fichas por encima de su reserva: las interactivas pueden usar todo el saldo,
+    las noticias dejan una ficha por minuto y las de segundo plano dejan la reserva completa.
+    Tras un aviso de límite la clave queda bloqueada hasta que la ventana se reponga.
+    Con shared (SharedCache) el saldo y el bloqueo se guardan en la caché compartida y se leen y
+    escriben bajo un bloqueo de archivo, de modo que todos los procesos gastan un único presupuesto;
+    clock debe ser entonces el reloj de pared. Los contadores de uso son de cada proceso.
+    """
+
+    def __init__(self, per_minute=5, per_day=25, minute_reserve=2, day_reserve_ratio=0.2, clock=time.monotonic,
+                 shared=None, name='default'):
+        self._lock = threading.Lock()
+        self.clock = clock
+        self.shared = shared
+        self.shared_key = f"quota:{name}"
+        self.lock_path = f"{shared.path}.{name}.lock" if shared else None
+        self.minute = TokenBucket(per_minute, per_minute / 60.0, clock)
+        self.day = TokenBucket(per_day, per_day / 86400.0, clock)
+        minute_reserve = min(minute_reserve, max(per_minute - 1, 0))
+        day_reserve = int(per_day * day_reserve_ratio)
+        # Fichas (por minuto, por día) que cada clase deja libres para las de mayor prioridad
+        self.reserves = {
+            INTERACTIVE: (0, 0),
+            NEWS: (min(1, minute_reserve), day_reserve // 2),
+            BACKGROUND: (minute_reserve, day_reserve)
+        }
+        self.blocked_until = 0.0
+        self.used = {priority: 0 for priority in PRIORITIES}
+        self.denied = {priority: 0 for priority in PRIORITIES}
+        self.rate_limited = 0
+        self._dirty = False
+
+    @contextmanager
+    def _state(self, write=False):
+        """
+        Acceso exclusivo al saldo. Con caché compartida se carga al entrar; con write el bloque
+        corre además bajo el bloqueo de archivo y, si modificó el saldo (_dirty), se guarda al salir.
+        Las lecturas no toman el bloqueo ni escriben: la reposición se deduce de (fichas, fecha).
+        """
+        with self._lock:
+            if self.shared is None:
+                yield
+                return
+            lock = FileLock(self.lock_path) if write else nullcontext()
+            with lock:
+                state = self.shared.get(self.shared_key)
+                if state:
+                    self.minute.tokens, self.minute.updated = state['minute']
+                    self.day.tokens, self.day.updated = state['day']
+                    self.blocked_until = state['blocked_until']
+                self._dirty = False
+                yield
+                if write and self._dirty:
+                    self.shared.put(self.shared_key, {
+                        'minute': (self.minute.tokens, self.minute.updated),
+                        'day': (self.day.tokens, self.day.updated),
+                        'blocked_until': self.blocked_until
+                    })
+
+    def _wait_for(self, priority):
+        minute_reserve, day_reserve = self.reserves.get(priority, self.reserves[BACKGROUND])
+        return max(self.blocked_until - self.clock(),
+                   self.minute.seconds_until(1, minute_reserve),
+                   self.day.seconds_until(1, day_reserve))
+
+    def seconds_until(self, priority=BACKGROUND):
+        """
+        Segundos hasta que una llamada de la prioridad indicada tenga presupuesto (0 si ya lo tiene).
+        """
+        with self._state():
+            return max(self._wait_for(priority), 0.0)
+
+    def last_day_tokens(self):
+        """
+        Saldo diario de la última lectura, sin consultar la caché compartida (para ordenar claves).
+        """
+        return self.day.tokens
+
+    def can_spend(self, priority=BACKGROUND):
+        return self.seconds_until(priority) <= 0
+
+    def try_consume(self, priority):
+        """
+        Consume una llamada si hay presupuesto para su prioridad, con una sola lectura y escritura
+        del saldo. Retorna 0 si se consumió o los segundos que faltan para poder hacerlo.
+        """
+        with self._state(write=True):
+            wait = self._wait_for(priority)
+            if wait > 0:
+                return wait
+            self.minute.consume()
+            self.day.consume()
+            self._dirty = True
+            self.used[priority] = self.used.get(priority, 0) + 1
+            return 0.0
+
+    def acquire(self, priority=None):
+        """
+        Registra una llamada externa si hay presupuesto para su prioridad. Retorna False si no lo hay.
+        """
+        priority = priority or current_priority()
+        if self.try_consume(priority) > 0:
+            self.deny(priority)
+            return False
+        return True
+
+    def _deny(self, priority):
+        self.denied[priority] = self.denied.get(priority, 0) + 1
+
+    def deny(self, priority):
+        """
+        Cuenta una llamada rechazada sin consultar el saldo.
+        """
+        with self._lock:
+            self._deny(priority)
+
+    def mark_rate_limited(self, message=''):
+        """
+        El proveedor rechazó una llamada: se vacía la ventana afectada para no gastar más en rechazos.
+        """
+        text = message.lower()
+        with self._state(write=True):
+            self._dirty = True
+            self.rate_limited += 1
+            self.minute.tokens = min(self.minute.tokens, 0.0)
+            self.blocked_until = max(self.blocked_until, self.clock() + RATE_LIMIT_COOLDOWN)
+            if 'per day' in text and 'per minute' not in text:
+                self.day.tokens = min(self.day.tokens, 0.0)
+
+    def stats(self):
+        with self._state():
+            return {
+                'minute_tokens': round(self.minute.available(), 2),
+                'day_tokens': round(self.day.available(), 2),
+                'blocked_for': round(max(self.blocked_until - self.clock(), 0.0), 1),
+                'used': dict(self.used),
+                'denied': dict(self.denied),
+                'rate_limited': self.rate_limited
+            }
+
+class AdmissionController:
+    """
+    Control de admisión de las llamadas a Alpha Vantage con una o varias claves API.
+    Cada llamada se asigna a la clave con más saldo diario que la admita; si ninguna tiene
+    presupuesto, la llamada espera en cola hasta max_wait[prioridad] segundos o se rechaza
+    de inmediato, para que quien llama responda con datos locales en vez de gastar una llamada
+    que el proveedor rechazaría. Con shared el presupuesto de cada clave es común a todos los
+    procesos (workers de gunicorn, carga masiva) y clock pasa a ser el reloj de pared.
+    """
+
+    def __init__(self, keys, per_minute=5, per_day=25, max_wait=None, clock=time.monotonic, shared=None):
+        if shared is not None:
+            clock = time.time
+        self.clock = clock
+        self.quotas = {
+            key: AlphaVantageQuota(per_minute, per_day, clock=clock, shared=shared, name=key_id(key))
+            for key in (keys or [None])
+        }
+        self.max_wait = {INTERACTIVE: 5.0, NEWS: 0.0, BACKGROUND: 0.0}
+        self.max_wait.update(max_wait or {})
+        self._condition = threading.Condition()
+        self.queued = 0
+        self.waiting = 0
+
+    def _try_acquire(self, priority):
+        """
+        Intenta consumir en cada clave, de más a menos saldo diario según la última lectura.
+        Retorna (clave, 0, None) si una clave admitió la llamada o (None, espera más corta en
+        segundos, clave con esa espera) si ninguna lo hizo.
+        """
+        ranked = sorted(self.quotas.items(), key=lambda item: item[1].last_day_tokens(), reverse=True)
+        shortest, shortest_key = float('inf'), None
+        for key, quota in ranked:
+            wait = quota.try_consume(priority)
+            if wait <= 0:
+                return key, 0.0, None
+            if wait < shortest:
+                shortest, shortest_key = wait, key
+        return None, shortest, shortest_key
+
+    def seconds_until(self, priority=BACKGROUND):
+        """
+        Segundos hasta que alguna clave admita una llamada de la prioridad indicada.
+        """
+        return min(quota.seconds_until(priority) for quota in self.quotas.values())
+
+    def can_spend(self, priority=BACKGROUND):
+        return self.seconds_until(priority) <= 0
+
+    def acquire(self, priority=None):
+        """
+        Reserva una llamada. Retorna la clave API a usar o lanza QuotaExceeded si no se admite.
+        """
+        priority = priority or current_priority()
+        deadline = self.clock() + self.max_wait.get(priority, 0.0)
+        with self._condition:
+            queued = False
+            try:
+                while True:
+                    key, wait, shortest_key = self._try_acquire(priority)
+                    if wait <= 0:
+                        return key
+                    if self.clock() + wait > deadline:
+                        # Sin saldo a tiempo: se cuenta como rechazo en la clave con menos espera
+                        self.quotas[shortest_key].deny(priority)
+                        raise QuotaExceeded(f"Sin presupuesto de Alpha Vantage para llamadas {priority}")
+                    if not queued:
+                        queued = True
+                        self.queued += 1
+                        self.waiting += 1
+                    self._condition.wait(wait)
+            finally:
+                if queued:
+                    self.waiting -= 1
+
+    def report(self, key, data):
+        """
+        Revisa la respuesta del proveedor. Si es un aviso de límite bloquea la clave y retorna el mensaje.
+        """
+        message = rate_limit_message(data)
+        if message:
+            self.quotas[key].mark_rate_limited(message)
+        return message
+
+    def stats(self):
+        keys = {mask_key(key): quota.stats() for key, quota in self.quotas.items()}
+        return {
+            'minute_tokens': round(sum(stats['minute_tokens'] for stats in keys.values()), 2),
+            'day_tokens': round(sum(stats['day_tokens'] for stats in keys.values()), 2),
+            'used': {priority: sum(stats['used'].get(priority, 0) for stats in keys.values()) for priority in PRIORITIES},
+            'denied': {priority: sum(stats['denied'].get(priority, 0) for stats in keys.values()) for priority in PRIORITIES},
+            'queued': self.queued,
+            'waiting': self.waiting,
+            'keys': keys
+        }
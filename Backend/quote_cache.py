@@ -0,0 +1,198 @@
+#Caché de cotizaciones con TTL y agrupación de solicitudes
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+def invert_quote(quote):
+    """
+    Calcula la cotización del par inverso: el bid inverso sale del ask original y viceversa.
+    """
+    return {
+        'mid_price': 1 / quote['mid_price'],
+        'bid_price': 1 / quote['ask_price'],
+        'ask_price': 1 / quote['bid_price'],
+        'timestamp': quote['timestamp']
+    }
+
+def parse_ttl_overrides(text):
+    """
+    Convierte 'EUR_USD=30,USD_JPY=10' en un diccionario par -> segundos.
+    """
+    ttls = {}
+    for item in (text or '').split(','):
+        if '=' not in item:
+            continue
+        pair, ttl = item.split('=', 1)
+        try:
+            ttls[pair.strip().upper()] = float(ttl)
+        except ValueError:
+            logger.error(f"TTL inválido para {pair}: {ttl}")
+    return ttls
+
+class _Flight:
+    """
+    Solicitud en curso para un par; los demás hilos esperan su resultado.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+class QuoteCache:
+    """
+    Caché en proceso de cotizaciones por par con TTL configurable.
+    Las llamadas concurrentes para el mismo par esperan una única solicitud al proveedor
+    y cada cotización guardada también se almacena para el par inverso.
+    Con shared (una SharedCache) las cotizaciones se comparten además entre procesos.
+    """
+
+    def __init__(self, default_ttl=60, ttls=None, clock=time.monotonic, shared=None):
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self.clock = clock
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._entries = {}   # par -> (expira_en, cotización)
+        self._flights = {}   # par -> _Flight
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.coalesced = 0
+
+    def ttl_for(self, pair):
+        return self.ttls.get(pair, self.default_ttl)
+
+    def set_ttl(self, pair, ttl):
+        with self._lock:
+            self.ttls[pair] = ttl
+
+    def _lookup(self, pair):
+        entry = self._entries.get(pair)
+        if entry and entry[0] > self.clock():
+            return dict(entry[1])
+        return None
+
+    def _lookup_shared(self, pair):
+        """
+        Busca el par en la caché compartida y, si está, lo copia a la local con el TTL restante.
+        """
+        if self.shared is None:
+            return None
+        entry = self.shared.get_entry(f"quote:{pair}")
+        if entry is None:
+            return None
+        quote, expires_in = entry
+        with self._lock:
+            self._entries[pair] = (self.clock() + (expires_in if expires_in is not None else self.ttl_for(pair)), dict(quote))
+            self.shared_hits += 1
+        return dict(quote)
+
+    def get(self, pair):
+        """
+        Devuelve la cotización vigente del par o None si no existe o expiró.
+        """
+        with self._lock:
+            quote = self._lookup(pair)
+            if quote:
+                self.hits += 1
+                return quote
+        quote = self._lookup_shared(pair)
+        with self._lock:
+            if quote:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return quote
+
+    def put(self, base_currency, target_currency, quote, store_inverse=True):
+        """
+        Guarda una cotización (y opcionalmente la del par inverso).
+        """
+        now = self.clock()
+        pair = f"{base_currency}_{target_currency}"
+        entries = {pair: dict(quote)}
+        if store_inverse and quote['bid_price'] and quote['ask_price']:
+            entries[f"{target_currency}_{base_currency}"] = invert_quote(quote)
+        with self._lock:
+            for key, value in entries.items():
+                self._entries[key] = (now + self.ttl_for(key), value)
+        if self.shared is not None:
+            for key, value in entries.items():
+                self.shared.put(f"quote:{key}", value, self.ttl_for(key))
+
+    def expires_in(self, pair):
+        """
+        Segundos hasta que expire la cotización del par (0 si no existe o ya expiró).
+        """
+        with self._lock:
+            entry = self._entries.get(pair)
+            return max(0.0, entry[0] - self.clock()) if entry else 0.0
+
+    def invalidate(self, pair=None):
+        with self._lock:
+            if pair is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(pair, None)
+
+    def get_or_fetch(self, base_currency, target_currency, fetch, timeout=60):
+        """
+        Devuelve la cotización desde la caché o llama a fetch(base, target) una sola vez
+        aunque haya varios hilos pidiendo el mismo par al mismo tiempo.
+        """
+        pair = f"{base_currency}_{target_currency}"
+        with self._lock:
+            quote = self._lookup(pair)
+            if quote:
+                self.hits += 1
+                return quote
+
+        # Otro worker pudo haberla consultado ya
+        quote = self._lookup_shared(pair)
+        if quote:
+            with self._lock:
+                self.hits += 1
+            return quote
+
+        with self._lock:
+            self.misses += 1
+            flight = self._flights.get(pair)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[pair] = flight
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait(timeout)
+            return dict(flight.result) if flight.result else None
+
+        try:
+            flight.result = fetch(base_currency, target_currency)
+            if flight.result:
+                self.put(base_currency, target_currency, flight.result)
+            return dict(flight.result) if flight.result else None
+        finally:
+            with self._lock:
+                self._flights.pop(pair, None)
+            flight.done.set()
+
+    def stats(self):
+        """
+        Contadores para ajustar el TTL: aciertos, fallos y solicitudes agrupadas.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'shared_hits': self.shared_hits,
+                'coalesced': self.coalesced,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'default_ttl': self.default_ttl,
+                'ttls': dict(self.ttls)
+            }
@@ -0,0 +1,122 @@
+#Difusión de cotizaciones en vivo a los clientes suscritos
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    """
+    Cola de eventos (par, cotización) de un cliente conectado.
+    """
+
+    def __init__(self, pairs, maxsize=100):
+        self.pairs = tuple(pairs)
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def push(self, event):
+        # Un cliente lento no bloquea al sondeo: se descarta su evento más antiguo
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """
+        Siguiente evento (par, cotización) o None si no llegó ninguno en timeout segundos.
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class QuoteStream:
+    """
+    Un único hilo de sondeo por par, compartido por todos los clientes suscritos a ese par.
+    Solo se difunden las cotizaciones cuyo precio medio cambió al menos threshold; el coste
+    en la API crece con el número de pares distintos, no con el de clientes conectados.
+    El hilo de un par se detiene cuando se va su último suscriptor.
+    """
+
+    def __init__(self, fetch, interval=30, threshold=0.0001, queue_size=100):
+        self.fetch = fetch              # callable(base, target) -> cotización o None
+        self.interval = interval
+        self.threshold = threshold
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = {}          # par -> set de Subscription
+        self._pollers = {}              # par -> threading.Event de parada
+        self._last = {}                 # par -> última cotización difundida
+        self.polls = 0
+        self.published = 0
+
+    def subscribe(self, pairs):
+        """
+        Suscribe un cliente a una lista de pares (base, target). Recibe de inmediato la última
+        cotización conocida de cada par y después solo los cambios.
+        """
+        subscription = Subscription(pairs, self.queue_size)
+        with self._lock:
+            for pair in subscription.pairs:
+                self._subscribers.setdefault(pair, set()).add(subscription)
+                if pair in self._last:
+                    subscription.push((pair, self._last[pair]))
+                if pair not in self._pollers:
+                    stop = threading.Event()
+                    self._pollers[pair] = stop
+                    threading.Thread(target=self._poll, args=(pair, stop), name=f"quote-stream-{pair[0]}{pair[1]}", daemon=True).start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for pair in subscription.pairs:
+                subscribers = self._subscribers.get(pair)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[pair]
+                    self._pollers.pop(pair).set()
+
+    def _poll(self, pair, stop):
+        while not stop.is_set():
+            try:
+                quote = self.fetch(*pair)
+                self.polls += 1
+                if quote:
+                    self.publish(pair, quote)
+            except Exception as e:
+                logger.error(f"Error en el sondeo de {pair[0]}/{pair[1]}: {e}")
+            stop.wait(self.interval)
+
+    def publish(self, pair, quote):
+        """
+        Difunde la cotización si difiere de la última enviada al menos en threshold.
+        Retorna True si se envió.
+        """
+        with self._lock:
+            last = self._last.get(pair)
+            if last is not None and abs(last['mid_price'] - quote['mid_price']) < self.threshold:
+                return False
+            self._last[pair] = quote
+            subscribers = list(self._subscribers.get(pair, ()))
+            self.published += 1
+        for subscription in subscribers:
+            subscription.push((pair, quote))
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pairs': [f"{base}/{target}" for base, target in self._pollers],
+                'subscribers': sum(len(subscribers) for subscribers in self._subscribers.values()),
+                'polls': self.polls,
+                'published': self.published
+            }
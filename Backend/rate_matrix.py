@@ -0,0 +1,146 @@
+#Matriz de tasas cruzadas
+import time
+import logging
+import threading
+
+import numpy as np
+
+from tick_store import to_epoch
+from historical_matrix import HistoricalMatrix
+
+logger = logging.getLogger(__name__)
+
+class RateMatrix:
+    """
+    Vector de tasas respecto a una moneda pivote (por defecto USD): rates[X] = unidades de X por 1 pivote.
+    Cualquier par cruzado se obtiene por división (rates[B] / rates[A]) sin llamar a la API,
+    y cada tramo guarda la fecha de su última actualización para conocer su frescura.
+    """
+
+    def __init__(self, pivot='USD', capacity=256):
+        self.pivot = pivot
+        self._lock = threading.Lock()
+        self.codes = []
+        self.index = {}
+        self.rates = np.full(capacity, np.nan)
+        self.as_of = np.zeros(capacity, dtype=np.int64)
+        self._slot(pivot)
+        self.rates[0] = 1.0
+        self.as_of[0] = np.iinfo(np.int64).max  # el pivote nunca caduca
+
+    def _slot(self, code):
+        position = self.index.get(code)
+        if position is None:
+            position = len(self.codes)
+            if position == len(self.rates):
+                self.rates = np.concatenate([self.rates, np.full(len(self.rates), np.nan)])
+                self.as_of = np.concatenate([self.as_of, np.zeros(len(self.as_of), dtype=np.int64)])
+            self.codes.append(code)
+            self.index[code] = position
+        return position
+
+    def __contains__(self, code):
+        position = self.index.get(code)
+        return position is not None and not np.isnan(self.rates[position])
+
+    def load_vector(self, base, rates, as_of):
+        """
+        Carga un vector {moneda: unidades por 1 base}. Si la base no es el pivote,
+        se convierte usando la tasa conocida de la base; devuelve el número de tramos cargados.
+        Solo se reemplazan tramos con fecha anterior o igual a as_of.
+        """
+        as_of_ts = to_epoch(as_of)
+        with self._lock:
+            if base == self.pivot:
+                factor = 1.0
+            else:
+                base_position = self.index.get(base)
+                if base_position is None or np.isnan(self.rates[base_position]):
+                    logger.error(f"No se puede cargar el vector {base}: falta la tasa {self.pivot}/{base}.")
+                    return 0
+                factor = self.rates[base_position]
+                as_of_ts = min(as_of_ts, int(self.as_of[base_position]))
+
+            # Se ignoran entradas no numéricas (p. ej. la clave 'date' del JSON histórico)
+            codes = [code for code, rate in rates.items()
+                     if code != self.pivot and isinstance(rate, (int, float)) and rate > 0]
+            positions = np.array([self._slot(code) for code in codes], dtype=np.int64)
+            values = np.array([float(rates[code]) for code in codes]) * factor
+            if len(positions) == 0:
+                return 0
+            newer = self.as_of[positions] <= as_of_ts
+            self.rates[positions[newer]] = values[newer]
+            self.as_of[positions[newer]] = as_of_ts
+            return int(newer.sum())
+
+    def update_pair(self, base_currency, target_currency, rate, as_of):
+        """
+        Incorpora una cotización directa base/target si uno de sus tramos ya es conocido.
+        """
+        if base_currency == self.pivot:
+            return self.load_vector(self.pivot, {target_currency: rate}, as_of) > 0
+        if target_currency == self.pivot:
+            return self.load_vector(self.pivot, {base_currency: 1 / rate}, as_of) > 0
+        if base_currency in self:
+            return self.load_vector(base_currency, {target_currency: rate}, as_of) > 0
+        if target_currency in self:
+            return self.load_vector(target_currency, {base_currency: 1 / rate}, as_of) > 0
+        return False
+
+    def cross(self, base_currency, target_currency):
+        """
+        Devuelve {'mid_price', 'as_of'} del par cruzado, o None si falta algún tramo.
+        as_of es la fecha del tramo más antiguo.
+        """
+        with self._lock:
+            base_position = self.index.get(base_currency)
+            target_position = self.index.get(target_currency)
+            if base_position is None or target_position is None:
+                return None
+            base_rate = self.rates[base_position]
+            target_rate = self.rates[target_position]
+            if np.isnan(base_rate) or np.isnan(target_rate):
+                return None
+            return {
+                'mid_price': float(target_rate / base_rate),
+                'as_of': int(min(self.as_of[base_position], self.as_of[target_position]))
+            }
+
+    def cross_table(self, codes):
+        """
+        Matriz NxN de tasas cruzadas para las monedas dadas: table[i, j] = unidades de codes[j] por 1 codes[i].
+        """
+        with self._lock:
+            positions = [self.index.get(code) for code in codes]
+            vector = np.array([self.rates[p] if p is not None else np.nan for p in positions])
+        return vector[np.newaxis, :] / vector[:, np.newaxis]
+
+    def age(self, base_currency, target_currency, now=None):
+        """
+        Segundos transcurridos desde la actualización del tramo más antiguo del par (None si falta).
+        """
+        cross = self.cross(base_currency, target_currency)
+        if not cross:
+            return None
+        now = time.time() if now is None else now
+        return max(0, now - cross['as_of'])
+
+    def load_historical_matrix(self, matrix):
+        """
+        Carga de una HistoricalMatrix (con base en el pivote) la última tasa conocida de cada
+        moneda, con la fecha en la que aparece por última vez.
+        """
+        by_date = {}
+        for code, rate, date in matrix.latest():
+            by_date.setdefault(date, {})[code] = rate
+        for date in sorted(by_date):
+            self.load_vector(self.pivot, by_date[date], date)
+        loaded = sum(len(rates) for rates in by_date.values())
+        logger.info(f"Cargadas {loaded} tasas {self.pivot} desde {matrix.json_path}")
+        return loaded
+
+    def load_historical_json(self, file_path):
+        """
+        Carga un archivo {fecha: {moneda: tasa}} con base en el pivote, a través de su matriz compilada.
+        """
+        return self.load_historical_matrix(HistoricalMatrix(file_path, self.pivot).load())
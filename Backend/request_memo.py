@@ -0,0 +1,94 @@
+#Memo de recursos compartido por las consultas de un lote
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar('request_memo', default=None)
+
+class RequestMemo:
+    """
+    Resultados ya obtenidos durante un lote de consultas (cotizaciones, ventanas de histórico,
+    tasas por fecha, análisis de texto). Cada recurso se calcula una sola vez: si varias consultas
+    lo piden a la vez, las demás esperan al primer cálculo en lugar de repetirlo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._flights = {}  # clave -> threading.Event del cálculo en curso
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._values:
+                self.hits += 1
+                return self._values[key]
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._values[key] = value
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._values:
+                self.hits += 1
+                return self._values[key]
+            flight = self._flights.get(key)
+            owner = flight is None
+            if owner:
+                flight = self._flights[key] = threading.Event()
+                self.misses += 1
+
+        if not owner:
+            flight.wait()
+            with self._lock:
+                self.hits += 1
+                return self._values.get(key)
+
+        value = None
+        try:
+            value = compute()
+            return value
+        finally:
+            with self._lock:
+                self._values[key] = value
+                del self._flights[key]
+            flight.set()
+
+    def stats(self):
+        with self._lock:
+            return {'resources': len(self._values), 'hits': self.hits, 'misses': self.misses}
+
+@contextmanager
+def request_memo():
+    """
+    Activa un memo para el bloque (y para las tareas que se lancen desde él con el contexto copiado).
+    """
+    memo = RequestMemo()
+    token = _current.set(memo)
+    try:
+        yield memo
+    finally:
+        _current.reset(token)
+
+def current_memo():
+    return _current.get()
+
+def memoize_in_request(name):
+    """
+    Decorador: dentro de un request_memo, las llamadas con los mismos argumentos se calculan una vez.
+    Fuera de un lote la función se llama directamente.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            memo = _current.get()
+            if memo is None:
+                return func(*args, **kwargs)
+            key = (name, args, tuple(sorted(kwargs.items())))
+            return memo.get_or_compute(key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
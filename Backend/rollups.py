@@ -0,0 +1,64 @@
+#Agregados OHLC por hora y por día de las cotizaciones
+import numpy as np
+
+# Un agregado por intervalo: inicio del intervalo, última cotización incluida, OHLC del precio medio,
+# media y número de cotizaciones
+BAR_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('last_timestamp', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('mean', '<f8'),
+    ('count', '<i8')
+])
+
+HOURLY = 'hourly'
+DAILY = 'daily'
+
+# Resoluciones mantenidas para cada par (segundos por intervalo)
+RESOLUTIONS = {HOURLY: 3600, DAILY: 86400}
+ROLLUP_SUFFIX = '.bars'
+
+def build_bars(ticks, seconds):
+    """
+    Agrega cotizaciones (TICK_DTYPE, ordenadas por timestamp) en intervalos de seconds segundos.
+    """
+    if not len(ticks):
+        return np.empty(0, dtype=BAR_DTYPE)
+    timestamps = np.asarray(ticks['timestamp'], dtype='<i8')
+    prices = np.asarray(ticks['mid_price'], dtype=float)
+    buckets = timestamps - timestamps % seconds
+
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(timestamps)] - 1
+    counts = ends - starts + 1
+
+    bars = np.zeros(len(starts), dtype=BAR_DTYPE)
+    bars['timestamp'] = buckets[starts]
+    bars['last_timestamp'] = timestamps[ends]
+    bars['open'] = prices[starts]
+    bars['high'] = np.maximum.reduceat(prices, starts)
+    bars['low'] = np.minimum.reduceat(prices, starts)
+    bars['close'] = prices[ends]
+    bars['mean'] = np.add.reduceat(prices, starts) / counts
+    bars['count'] = counts
+    return bars
+
+def merge_bars(last_bar, bars):
+    """
+    Une los agregados nuevos con el último guardado. Si el primero cae en el mismo intervalo
+    se combinan en uno. Retorna (True si reemplaza al último guardado, agregados a escribir).
+    """
+    if last_bar is None or not len(bars) or bars['timestamp'][0] != last_bar['timestamp']:
+        return False, bars
+    bars = bars.copy()
+    first = bars[0].copy()
+    total = int(last_bar['count']) + int(first['count'])
+    bars['open'][0] = last_bar['open']
+    bars['high'][0] = max(last_bar['high'], first['high'])
+    bars['low'][0] = min(last_bar['low'], first['low'])
+    bars['mean'][0] = (last_bar['mean'] * last_bar['count'] + first['mean'] * first['count']) / total
+    bars['count'][0] = total
+    return True, bars
@@ -0,0 +1,117 @@
+#Caché compartida entre procesos sobre SQLite en modo WAL
+import os
+import time
+import pickle
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class SharedCache:
+    """
+    Caché clave -> valor con expiración, guardada en un archivo SQLite en modo WAL para que
+    todos los workers del equipo compartan cotizaciones, análisis de OpenAI y gráficos.
+    WAL permite lecturas concurrentes con un escritor; cada hilo usa su propia conexión.
+    Los valores se serializan con pickle: el archivo solo lo escribe esta aplicación.
+    """
+
+    def __init__(self, path, busy_timeout=5.0, clock=time.time):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+            )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def get_entry(self, key):
+        """
+        Retorna (valor, segundos hasta expirar o None si no expira) o None si no existe o expiró.
+        Un error de SQLite se registra y se trata como un fallo de caché.
+        """
+        try:
+            row = self._connection().execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Error al leer la caché compartida: {e}")
+            self._count('errors')
+            return None
+        now = self.clock()
+        if row is None or (row[1] is not None and row[1] <= now):
+            self._count('misses')
+            return None
+        self._count('hits')
+        return pickle.loads(row[0]), (None if row[1] is None else row[1] - now)
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        return default if entry is None else entry[0]
+
+    def put(self, key, value, ttl=None):
+        """
+        Guarda value bajo key; ttl en segundos (None: sin expiración).
+        """
+        expires_at = None if ttl is None else self.clock() + ttl
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires_at)
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Error al escribir en la caché compartida: {e}")
+            self._count('errors')
+
+    def delete(self, key):
+        try:
+            self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.error(f"Error al borrar de la caché compartida: {e}")
+            self._count('errors')
+
+    def purge_expired(self):
+        """
+        Elimina las entradas expiradas. Retorna cuántas se borraron.
+        """
+        try:
+            cursor = self._connection().execute(
+                "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (self.clock(),)
+            )
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"Error al limpiar la caché compartida: {e}")
+            self._count('errors')
+            return 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'path': self.path,
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,26 @@
+#Configuración común de las pruebas del backend
+import os
+import sys
+
+import pytest
+
+# Los módulos del backend se importan por nombre, como hace app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Sin caché compartida ni precarga en segundo plano durante las pruebas
+os.environ.setdefault("SHARED_CACHE_ENABLED", "0")
+os.environ.setdefault("PREFETCH_ENABLED", "0")
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+    """
+    bot_functions con un almacén de cotizaciones vacío en tmp_path y estados de modelo nuevos.
+    """
+    monkeypatch.chdir(tmp_path)
+    import bot_functions
+    from forecasting import ForecastRegistry
+    from lru_cache import LRUCache
+    from tick_store import TickStore
+    monkeypatch.setattr(bot_functions, 'TICK_STORE', TickStore(str(tmp_path / 'ticks')))
+    monkeypatch.setattr(bot_functions, 'FORECASTS', ForecastRegistry(bot_functions.load_model_history, LRUCache(maxsize=16)))
+    return bot_functions
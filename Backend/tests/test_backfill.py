@@ -0,0 +1,43 @@
+#Pruebas de la carga masiva de series diarias
+from quota import AdmissionController, current_priority, BACKGROUND
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def test_backfill_paces_through_all_pairs(bot, monkeypatch):
+    clock = FakeClock()
+    quota = AdmissionController(['clave'], per_minute=5, per_day=100, clock=clock)
+    monkeypatch.setattr(bot, 'ALPHA_VANTAGE_QUOTA', quota)
+    priorities = []
+    def fake_sync(base, target, force=False):
+        priorities.append(current_priority())
+        quota.acquire(current_priority())
+        return 10
+    monkeypatch.setattr(bot, 'sync_daily_series', fake_sync)
+
+    pairs = [('EUR', 'USD'), ('GBP', 'USD'), ('USD', 'JPY'), ('AUD', 'USD'), ('USD', 'CAD'), ('USD', 'CHF'), ('EUR', 'GBP')]
+    results = bot.backfill_daily_series(pairs, sleep=clock.sleep)
+
+    assert list(results) == [f"{base}/{target}" for base, target in pairs]
+    assert set(priorities) == {BACKGROUND}
+    assert clock.now > 0
+
+def test_backfill_stops_when_daily_budget_is_spent(bot, monkeypatch):
+    clock = FakeClock()
+    quota = AdmissionController(['clave'], per_minute=5, per_day=5, clock=clock)
+    monkeypatch.setattr(bot, 'ALPHA_VANTAGE_QUOTA', quota)
+    monkeypatch.setattr(bot, 'sync_daily_series', lambda base, target, force=False: quota.acquire(current_priority()) and 1)
+
+    pairs = [('USD', code) for code in ('EUR', 'GBP', 'JPY', 'CAD', 'CHF', 'AUD', 'CNY', 'MXN')]
+    results = bot.backfill_daily_series(pairs, sleep=clock.sleep)
+
+    # La carga de segundo plano deja libre la reserva diaria para las consultas interactivas
+    assert 0 < len(results) < len(pairs)
+    assert quota.can_spend('interactive')
@@ -0,0 +1,77 @@
+#Pruebas de los pronósticos incrementales
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from forecasting import build_state
+
+DAY = 86400
+
+def test_update_ignores_repeated_timestamp():
+    # La misma cotización puede llegar por on_append y por sync_forecast_state
+    state = build_state([0, DAY, 2 * DAY], [1.0, 1.1, 1.3])
+    before = {name: state.forecast(name, 3) for name in state.models}
+    state.update(2 * DAY, 1.3)
+    for name in state.models:
+        assert state.forecast(name, 3) == pytest.approx(before[name])
+
+def test_predict_retrains_when_local_ticks_are_stale(bot, monkeypatch):
+    # Cotizaciones locales de hace más de un año: el pronóstico no puede partir de ellas
+    old = datetime.now() - timedelta(days=400)
+    for hour in range(48):
+        bot.TICK_STORE.append('EUR_USD', old + timedelta(hours=hour), 1.05, 1.049, 1.051)
+
+    today = datetime.now().date()
+    recent = {
+        'dates': [(today - timedelta(days=days)).strftime('%Y-%m-%d') for days in range(30, -1, -1)],
+        'rates': [1.10 + 0.001 * i for i in range(31)]
+    }
+    calls = []
+    def fake_history(base, target, days=30):
+        calls.append((base, target, days))
+        return recent
+    monkeypatch.setattr(bot, 'get_historical_rates', fake_history)
+
+    prediction = bot.predict_rates('EUR', 'USD', {'type': 'days', 'value': 3})
+    # El estado reentrenado queda en el registro: la segunda consulta no vuelve a entrenar
+    again = bot.predict_rates('EUR', 'USD', {'type': 'days', 'value': 3})
+
+    assert calls == [('EUR', 'USD', bot.FORECAST_TRAINING_DAYS)]
+    assert again == prediction
+    assert prediction['current_rate'] == pytest.approx(recent['rates'][-1])
+    assert [item['date'] for item in prediction['predicted_rates']] == [
+        (today + timedelta(days=days)).strftime('%Y-%m-%d') for days in (1, 2, 3)
+    ]
+
+def test_predict_uses_recent_local_ticks(bot, monkeypatch):
+    now = int(time.time())
+    for hours in range(48, 0, -1):
+        bot.TICK_STORE.append('EUR_USD', now - hours * 3600, 1.08, 1.079, 1.081)
+    monkeypatch.setattr(bot, 'get_historical_rates', lambda *args, **kwargs: pytest.fail("no debería llamar a la API"))
+
+    prediction = bot.predict_rates('EUR', 'USD', {'type': 'days', 'value': 3})
+
+    assert prediction['current_rate'] == pytest.approx(1.08)
+
+def test_predict_batch_skips_stale_pairs(bot):
+    old = datetime.now() - timedelta(days=400)
+    for hour in range(48):
+        bot.TICK_STORE.append('EUR_USD', old + timedelta(hours=hour), 1.05, 1.049, 1.051)
+
+    assert bot.predict_rates_batch([('EUR', 'USD')], {'type': 'days', 'value': 3}) == [None]
+
+def test_daily_state_follows_new_days(bot, monkeypatch):
+    # Par sin cotizaciones: el estado sale de la serie diaria y debe seguirla cuando crece
+    today = datetime.now().date()
+    dates = [(today - timedelta(days=days)).strftime('%Y-%m-%d') for days in range(20, 0, -1)]
+    bot.save_daily_rates('EUR', 'USD', {'dates': dates[:10], 'rates': [1.10] * 10})
+    monkeypatch.setattr(bot, 'get_historical_rates', lambda *args, **kwargs: pytest.fail("no debería reentrenar"))
+
+    first = bot.predict_rates('EUR', 'USD', {'type': 'days', 'value': 3})
+    bot.save_daily_rates('EUR', 'USD', {'dates': dates, 'rates': [1.10] * 10 + [1.20] * 10})
+    second = bot.predict_rates('EUR', 'USD', {'type': 'days', 'value': 3})
+
+    assert first['current_rate'] == pytest.approx(1.10)
+    assert second['current_rate'] == pytest.approx(1.20)
+    assert second['predicted_rates'][0]['date'] == today.strftime('%Y-%m-%d')
@@ -0,0 +1,34 @@
+#Pruebas de la valoración de carteras
+import pytest
+
+@pytest.fixture
+def client(bot):
+    from app import app
+    return app.test_client()
+
+def test_parse_position_ignores_acquired_when_cost_is_given(bot):
+    from app import parse_position
+    parsed = parse_position({'currency': 'eur', 'amount': 1, 'cost': 2, 'acquired': 'bad'})
+    assert parsed == {'currency': 'EUR', 'amount': 1.0, 'cost': 2.0}
+
+def test_portfolio_accepts_cost_with_bad_acquired(client, bot, monkeypatch):
+    seen = []
+    def fake_value(positions, reporting_currency, as_of_dates):
+        seen.append(positions)
+        return {'positions': [], 'totals': {}}
+    monkeypatch.setattr('app.value_portfolio', fake_value)
+
+    response = client.post('/portfolio/value', json={
+        'reporting_currency': 'USD',
+        'positions': [{'currency': 'EUR', 'amount': 100, 'cost': 110, 'acquired': 'bad'}]
+    })
+
+    assert response.status_code == 200
+    assert 'acquired' not in seen[0][0]
+
+def test_portfolio_rejects_non_finite_amounts(client):
+    response = client.post('/portfolio/value', json={
+        'reporting_currency': 'USD',
+        'positions': [{'currency': 'EUR', 'amount': 'nan'}]
+    })
+    assert response.status_code == 400
@@ -0,0 +1,54 @@
+#Pruebas del control de admisión de Alpha Vantage
+import pytest
+
+from io_pipeline import IOPipeline
+from quota import AdmissionController, QuotaExceeded, upstream_priority, current_priority, INTERACTIVE, BACKGROUND
+from shared_cache import SharedCache
+
+def test_processes_share_one_budget(tmp_path):
+    # Dos controladores sobre la misma caché equivalen a dos workers con la misma clave
+    shared = SharedCache(str(tmp_path / 'shared_cache.sqlite'))
+    workers = [AdmissionController(['clave'], per_minute=3, per_day=25, max_wait={INTERACTIVE: 0}, shared=shared) for _ in range(2)]
+
+    admitted = 0
+    for _ in range(3):
+        for worker in workers:
+            try:
+                worker.acquire(INTERACTIVE)
+                admitted += 1
+            except QuotaExceeded:
+                pass
+
+    assert admitted == 3
+    assert workers[1].stats()['minute_tokens'] < 1
+
+def test_rate_limit_blocks_every_process(tmp_path):
+    shared = SharedCache(str(tmp_path / 'shared_cache.sqlite'))
+    first, second = [AdmissionController(['clave'], max_wait={INTERACTIVE: 0}, shared=shared) for _ in range(2)]
+
+    first.report('clave', {'Note': 'Thank you for using Alpha Vantage! Our standard API call frequency is 5 calls per minute.'})
+
+    with pytest.raises(QuotaExceeded):
+        second.acquire(INTERACTIVE)
+
+def test_priority_follows_pipeline_tasks():
+    pipeline = IOPipeline(max_workers=2, timeout=5)
+    with upstream_priority(BACKGROUND):
+        results = pipeline.gather(a=current_priority, b=current_priority)
+    assert set(results.values()) == {BACKGROUND}
+    assert current_priority() == INTERACTIVE
+
+def test_shared_state_is_written_only_when_it_changes(tmp_path, monkeypatch):
+    shared = SharedCache(str(tmp_path / 'shared_cache.sqlite'))
+    writes = []
+    original_put = shared.put
+    monkeypatch.setattr(shared, 'put', lambda key, value, ttl=None: (writes.append(key), original_put(key, value, ttl)))
+    controller = AdmissionController(['clave1', 'clave2'], per_minute=5, per_day=25, max_wait={INTERACTIVE: 0}, shared=shared)
+
+    controller.acquire(INTERACTIVE)
+    assert len(writes) == 1
+
+    controller.can_spend(BACKGROUND)
+    controller.seconds_until(INTERACTIVE)
+    controller.stats()
+    assert len(writes) == 1
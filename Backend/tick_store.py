@@ -0,0 +1,402 @@
+#Almacén binario de cotizaciones
+import os
+import csv
+import glob
+import logging
+import threading
+import calendar
+from datetime import datetime, timezone
+
+import numpy as np
+
+from file_lock import FileLock
+from rollups import BAR_DTYPE, RESOLUTIONS, ROLLUP_SUFFIX, build_bars, merge_bars
+
+logger = logging.getLogger(__name__)
+
+# Registro de ancho fijo: marca de tiempo epoch (segundos UTC) y los tres precios
+TICK_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('mid_price', '<f8'),
+    ('bid_price', '<f8'),
+    ('ask_price', '<f8')
+])
+
+# Número máximo de registros por segmento antes de abrir uno nuevo (8 MiB)
+SEGMENT_MAX_RECORDS = 1 << 18
+SEGMENT_SUFFIX = '.ticks'
+LOCK_FILE = '.lock'
+
+def to_epoch(value):
+    """
+    Convierte una fecha (str, datetime, date o número) a segundos epoch.
+    Las fechas sin zona horaria se interpretan como UTC, igual que 'Last Refreshed' de Alpha Vantage.
+    """
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip())
+    if not isinstance(value, datetime):
+        # datetime.date
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is not None:
+        return int(value.timestamp())
+    return calendar.timegm(value.timetuple())
+
+def from_epoch(timestamp):
+    """
+    Convierte segundos epoch a un datetime sin zona horaria (UTC).
+    """
+    return datetime.fromtimestamp(int(timestamp), timezone.utc).replace(tzinfo=None)
+
+def epoch_to_date_strings(timestamps):
+    """
+    Convierte un array de segundos epoch a cadenas '%Y-%m-%d' de forma vectorizada.
+    """
+    return np.asarray(timestamps, dtype='<i8').astype('datetime64[s]').astype('datetime64[D]').astype(str).tolist()
+
+def epoch_to_hour_strings(timestamps):
+    """
+    Convierte un array de segundos epoch a cadenas '%Y-%m-%d %H:00' de forma vectorizada.
+    """
+    hours = np.asarray(timestamps, dtype='<i8').astype('datetime64[s]').astype('datetime64[h]').astype(str)
+    return [f"{hour[:10]} {hour[11:13]}:00" for hour in hours]
+
+def read_csv(file_path):
+    """
+    Lee un archivo '{PAR}_history.csv' del formato anterior como registros TICK_DTYPE
+    ordenados por timestamp, sin escribir nada en el almacén.
+    """
+    rows = []
+    with open(file_path, newline='') as f:
+        for row in csv.DictReader(f):
+            try:
+                rows.append((
+                    to_epoch(row['timestamp']),
+                    float(row['mid_price']),
+                    float(row['bid_price']),
+                    float(row['ask_price'])
+                ))
+            except (KeyError, ValueError) as e:
+                logger.error(f"Fila inválida en {file_path}: {e}")
+
+    records = np.array(rows, dtype=TICK_DTYPE)
+    return records[np.argsort(records['timestamp'], kind='stable')]
+
+class TickStore:
+    """
+    Almacén append-only de cotizaciones por par, en segmentos de registros de ancho fijo.
+    Las escrituras añaden un registro al final del último segmento (O(1)) y las lecturas
+    usan numpy.memmap, de modo que un rango dentro de un segmento es una vista sin copia.
+    Es seguro con varios procesos (workers de gunicorn): las escrituras de un par se hacen bajo
+    un bloqueo de archivo y las cachés de cada proceso se validan con el tamaño de los archivos.
+    Junto a los segmentos se mantienen agregados OHLC por hora y por día ('hourly.bars',
+    'daily.bars'), actualizados en cada escritura y reconstruidos si no cuadran con los registros.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._lock = threading.RLock()
+        self._segments = {}   # par -> (mtime de la carpeta, lista de rutas de segmentos ordenadas)
+        self._maps = {}       # ruta -> (tamaño en bytes, inodo, memmap)
+        self._last = {}       # par -> (ruta, tamaño del segmento, último registro)
+        self._rollup_counts = {}  # (par, resolución) -> registros ya incluidos en los agregados
+        os.makedirs(self.folder, exist_ok=True)
+
+    def _pair_folder(self, pair):
+        return os.path.join(self.folder, pair)
+
+    def _pair_lock(self, pair):
+        """
+        Bloqueo de escritura del par compartido entre procesos.
+        """
+        os.makedirs(self._pair_folder(pair), exist_ok=True)
+        return FileLock(os.path.join(self._pair_folder(pair), LOCK_FILE))
+
+    def _list_segments(self, pair):
+        # La lista se relee cuando cambia la carpeta (otro proceso pudo abrir un segmento nuevo)
+        try:
+            mtime = os.stat(self._pair_folder(pair)).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        cached = self._segments.get(pair)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, sorted(glob.glob(os.path.join(self._pair_folder(pair), f"*{SEGMENT_SUFFIX}"))))
+            self._segments[pair] = cached
+        return cached[1]
+
+    def _new_segment(self, pair):
+        segments = self._list_segments(pair)
+        path = os.path.join(self._pair_folder(pair), f"{len(segments):06d}{SEGMENT_SUFFIX}")
+        open(path, 'ab').close()
+        return path
+
+    def _map_segment(self, path, dtype=TICK_DTYPE):
+        """
+        Devuelve un memmap de solo lectura del archivo, reabriéndolo si creció o fue reemplazado.
+        """
+        stat = os.stat(path)
+        cached = self._maps.get(path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_ino:
+            return cached[2]
+        count = stat.st_size // dtype.itemsize
+        if count == 0:
+            mapped = np.empty(0, dtype=dtype)
+        else:
+            mapped = np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+        self._maps[path] = (stat.st_size, stat.st_ino, mapped)
+        return mapped
+
+    def _rollup_path(self, pair, resolution):
+        return os.path.join(self._pair_folder(pair), f"{resolution}{ROLLUP_SUFFIX}")
+
+    def _read_rollup(self, pair, resolution):
+        path = self._rollup_path(pair, resolution)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=BAR_DTYPE)
+        return self._map_segment(path, BAR_DTYPE)
+
+    def _rollup_in_sync(self, pair, resolution, count):
+        """
+        Indica si los agregados incluyen exactamente count registros del par.
+        """
+        key = (pair, resolution)
+        if self._rollup_counts.get(key) == count:
+            return True
+        if int(self._read_rollup(pair, resolution)['count'].sum()) != count:
+            return False
+        self._rollup_counts[key] = count
+        return True
+
+    def _rebuild_rollup(self, pair, resolution):
+        """
+        Recalcula los agregados de una resolución desde todos los registros (bajo el bloqueo del par).
+        """
+        bars = build_bars(self.read_all(pair), RESOLUTIONS[resolution])
+        path = self._rollup_path(pair, resolution)
+        temporary = f"{path}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(bars.tobytes())
+        os.replace(temporary, path)
+        self._rollup_counts[(pair, resolution)] = int(bars['count'].sum())
+        logger.info(f"Agregados {resolution} de {pair} reconstruidos: {len(bars)} intervalos")
+
+    def _update_rollups(self, pair, records, previous_count):
+        """
+        Añade records (ya guardados) a los agregados del par. Si los agregados no incluían los
+        previous_count registros anteriores, se reconstruyen completos.
+        """
+        for resolution, seconds in RESOLUTIONS.items():
+            if not self._rollup_in_sync(pair, resolution, previous_count):
+                self._rebuild_rollup(pair, resolution)
+                continue
+            existing = self._read_rollup(pair, resolution)
+            replace, bars = merge_bars(existing[-1].copy() if len(existing) else None, build_bars(records, seconds))
+            path = self._rollup_path(pair, resolution)
+            with open(path, 'r+b' if replace else 'ab') as f:
+                if replace:
+                    # El primer agregado sustituye al último guardado (mismo intervalo)
+                    f.seek(-BAR_DTYPE.itemsize, os.SEEK_END)
+                f.write(bars.tobytes())
+            self._rollup_counts[(pair, resolution)] = previous_count + len(records)
+
+    def read_bars(self, pair, resolution, start=None, end=None):
+        """
+        Devuelve los agregados (BAR_DTYPE) de la resolución ('hourly' o 'daily') cuyo intervalo
+        se solapa con [start, end]. Si no cuadran con los registros guardados se reconstruyen.
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Resolución inválida: {resolution}")
+        start_ts = None if start is None else to_epoch(start)
+        end_ts = None if end is None else to_epoch(end)
+
+        with self._lock:
+            if not self._rollup_in_sync(pair, resolution, self.count(pair)):
+                with self._pair_lock(pair):
+                    if not self._rollup_in_sync(pair, resolution, self.count(pair)):
+                        self._rebuild_rollup(pair, resolution)
+            bars = self._read_rollup(pair, resolution)
+            timestamps = bars['timestamp']
+            seconds = RESOLUTIONS[resolution]
+            lo = 0 if start_ts is None else int(np.searchsorted(timestamps, start_ts - start_ts % seconds, side='left'))
+            hi = len(bars) if end_ts is None else int(np.searchsorted(timestamps, end_ts, side='right'))
+            return bars[lo:hi]
+
+    def pairs(self):
+        """
+        Lista los pares (y series derivadas, como '_daily') con carpeta en el almacén.
+        """
+        return sorted(name for name in os.listdir(self.folder) if os.path.isdir(self._pair_folder(name)))
+
+    def has_pair(self, pair):
+        """
+        Indica si existe al menos un registro guardado para el par.
+        """
+        return self.count(pair) > 0
+
+    def count(self, pair):
+        """
+        Número de registros guardados para el par.
+        """
+        with self._lock:
+            return sum(os.path.getsize(path) // TICK_DTYPE.itemsize for path in self._list_segments(pair))
+
+    def last(self, pair):
+        """
+        Devuelve el último registro del par (numpy.void) o None si no hay datos.
+        """
+        with self._lock:
+            segments = self._list_segments(pair)
+            if not segments:
+                return None
+            size = os.path.getsize(segments[-1])
+            cached = self._last.get(pair)
+            if cached and cached[0] == segments[-1] and cached[1] == size:
+                return cached[2]
+            last = None
+            for path in reversed(segments):
+                mapped = self._map_segment(path)
+                if len(mapped):
+                    last = mapped[-1].copy()
+                    break
+            self._last[pair] = (segments[-1], size, last)
+            return last
+
+    def append(self, pair, timestamp, mid_price, bid_price, ask_price, min_change=None):
+        """
+        Añade una cotización al final del par.
+        Las cotizaciones anteriores al último registro se descartan para mantener el orden temporal,
+        y con min_change también las que no mueven el precio medio al menos esa cantidad.
+        La comparación con el último registro y la escritura son atómicas entre procesos.
+        Retorna True si el registro se guardó.
+        """
+        record = np.zeros(1, dtype=TICK_DTYPE)
+        record['timestamp'] = to_epoch(timestamp)
+        record['mid_price'] = mid_price
+        record['bid_price'] = bid_price
+        record['ask_price'] = ask_price
+
+        with self._lock, self._pair_lock(pair):
+            previous_count = self.count(pair)
+            last = self.last(pair)
+            if last is not None and record['timestamp'][0] < last['timestamp']:
+                logger.info(f"Cotización descartada para {pair}: marca de tiempo anterior al último registro.")
+                return False
+            if last is not None and min_change is not None and abs(last['mid_price'] - mid_price) < min_change:
+                return False
+
+            segments = self._list_segments(pair)
+            if not segments or os.path.getsize(segments[-1]) // TICK_DTYPE.itemsize >= SEGMENT_MAX_RECORDS:
+                path = self._new_segment(pair)
+            else:
+                path = segments[-1]
+
+            with open(path, 'ab') as f:
+                f.write(record.tobytes())
+            self._update_rollups(pair, record, previous_count)
+            return True
+
+    def extend(self, pair, records):
+        """
+        Añade un bloque de registros (array con TICK_DTYPE) ordenados por marca de tiempo.
+        Solo se guardan los posteriores al último registro, así repetir una carga no duplica datos.
+        Retorna el número de registros guardados.
+        """
+        records = np.asarray(records, dtype=TICK_DTYPE)
+        with self._lock, self._pair_lock(pair):
+            previous_count = self.count(pair)
+            last = self.last(pair)
+            if last is not None:
+                records = records[records['timestamp'] > last['timestamp']]
+            written = 0
+            while written < len(records):
+                segments = self._list_segments(pair)
+                used = os.path.getsize(segments[-1]) // TICK_DTYPE.itemsize if segments else 0
+                if not segments or used >= SEGMENT_MAX_RECORDS:
+                    path = self._new_segment(pair)
+                    used = 0
+                else:
+                    path = segments[-1]
+                chunk = records[written:written + SEGMENT_MAX_RECORDS - used]
+                with open(path, 'ab') as f:
+                    f.write(chunk.tobytes())
+                written += len(chunk)
+            if written:
+                self._update_rollups(pair, records, previous_count)
+            return written
+
+    def read_all(self, pair):
+        """
+        Devuelve todos los registros del par.
+        Con un solo segmento el resultado es una vista memmap sin copia.
+        """
+        return self.read_range(pair)
+
+    def read_range(self, pair, start=None, end=None):
+        """
+        Devuelve los registros con start <= timestamp <= end (cualquiera de los dos puede ser None).
+        Si el rango cae dentro de un segmento se devuelve una vista sin copia.
+        """
+        start_ts = None if start is None else to_epoch(start)
+        end_ts = None if end is None else to_epoch(end)
+
+        with self._lock:
+            parts = []
+            for path in self._list_segments(pair):
+                mapped = self._map_segment(path)
+                if not len(mapped):
+                    continue
+                timestamps = mapped['timestamp']
+                if start_ts is not None and timestamps[-1] < start_ts:
+                    continue
+                if end_ts is not None and timestamps[0] > end_ts:
+                    break
+                lo = 0 if start_ts is None else int(np.searchsorted(timestamps, start_ts, side='left'))
+                hi = len(mapped) if end_ts is None else int(np.searchsorted(timestamps, end_ts, side='right'))
+                if hi > lo:
+                    parts.append(mapped[lo:hi])
+
+        if not parts:
+            return np.empty(0, dtype=TICK_DTYPE)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
+
+    def import_csv(self, file_path, pair=None):
+        """
+        Importa un archivo '{PAR}_history.csv' del formato anterior al almacén.
+        Solo se añaden las filas posteriores al último registro guardado.
+        Retorna el número de registros importados.
+        """
+        if pair is None:
+            pair = os.path.basename(file_path).replace('_history.csv', '')
+
+        records = read_csv(file_path)
+        if not len(records):
+            return 0
+
+        imported = self.extend(pair, records)
+        logger.info(f"Importados {imported} registros de {file_path} para {pair}")
+        return imported
+
+    def import_csv_folder(self, folder):
+        """
+        Importa todos los archivos '*_history.csv' de una carpeta.
+        Retorna un diccionario par -> registros importados.
+        """
+        results = {}
+        for file_path in sorted(glob.glob(os.path.join(folder, '*_history.csv'))):
+            pair = os.path.basename(file_path).replace('_history.csv', '')
+            results[pair] = self.import_csv(file_path, pair)
+        return results
+
+if __name__ == '__main__':
+    # Importación única de los CSV existentes: python tick_store.py [carpeta_datos]
+    import sys
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    data_folder = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    store = TickStore(os.path.join(data_folder, 'ticks'))
+    for pair, count in store.import_csv_folder(data_folder).items():
+        print(f"{pair}: {count} registros importados")
@@ -0,0 +1,83 @@
+#Índice temporal ordenado por par
+import threading
+
+import numpy as np
+
+# Modos de búsqueda
+NEAREST = 'nearest'    # registro más cercano a la fecha
+PREVIOUS = 'previous'  # último registro con timestamp <= fecha
+NEXT = 'next'          # primer registro con timestamp >= fecha
+LOOKUP_MODES = (NEAREST, PREVIOUS, NEXT)
+
+def locate(timestamps, targets, mode=NEAREST):
+    """
+    Resuelve varias fechas (segundos epoch) sobre un array de timestamps ordenado con searchsorted.
+    Retorna un array de índices; -1 indica que no existe registro para esa fecha en el modo pedido.
+    """
+    if mode not in LOOKUP_MODES:
+        raise ValueError(f"Modo de búsqueda inválido: {mode}")
+
+    targets = np.asarray(targets, dtype='<i8')
+    n = len(timestamps)
+    if n == 0:
+        return np.full(targets.shape, -1, dtype=np.int64)
+
+    if mode == PREVIOUS:
+        idx = np.searchsorted(timestamps, targets, side='right') - 1
+        return idx.astype(np.int64)
+
+    right = np.searchsorted(timestamps, targets, side='left')
+    if mode == NEXT:
+        return np.where(right < n, right, -1).astype(np.int64)
+
+    # NEAREST: comparar el vecino anterior y el siguiente; en empate gana el anterior
+    left = np.clip(right - 1, 0, n - 1)
+    right_clipped = np.clip(right, 0, n - 1)
+    left_diff = np.abs(targets - timestamps[left])
+    right_diff = np.abs(timestamps[right_clipped] - targets)
+    return np.where(right_diff < left_diff, right_clipped, left).astype(np.int64)
+
+class PairIndex:
+    """
+    Índice de un par: los registros del almacén y su columna de timestamps ordenada.
+    """
+
+    def __init__(self, ticks):
+        self.ticks = ticks
+        self.timestamps = ticks['timestamp']
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def locate(self, targets, mode=NEAREST):
+        return locate(self.timestamps, targets, mode)
+
+    def lookup(self, targets, mode=NEAREST):
+        """
+        Retorna (índices, registros) para las fechas pedidas; los registros de índices -1 no son válidos.
+        """
+        idx = self.locate(targets, mode)
+        if len(self.ticks) == 0:
+            return idx, self.ticks[:0]
+        return idx, self.ticks[np.where(idx >= 0, idx, 0)]
+
+class TimeIndex:
+    """
+    Mantiene un PairIndex por par, reconstruido solo cuando el almacén recibe nuevos registros.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._indexes = {}  # par -> (número de registros, PairIndex)
+
+    def get(self, pair):
+        count = self.store.count(pair)
+        with self._lock:
+            cached = self._indexes.get(pair)
+            if cached and cached[0] == count:
+                return cached[1]
+        index = PairIndex(self.store.read_all(pair))
+        with self._lock:
+            self._indexes[pair] = (len(index), index)
+        return index
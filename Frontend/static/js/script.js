@@ -86,6 +86,50 @@ document.getElementById("refreshNews").addEventListener("click", function () {
   }, 1000)
 })
 
+// Gráficos ya recibidos: texto de la consulta -> { etag, data } (serie JSON del servidor)
+const graphCache = new Map()
+
+const SVG_NS = "http://www.w3.org/2000/svg"
+
+// Crear un elemento SVG con sus atributos y, opcionalmente, un texto (sin interpretar HTML)
+function createSvgElement(tag, attributes, text) {
+  const element = document.createElementNS(SVG_NS, tag)
+  for (const [name, value] of Object.entries(attributes)) {
+    element.setAttribute(name, value)
+  }
+  if (text !== undefined) {
+    element.textContent = text
+  }
+  return element
+}
+
+// Construir un gráfico SVG (polilínea) a partir de { title, dates, rates }
+function buildRateChartSvg(data, width = 1000, height = 600, padding = 60) {
+  const rates = data.rates
+  const low = Math.min(...rates)
+  const high = Math.max(...rates)
+  const span = high - low || 1
+  const plotWidth = width - 2 * padding
+  const plotHeight = height - 2 * padding
+  const x = (i) => padding + (rates.length > 1 ? (plotWidth * i) / (rates.length - 1) : plotWidth / 2)
+  const y = (rate) => padding + plotHeight * (1 - (rate - low) / span)
+
+  const svg = createSvgElement("svg", { viewBox: `0 0 ${width} ${height}`, style: "width: 100%; height: auto;", "font-size": "14" })
+  svg.appendChild(createSvgElement("text", { x: width / 2, y: padding / 2, "text-anchor": "middle", fill: "#e2e8f0", "font-size": "18" }, data.title))
+  svg.appendChild(createSvgElement("rect", { x: padding, y: padding, width: plotWidth, height: plotHeight, fill: "none", stroke: "var(--border-color)" }))
+  svg.appendChild(createSvgElement("text", { x: padding - 6, y: padding + 4, "text-anchor": "end", fill: "#94a3b8" }, high.toFixed(4)))
+  svg.appendChild(createSvgElement("text", { x: padding - 6, y: height - padding + 4, "text-anchor": "end", fill: "#94a3b8" }, low.toFixed(4)))
+
+  const points = rates.map((rate, i) => `${x(i).toFixed(1)},${y(rate).toFixed(1)}`).join(" ")
+  svg.appendChild(createSvgElement("polyline", { points: points, fill: "none", stroke: "#3b82f6", "stroke-width": "2" }))
+
+  const step = Math.max(1, Math.floor(rates.length / 5))
+  for (let i = 0; i < rates.length; i += step) {
+    svg.appendChild(createSvgElement("text", { x: x(i).toFixed(1), y: height - padding / 2, "text-anchor": "middle", fill: "#94a3b8" }, data.dates[i]))
+  }
+  return svg
+}
+
 // Modificar la función de manejo del formulario para manejar respuestas desconocidas
 document.getElementById("forexForm").addEventListener("submit", (event) => {
   event.preventDefault()
@@ -116,19 +160,37 @@ document.getElementById("forexForm").addEventListener("submit", (event) => {
   // Desplazarse hacia abajo
   chatContainer.scrollTop = chatContainer.scrollHeight
 
+  // Si ya tenemos el gráfico de esta consulta, enviamos su ETag para evitar volver a descargarlo
+  const headers = { "Content-Type": "application/json" }
+  const cachedGraph = graphCache.get(userInput)
+  if (cachedGraph) {
+    headers["If-None-Match"] = cachedGraph.etag
+  }
+
   fetch("/get_forex_data", {
     method: "POST",
-    headers: {
-      "Content-Type": "application/json",
-    },
-    body: JSON.stringify({ user_input: userInput }),
+    headers: headers,
+    // Los gráficos llegan como serie reducida (JSON) y se dibujan en el navegador
+    body: JSON.stringify({ user_input: userInput, chart_format: "json", max_points: 200 }),
   })
     .then((response) => {
+      // El servidor confirma que el gráfico no ha cambiado
+      if (response.status === 304 && cachedGraph) {
+        return { data: cachedGraph.data, isJson: true }
+      }
+
       // Verificar el tipo de contenido
       const contentType = response.headers.get("content-type")
 
       if (contentType && contentType.includes("application/json")) {
-        return response.json().then((data) => ({ data, isJson: true }))
+        return response.json().then((data) => {
+          // Solo los gráficos llevan ETag
+          const etag = response.headers.get("ETag")
+          if (etag && data.intent === "graph") {
+            graphCache.set(userInput, { etag, data })
+          }
+          return { data, isJson: true }
+        })
       } else if (contentType && contentType.includes("image/png")) {
         return response.blob().then((blob) => ({ data: blob, isJson: false }))
       } else {
@@ -169,6 +231,7 @@ document.getElementById("forexForm").addEventListener("submit", (event) => {
                             <span>${data.timestamp}</span>
                         </div>
                     </div>
+                    ${data.source && data.source !== "live" ? `<p class="currency-note"><i class="fas fa-exclamation-triangle"></i> Cotización local: no se pudo obtener el precio en vivo.</p>` : ""}
                 `
           botMessageDiv.innerHTML = resultHtml
         } else if (data.intent === "prediction") {
@@ -317,6 +380,16 @@ document.getElementById("forexForm").addEventListener("submit", (event) => {
                     <p class="currency-note">Puedes usar cualquiera de estas monedas en tus consultas de conversión, gráficos, predicciones o comparaciones.</p>
                 `
           botMessageDiv.innerHTML = currenciesHtml
+        } else if (data.intent === "graph") {
+          // Dibujar el gráfico a partir de la serie reducida en el servidor
+          botMessageDiv.innerHTML = `
+                    <h2><i class='fas fa-chart-line'></i> Gráfico de tipo de cambio</h2>
+                    <div class="rate-chart" style="background-color: var(--card-bg); border-radius: 8px; padding: 20px; margin-top: 16px; box-shadow: 0 4px 12px rgba(0, 0, 0, 0.1);"></div>
+                    <div style="margin-top: 16px; font-size: 14px; color: #94a3b8; text-align: center;">
+                        Fuente: Datos procesados por ForexAI (${Number(data.rates.length)} de ${Number(data.total_points)} puntos)
+                    </div>
+                `
+          botMessageDiv.querySelector(".rate-chart").appendChild(buildRateChartSvg(data))
         } else if (data.intent === "unknown") {
           // Mostrar mensaje para intenciones desconocidas
           botMessageDiv.innerHTML = `